@@ -0,0 +1,82 @@
+import math
+import threading
+from urllib.parse import parse_qs
+
+HIGH = 'high'
+LOW = 'low'
+# Long-poll /state (version dan wait > 0) sebagian besar waktunya menunggu di condition game, jadi punya lane
+# sendiri dengan batas max_waiting alih-alih memakai slot in-flight
+WAIT = 'wait'
+
+# Request yang mengubah state game didahulukan dibanding polling /state
+HIGH_PRIORITY_ROUTES = ('/action', '/quit', '/matchmake')
+
+def request_priority(request_line):
+    parts = request_line.split(' ')
+    path, _, query = parts[1].partition('?') if len(parts) > 1 else ('', '', '')
+    if path == '/state' and is_long_poll(query):
+        return WAIT
+    return HIGH if path in HIGH_PRIORITY_ROUTES else LOW
+
+def is_long_poll(query):
+    # wait=0 atau tanpa version langsung membangun state penuh, jadi tetap lewat lane LOW
+    params = parse_qs(query)
+    if 'version' not in params or 'wait' not in params:
+        return False
+    try:
+        wait = float(params['wait'][0])
+    except ValueError:
+        return False
+    return math.isfinite(wait) and wait > 0
+
+def overload_response(retry_after=1):
+    body = b'{"error": "Server overloaded"}'
+    return ("HTTP/1.0 503 Service Unavailable\r\nConnection: close\r\nRetry-After: {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(retry_after, len(body))).encode() + body
+
+class AdmissionControl:
+    def __init__(self, max_connections=256, max_inflight=64, reserved_high=16, max_waiting=128):
+        self.max_connections = max_connections
+        self.max_inflight = max_inflight
+        self.max_waiting = max_waiting
+        # Slot in-flight yang hanya boleh dipakai lane HIGH
+        self.reserved_high = min(reserved_high, max_inflight)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.inflight = {HIGH: 0, LOW: 0, WAIT: 0}
+        self.shed = {'connections': 0, HIGH: 0, LOW: 0, WAIT: 0}
+
+    def try_connect(self):
+        with self.lock:
+            if self.connections >= self.max_connections:
+                self.shed['connections'] += 1
+                return False
+            self.connections += 1
+            return True
+
+    def release_connection(self):
+        with self.lock:
+            self.connections -= 1
+
+    def try_admit(self, priority):
+        with self.lock:
+            if priority == WAIT:
+                if self.inflight[WAIT] >= self.max_waiting:
+                    self.shed[WAIT] += 1
+                    return False
+                self.inflight[WAIT] += 1
+                return True
+            total = self.inflight[HIGH] + self.inflight[LOW]
+            limit = self.max_inflight if priority == HIGH else self.max_inflight - self.reserved_high
+            if total >= limit:
+                self.shed[priority] += 1
+                return False
+            self.inflight[priority] += 1
+            return True
+
+    def release(self, priority):
+        with self.lock:
+            self.inflight[priority] -= 1
+
+    def shed_counts(self):
+        with self.lock:
+            return dict(self.shed)
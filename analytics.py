@@ -0,0 +1,119 @@
+import os
+import json
+import argparse
+import numpy as np
+
+CHUNK_ROWS = 1 << 20
+DTYPES = {'q': '<i8', 'i': '<i4', 'b': 'i1'}
+
+class Shard:
+    # Kolom-kolom satu shard recorder sebagai np.memmap; tidak ada data yang dibaca sebelum diiris
+    def __init__(self, path, schema):
+        self.path = path
+        self.columns = {}
+        self.rows = {}
+        for table, columns in schema['tables'].items():
+            arrays = {}
+            for name, code in columns:
+                file_path = os.path.join(path, '{}.{}'.format(table, name))
+                dtype = np.dtype(DTYPES[code])
+                size = os.path.getsize(file_path) // dtype.itemsize if os.path.exists(file_path) else 0
+                arrays[name] = np.memmap(file_path, dtype=dtype, mode='r', shape=(size,)) if size else np.zeros(0, dtype)
+            self.columns[table] = arrays
+            # Flush yang terputus bisa meninggalkan kolom dengan panjang berbeda; pakai panjang terpendek
+            self.rows[table] = min(len(a) for a in arrays.values())
+
+    def chunks(self, table, names):
+        # Iris per CHUNK_ROWS; baris seats/events yang merujuk game yang belum ditulis dibuang
+        total = self.rows[table]
+        games = self.rows['games']
+        for start in range(0, total, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, total)
+            chunk = {name: np.asarray(self.columns[table][name][start:end]) for name in names}
+            if table != 'games':
+                keep = np.asarray(self.columns[table]['game'][start:end]) < games
+                if not keep.all():
+                    chunk = {name: values[keep] for name, values in chunk.items()}
+            yield chunk
+
+class Dataset:
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'schema.json')) as f:
+            self.schema = json.load(f)
+        self.cards = self.schema['cards']
+        self.actions = self.schema['actions']
+        self.kinds = {name: i for i, name in enumerate(self.schema['kinds'])}
+        self.shards = [Shard(os.path.join(directory, name), self.schema) for name in sorted(os.listdir(directory)) if name.startswith('shard-')]
+
+    def chunks(self, table, names):
+        for shard in self.shards:
+            yield from shard.chunks(table, names)
+
+    def game_count(self):
+        return sum(shard.rows['games'] for shard in self.shards)
+
+    def win_rate_by_hand(self):
+        # Tangan awal dikodekan card1 * 5 + card2 (card1 <= card2), dijumlahkan dengan bincount per chunk
+        size = len(self.cards) ** 2
+        seats = np.zeros(size, np.int64)
+        wins = np.zeros(size, np.int64)
+        for chunk in self.chunks('seats', ('card1', 'card2', 'won')):
+            valid = chunk['card2'] >= 0
+            hand = chunk['card1'][valid].astype(np.int64) * len(self.cards) + chunk['card2'][valid]
+            seats += np.bincount(hand, minlength=size)
+            wins += np.bincount(hand, weights=chunk['won'][valid], minlength=size).astype(np.int64)
+        result = {}
+        for code in np.flatnonzero(seats):
+            a, b = divmod(int(code), len(self.cards))
+            result['{}+{}'.format(self.cards[a], self.cards[b])] = (int(seats[code]), wins[code] / seats[code])
+        return result
+
+    def rates_by_action(self, kind, bluff=None):
+        # Untuk event kind tertentu per action: (jumlah, porsi success); bluff=1/0 menyaring event bluff/jujur
+        size = len(self.actions)
+        counts = np.zeros(size, np.int64)
+        successes = np.zeros(size, np.int64)
+        code = self.kinds[kind]
+        for chunk in self.chunks('events', ('kind', 'action', 'bluff', 'success')):
+            mask = (chunk['kind'] == code) & (chunk['action'] >= 0)
+            if bluff is not None:
+                mask &= chunk['bluff'] == bluff
+            action = chunk['action'][mask].astype(np.int64)
+            counts += np.bincount(action, minlength=size)
+            successes += np.bincount(action, weights=chunk['success'][mask], minlength=size).astype(np.int64)
+        return {self.actions[i]: (int(counts[i]), successes[i] / counts[i]) for i in np.flatnonzero(counts)}
+
+    def bluff_success_by_action(self):
+        return self.rates_by_action('action', bluff=1)
+
+    def challenge_accuracy(self):
+        # success pada event challenge = pihak yang ditantang memang bluff
+        return {'action': self.rates_by_action('challenge'), 'block': self.rates_by_action('block_challenge')}
+
+def total(rates):
+    count = sum(n for n, _ in rates.values())
+    return count, (sum(n * r for n, r in rates.values()) / count if count else 0.0)
+
+def print_rates(title, rates, label='rate'):
+    print(title)
+    for name, (count, rate) in sorted(rates.items(), key=lambda item: -item[1][1]):
+        print("  {:<24} {:>10} {:>8.1%} {}".format(name, count, rate, label))
+
+def main():
+    parser = argparse.ArgumentParser(description="Analitik game yang direkam recorder.py")
+    parser.add_argument('directory')
+    args = parser.parse_args()
+
+    dataset = Dataset(args.directory)
+    print("games: {}".format(dataset.game_count()))
+    print_rates("win rate by starting hand", dataset.win_rate_by_hand(), 'wins')
+    print_rates("bluff success by action", dataset.bluff_success_by_action(), 'succeeded')
+    print_rates("honest success by action", dataset.rates_by_action('action', bluff=0), 'succeeded')
+    print_rates("block success by action", dataset.rates_by_action('block'), 'stood')
+    accuracy = dataset.challenge_accuracy()
+    print_rates("challenge accuracy by action", accuracy['action'], 'correct')
+    print("challenge accuracy overall: {1:.1%} of {0}".format(*total(accuracy['action'])))
+    print("block challenge accuracy overall: {1:.1%} of {0}".format(*total(accuracy['block'])))
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,319 @@
+import sys
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+from httpfile import HttpServer, GameController, ServerManager
+from ratelimit import TokenBucketLimiter
+from bot import MonteCarloBot
+
+SEED = 1234
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+DEFAULT_THRESHOLD = 0.25
+# engine_digest(CHECK_GAMES) dari engine sebelum turunan inkremental; diperbarui hanya jika aturan game sengaja diubah
+CHECK_GAMES = 100
+ENGINE_DIGEST = '48e1c0b2988272bbb28ca956334053c2914d8f4653c088d8325ee26ba365d3cf'
+
+httpserver = HttpServer()
+# Benchmark memanggil route yang sama ribuan kali, limiter diukur terpisah
+httpserver.configure_rate_limits({})
+
+def make_game(num_players=4):
+    game = GameController(num_players)
+    for i in range(num_players):
+        game.add_player(f"P{i}")
+    return game
+
+def play(game, *steps):
+    for step in steps:
+        game.handle_action(step)
+    return game
+
+# Setiap skenario mengembalikan (game, data) yang siap untuk satu panggilan handle_action
+def scenario_income():
+    return make_game(), {'player_id': 0, 'action': 'Income'}
+
+def scenario_start_targeted():
+    return make_game(), {'player_id': 0, 'action': 'Steal'}
+
+def scenario_select_target():
+    game = play(make_game(), {'player_id': 0, 'action': 'Steal'})
+    return game, {'player_id': 0, 'target_id': 1}
+
+def scenario_broadcast_pass():
+    game = play(make_game(), {'player_id': 0, 'action': 'Tax'})
+    return game, {'player_id': 1, 'response': 'Pass'}
+
+def scenario_broadcast_last_pass():
+    game = play(make_game(), {'player_id': 0, 'action': 'Tax'}, {'player_id': 1, 'response': 'Pass'}, {'player_id': 2, 'response': 'Pass'})
+    return game, {'player_id': 3, 'response': 'Pass'}
+
+def scenario_broadcast_challenge():
+    game = play(make_game(), {'player_id': 0, 'action': 'Tax'})
+    return game, {'player_id': 1, 'response': 'Challenge'}
+
+def scenario_broadcast_block():
+    game = play(make_game(), {'player_id': 0, 'action': 'ForeignAid'})
+    return game, {'player_id': 1, 'response': 'Block'}
+
+def scenario_block_pass():
+    game = play(make_game(), {'player_id': 0, 'action': 'ForeignAid'}, {'player_id': 1, 'response': 'Block'})
+    return game, {'player_id': 0, 'response': 'Pass'}
+
+def scenario_block_challenge():
+    game = play(make_game(), {'player_id': 0, 'action': 'ForeignAid'}, {'player_id': 1, 'response': 'Block'})
+    return game, {'player_id': 0, 'response': 'Challenge'}
+
+def scenario_lose_influence():
+    game = play(make_game(), {'player_id': 0, 'action': 'Tax'}, {'player_id': 1, 'response': 'Challenge'})
+    return game, {'player_id': game.player_losing_influence.id, 'card': game.player_losing_influence.influence[0]}
+
+def scenario_exchange():
+    game = play(make_game(), {'player_id': 0, 'action': 'Exchange'}, {'player_id': 1, 'response': 'Pass'}, {'player_id': 2, 'response': 'Pass'}, {'player_id': 3, 'response': 'Pass'})
+    return game, {'player_id': 0, 'action': 'ConfirmExchange', 'cards': game.ambassador_cards[:game.pre_exchange_influence_count]}
+
+ACTION_SCENARIOS = {
+    'income': scenario_income,
+    'start_targeted': scenario_start_targeted,
+    'select_target': scenario_select_target,
+    'broadcast_pass': scenario_broadcast_pass,
+    'broadcast_last_pass': scenario_broadcast_last_pass,
+    'broadcast_challenge': scenario_broadcast_challenge,
+    'broadcast_block': scenario_broadcast_block,
+    'block_pass': scenario_block_pass,
+    'block_challenge': scenario_block_challenge,
+    'lose_influence': scenario_lose_influence,
+    'exchange': scenario_exchange,
+}
+
+def measure(fn, number, repeat):
+    best = None
+    for _ in range(repeat):
+        random.seed(SEED)
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1e6
+
+def measure_with_setup(setup, number, repeat):
+    # Setup (membuat game baru) tidak ikut dihitung, hanya panggilan handle_action
+    best = None
+    for _ in range(repeat):
+        random.seed(SEED)
+        elapsed = 0.0
+        for _ in range(number):
+            game, data = setup()
+            start = time.perf_counter()
+            game.handle_action(data)
+            elapsed += time.perf_counter() - start
+        elapsed /= number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1e6
+
+def bench_proses_get(number, repeat):
+    request = "GET / HTTP/1.0\r\nHost: 127.0.0.1:8000\r\nUser-Agent: python-requests/2.31\r\nAccept: */*\r\n\r\n"
+    return measure(lambda: httpserver.proses(request), number, repeat)
+
+def bench_proses_state(number, repeat):
+    random.seed(SEED)
+    game_id, _ = httpserver.server_manager.find_or_create_game('bench')
+    request = f"GET /state?player_id=0&game_id={game_id} HTTP/1.0\r\nHost: 127.0.0.1:8000\r\nAccept: */*\r\n\r\n"
+    return measure(lambda: httpserver.proses(request), number, repeat)
+
+def bench_proses_post(number, repeat):
+    # Income yang sah dari pemain yang sedang giliran; koin dikembalikan sebelum batas wajib Coup
+    random.seed(SEED)
+    manager = httpserver.server_manager
+    game_id = manager.create_games([[f"P{i}" for i in range(4)]])[0]['game_id']
+    game = manager.get_game(game_id)
+    requests = []
+    for player in game.players:
+        body = json.dumps({'player_id': player.id, 'game_id': game_id, 'action': 'Income'})
+        requests.append(f"POST /action HTTP/1.0\r\nHost: 127.0.0.1:8000\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n{body}")
+    def step():
+        player = game.players[game.current_player_idx]
+        if player.coins >= 9:
+            player.coins = 2
+        httpserver.proses(requests[player.id])
+    return measure(step, number, repeat)
+
+def bench_response(number, repeat):
+    random.seed(SEED)
+    body = json.dumps(make_game().get_state_for_player(0))
+    headers = {'Content-Type': 'application/json'}
+    return measure(lambda: httpserver.response(200, 'OK', body, headers), number, repeat)
+
+def bench_state_json(number, repeat):
+    random.seed(SEED)
+    game = play(make_game(), {'player_id': 0, 'action': 'Tax'})
+    return measure(lambda: json.dumps(game.get_state_for_player(1)), number, repeat)
+
+def bench_rate_limit(number, repeat, players=5000):
+    limiter = TokenBucketLimiter(1e9, 1e9, max_entries=players)
+    keys = [(i // 4, i % 4) for i in range(players)]
+    state = {'i': 0}
+    def step():
+        state['i'] = (state['i'] + 1) % players
+        limiter.allow(keys[state['i']])
+    return measure(step, number, repeat)
+
+def bench_find_or_create(number, repeat, existing=5000):
+    best = None
+    for _ in range(repeat):
+        random.seed(SEED)
+        manager = ServerManager()
+        for i in range(existing * 4):
+            manager.find_or_create_game(f"P{i}")
+        start = time.perf_counter()
+        for i in range(number):
+            manager.find_or_create_game(f"N{i}")
+        elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1e6
+
+def bench_snapshot_restore(number, repeat):
+    random.seed(SEED)
+    game = play(make_game(), {'player_id': 0, 'action': 'Tax'})
+    def step():
+        game.restore(game.snapshot())
+    return measure(step, number, repeat)
+
+def bench_rollout(number, repeat):
+    # Satu rollout bot: restore, determinize, lalu bermain sampai selesai atau batas kedalaman
+    random.seed(SEED)
+    bot = MonteCarloBot(rng=random.Random(SEED))
+    sim = make_game().clone_for_search(random.Random(SEED))
+    root = sim.snapshot()
+    def step():
+        sim.restore(root)
+        sim.determinize(0, bot.rng)
+        bot.playout(sim)
+    return measure(step, number, repeat)
+
+def check_derived(game):
+    # Turunan inkremental (alive_count, ring kursi, responder) harus sama dengan hitung ulang penuh
+    full = game.clone_for_search()
+    full.players_who_passed = set(game.players_who_passed)
+    full.reset_seats()
+    assert (game.alive_count, game.responder_mask, game.pending_responses) == (full.alive_count, full.responder_mask, full.pending_responses)
+    for p in game.players:
+        if not p.is_out:
+            assert (game.next_seat[p.id], game.prev_seat[p.id]) == (full.next_seat[p.id], full.prev_seat[p.id])
+    if game.players[game.current_player_idx].is_out:
+        assert game.next_seat[game.current_player_idx] == full.next_seat[game.current_player_idx]
+
+def engine_digest(games):
+    # Game acak berseed (termasuk quit, aksi tidak valid, snapshot/restore, dan round-trip to_dict); setiap state
+    # dan tampilan pemain di-hash sehingga perubahan perilaku engine terlihat sebagai digest yang berbeda
+    digest = hashlib.sha256()
+    for num_players in (2, 4, 6):
+        for seed in range(games):
+            rng = random.Random(seed * 7 + num_players)
+            game = GameController(num_players, rng=random.Random(seed))
+            for i in range(num_players):
+                game.add_player(f"P{i}")
+            for _ in range(400):
+                if game.state == 'GAME_OVER':
+                    break
+                roll = rng.random()
+                if roll < 0.04:
+                    # Separuhnya pemain yang sedang giliran, agar kursi giliran yang sudah keluar ikut teruji
+                    game.eliminate_player(rng.choice([game.current_player_idx, rng.randrange(num_players)]))
+                elif roll < 0.06:
+                    game.restore(game.snapshot())
+                elif roll < 0.07:
+                    restored = GameController.from_dict(json.loads(json.dumps(game.to_dict())))
+                    restored.rng = game.rng
+                    game = restored
+                acting = game.acting_players()
+                if not acting:
+                    digest.update(b'stuck')
+                    break
+                player_id = rng.choice(acting)
+                moves = game.legal_moves(player_id)
+                if rng.random() < 0.05:
+                    # Pemain yang bukan gilirannya atau aksi yang tidak valid
+                    player_id = rng.randrange(num_players)
+                    moves = [{'player_id': player_id, 'response': 'Pass'}, {'player_id': player_id, 'action': 'Income'}]
+                if not moves:
+                    break
+                game.handle_action(rng.choice(moves))
+                check_derived(game)
+                digest.update(json.dumps([game.to_dict(), game.acting_players()], sort_keys=True).encode())
+                for p in range(num_players):
+                    digest.update(json.dumps(game.build_state_for_player(p), sort_keys=True).encode())
+    return digest.hexdigest()
+
+def collect(quick=False):
+    scale = 10 if quick else 1
+    results = {}
+    results['proses_get_root'] = bench_proses_get(20000 // scale, 5)
+    results['proses_get_state'] = bench_proses_state(20000 // scale, 5)
+    results['proses_post_action'] = bench_proses_post(20000 // scale, 5)
+    results['response'] = bench_response(50000 // scale, 5)
+    results['state_for_player_json'] = bench_state_json(50000 // scale, 5)
+    results['rate_limit_allow'] = bench_rate_limit(50000 // scale, 5)
+    for name, setup in ACTION_SCENARIOS.items():
+        results[f"handle_action_{name}"] = measure_with_setup(setup, 5000 // scale, 5)
+    results['find_or_create_game_5000'] = bench_find_or_create(2000 // scale, 3)
+    results['snapshot_restore'] = bench_snapshot_restore(50000 // scale, 5)
+    results['bot_rollout'] = bench_rollout(2000 // scale, 3)
+    return results
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Coup server microbenchmarks")
+    parser.add_argument('--save', action='store_true', help="simpan hasil sebagai baseline")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="batas regresi relatif (0.25 = 25%%)")
+    parser.add_argument('--quick', action='store_true')
+    parser.add_argument('--check', action='store_true', help="bandingkan engine dengan digest referensi dan periksa turunan inkremental, tanpa benchmark")
+    args = parser.parse_args()
+
+    if args.check:
+        digest = engine_digest(CHECK_GAMES)
+        if digest != ENGINE_DIGEST:
+            print(f"engine digest {digest} differs from {ENGINE_DIGEST}")
+            return 1
+        print("engine check ok")
+        return 0
+
+    results = collect(args.quick)
+    baseline = load_baseline(args.baseline)
+
+    regressions = []
+    for name, value in results.items():
+        line = f"{name:<36} {value:10.2f} us/op"
+        if name in baseline:
+            change = (value - baseline[name]) / baseline[name]
+            line += f"   baseline {baseline[name]:10.2f}  {change:+7.1%}"
+            if change > args.threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) exceeded threshold {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import math
+import time
+import random
+import logging
+import threading
+
+THINK_BUDGET = 0.2
+ROLLOUT_DEPTH = 40
+BOT_DELAY = 1.0
+EXPLORATION = 0.7
+# Dalam rollout, responder lebih sering Pass agar permainan acak tetap bergerak maju
+PASS_BIAS = 0.7
+
+# Pencarian berjalan di thread terpisah agar thread scheduler deadline tidak tertahan;
+# jumlah pencarian bersamaan dibatasi agar bot tidak menghabiskan CPU untuk request pemain
+search_slots = threading.BoundedSemaphore(2)
+
+def evaluate(game, player_id):
+    # 1 untuk menang, 0 untuk kalah; jika rollout terpotong, porsi influence dan koin di antara pemain yang hidup
+    player = game.players[player_id]
+    if player.is_out:
+        return 0.0
+    if game.state == 'GAME_OVER':
+        return 1.0
+    alive = [p for p in game.players if not p.is_out]
+    total = sum(2 * len(p.influence) + p.coins / 10 for p in alive)
+    return (2 * len(player.influence) + player.coins / 10) / total if total else 0.0
+
+# Aksi rollout yang terjangkau per jumlah koin; Coup dipilih begitu mampu agar rollout cepat selesai
+CHEAP_ACTIONS = ['Income', 'ForeignAid', 'Tax', 'Steal', 'Exchange']
+ASSASSIN_ACTIONS = CHEAP_ACTIONS + ['Assassinate']
+
+def rollout_move(game, rng):
+    # Kebijakan rollout ringan: langsung membangun data aksi tanpa legal_moves, mengikuti aturan yang sama
+    state = game.state
+    if state == 'AWAITING_ACTION':
+        player = game.players[game.current_player_idx]
+        if player.coins >= 7:
+            name = 'Coup'
+        else:
+            name = rng.choice(ASSASSIN_ACTIONS if player.coins >= 3 else CHEAP_ACTIONS)
+        return {'player_id': player.id, 'action': name}
+    if state == 'MUST_COUP':
+        return {'player_id': game.current_player_idx, 'action': 'Coup'}
+    if state == 'SELECTING_TARGET':
+        actor = game.action_player.id
+        targets = [p.id for p in game.players if p.id != actor and not p.is_out]
+        return {'player_id': actor, 'target_id': rng.choice(targets)} if targets else None
+    if state == 'AWAITING_BROADCAST_RESPONSE':
+        acting = game.acting_players()
+        if not acting:
+            return None
+        player_id = rng.choice(acting)
+        if rng.random() < PASS_BIAS:
+            return {'player_id': player_id, 'response': 'Pass'}
+        if game.action.name in ('ForeignAid', 'Steal', 'Assassinate') and (not game.action.can_be_bluffed or rng.random() < 0.5):
+            return {'player_id': player_id, 'response': 'Block'}
+        return {'player_id': player_id, 'response': 'Challenge' if game.action.can_be_bluffed else 'Pass'}
+    if state == 'AWAITING_BLOCK_CHALLENGE':
+        return {'player_id': game.action_player.id, 'response': 'Pass' if rng.random() < PASS_BIAS else 'Challenge'}
+    if state == 'CHOOSING_INFLUENCE_TO_LOSE':
+        player = game.player_losing_influence
+        return {'player_id': player.id, 'card': rng.choice(player.influence) if player.influence else None}
+    if state == 'AMBASSADOR_EXCHANGE':
+        return {'player_id': game.action_player.id, 'cards': rng.sample(game.ambassador_cards, game.pre_exchange_influence_count)}
+    return None
+
+class MonteCarloBot:
+    # Determinized Monte Carlo dengan UCB1 di akar: setiap rollout mengacak kartu tersembunyi lalu bermain acak
+    def __init__(self, budget=THINK_BUDGET, depth=ROLLOUT_DEPTH, rng=None):
+        self.budget = budget
+        self.depth = depth
+        self.rng = rng or random.Random()
+        self.last_rollouts = 0
+
+    def choose(self, game, player_id):
+        moves = game.legal_moves(player_id)
+        if len(moves) <= 1:
+            return moves[0] if moves else None
+        sim = game.clone_for_search(self.rng)
+        root = sim.snapshot()
+        totals = [0.0] * len(moves)
+        counts = [0] * len(moves)
+        deadline = time.perf_counter() + self.budget
+        rollouts = 0
+        while rollouts < len(moves) or time.perf_counter() < deadline:
+            if rollouts < len(moves):
+                k = rollouts
+            else:
+                log_n = math.log(rollouts)
+                k = max(range(len(moves)), key=lambda i: totals[i] / counts[i] + EXPLORATION * math.sqrt(log_n / counts[i]))
+            sim.restore(root)
+            sim.determinize(player_id, self.rng)
+            sim.dispatch_action(moves[k])
+            self.playout(sim)
+            totals[k] += evaluate(sim, player_id)
+            counts[k] += 1
+            rollouts += 1
+        self.last_rollouts = rollouts
+        return moves[max(range(len(moves)), key=lambda i: counts[i])]
+
+    def playout(self, sim):
+        for _ in range(self.depth):
+            if sim.state == 'GAME_OVER':
+                return
+            move = rollout_move(sim, self.rng)
+            if move is None:
+                return
+            sim.dispatch_action(move)
+
+class BotDriver:
+    # Menjalankan kursi bot pada satu game: setiap perubahan state menjadwalkan giliran bot yang harus bertindak
+    def __init__(self, game, scheduler, delay=BOT_DELAY, budget=THINK_BUDGET):
+        self.game = game
+        self.scheduler = scheduler
+        self.delay = delay
+        self.budget = budget
+        self.bots = {}
+        game.bot_driver = self
+        game.listeners.append(self.on_change)
+
+    def add_bot(self, player_id):
+        self.bots[player_id] = MonteCarloBot(self.budget)
+
+    def on_change(self, game):
+        # Dipanggil dengan game.lock dipegang
+        if game.state == 'GAME_OVER' or game.moved_to is not None:
+            return
+        for player_id in game.acting_players():
+            if player_id in self.bots:
+                self.scheduler.schedule(self.delay, self.wake, player_id, game.version)
+
+    def wake(self, player_id, version):
+        threading.Thread(target=self.act, args=(player_id, version), name='bot', daemon=True).start()
+
+    def act(self, player_id, version):
+        try:
+            with self.game.lock:
+                if self.game.version != version or self.game.moved_to is not None:
+                    return
+                sim = self.game.clone_for_search()
+            # Pencarian tanpa memegang lock game; hasilnya dibuang jika state berubah sementara itu
+            with search_slots:
+                move = self.bots[player_id].choose(sim, player_id)
+            if move is None:
+                return
+            with self.game.lock:
+                self.game.wait_migration()
+                if self.game.version != version or self.game.moved_to is not None:
+                    return
+                self.game.handle_action(move)
+        except Exception as e:
+            logging.error("bot %s failed: %s", player_id, e)
@@ -0,0 +1,155 @@
+import json
+import threading
+from websocket import encode_frame
+
+class Subscriber:
+    def __init__(self, channel):
+        self.channel = channel
+        self.cond = threading.Condition()
+        # Hanya frame terbaru yang disimpan: subscriber lambat melewatkan versi lama, tidak menumpuk antrian
+        self.pending = None
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, frame):
+        with self.cond:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = frame
+            self.cond.notify()
+
+    def next_frame(self, timeout):
+        with self.cond:
+            if self.pending is None and not self.closed:
+                self.cond.wait(timeout)
+            frame, self.pending = self.pending, None
+            return frame
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.channel.unsubscribe(self)
+
+class Channel:
+    def __init__(self, game_id, game, hub=None):
+        self.game_id = game_id
+        self.game = game
+        self.hub = hub
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.version = None
+        self.body = b''
+        self.frame = b''
+        self.encodes = 0
+        # Sudah dilepas dari hub; subscribe berikutnya harus memakai channel baru
+        self.released = False
+        if hub is not None:
+            game.listeners.append(self.on_change)
+
+    def encode(self):
+        # Dipanggil dengan game.lock dipegang: satu kali encode per versi untuk semua penonton
+        view = self.game.build_spectator_view()
+        self.body = json.dumps(view).encode()
+        self.frame = encode_frame(self.body)
+        self.version = self.game.version
+        self.encodes += 1
+
+    def on_change(self, game):
+        if game.state == 'GAME_OVER' and self.hub is not None:
+            # Frame terakhir masih dikirim ke penonton yang tersambung; listener tetap terpasang di game yang selesai
+            # dan ikut dibuang bersama game-nya
+            self.hub.release(self)
+        with self.lock:
+            if not self.subscribers:
+                # Tanpa subscriber WebSocket, encode ditunda sampai ada yang meminta snapshot
+                return
+            self.encode()
+            frame, targets = self.frame, list(self.subscribers)
+        for sub in targets:
+            sub.offer(frame)
+
+    def snapshot(self):
+        with self.game.lock:
+            with self.lock:
+                if self.version != self.game.version:
+                    self.encode()
+                return self.version, self.body, self.frame
+
+    def subscribe(self):
+        # Mengembalikan None jika channel sudah dilepas (penonton terakhirnya baru saja pergi)
+        sub = Subscriber(self)
+        # game.lock dipegang sampai subscriber terdaftar agar tidak ada versi yang terlewat
+        with self.game.lock:
+            _, _, frame = self.snapshot()
+            with self.lock:
+                if self.released:
+                    return None
+                self.subscribers.add(sub)
+            sub.offer(frame)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers.discard(sub)
+            idle = not self.subscribers
+        if idle and self.hub is not None:
+            self.hub.release(self, only_idle=True)
+
+    def detach(self):
+        # Tidak boleh dipanggil dari dalam listener game (daftar listener sedang diiterasi)
+        with self.game.lock:
+            if self.on_change in self.game.listeners:
+                self.game.listeners.remove(self.on_change)
+
+class BroadcastHub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def channel(self, game_id, game):
+        if game.state == 'GAME_OVER':
+            # Game selesai tidak berubah lagi; snapshot dibuat tanpa menyimpan channel
+            return Channel(game_id, game)
+        with self.lock:
+            channel = self.channels.get(game_id)
+            if channel is None or channel.game is not game:
+                channel = self.channels[game_id] = Channel(game_id, game, self)
+            return channel
+
+    def subscribe(self, game_id, game):
+        while True:
+            sub = self.channel(game_id, game).subscribe()
+            if sub is not None:
+                return sub
+
+    def release(self, channel, only_idle=False):
+        # Channel dilepas saat game selesai atau penonton terakhirnya pergi, agar hub tidak menyimpan channel
+        # untuk setiap game yang pernah ditonton
+        with self.lock:
+            with channel.lock:
+                if channel.released or (only_idle and channel.subscribers):
+                    return
+                channel.released = True
+            if self.channels.get(channel.game_id) is channel:
+                del self.channels[channel.game_id]
+        if only_idle:
+            channel.detach()
+
+    def close_game(self, game_id):
+        # Game pindah ke backend lain: semua penonton diputus dan channel dilepas dari game lama
+        with self.lock:
+            channel = self.channels.pop(game_id, None)
+        if channel is None:
+            return
+        with channel.lock:
+            channel.released = True
+            subscribers = list(channel.subscribers)
+        channel.detach()
+        for sub in subscribers:
+            sub.close()
+
+    def subscriber_count(self):
+        with self.lock:
+            channels = list(self.channels.values())
+        return sum(len(c.subscribers) for c in channels)
@@ -0,0 +1,129 @@
+import re
+import zlib
+import queue
+import struct
+import logging
+import itertools
+import threading
+from collections import namedtuple
+
+MAGIC = b'COUPCAP1'
+# 'B': deklarasi backend (index, panjang label) diikuti label
+BACKEND = struct.Struct('<cHH')
+# 'R': satu request (seq, t, client, backend, status, latency, crc32 body respons, order, panjang request) diikuti request mentah
+REQUEST = struct.Struct('<cIdIHHfIqI')
+QUEUE_SIZE = 10000
+# Order matchmake = game_id * SEATS + player_id
+SEATS = 16
+PLAYER_ID = re.compile(rb'"player_id"\s*:\s*(\d+)')
+GAME_ID = re.compile(rb'"game_id"\s*:\s*(\d+)')
+VERSION = re.compile(rb'"version"\s*:\s*(\d+)')
+NOT_APPLIED = re.compile(rb'"applied"\s*:\s*false')
+
+Record = namedtuple('Record', 'seq t client backend status latency crc order request')
+
+def body_crc(response):
+    # Header (Date, X-Request-ID, Server-Timing) selalu berbeda, jadi hanya body yang dibandingkan
+    end = response.find(b'\r\n\r\n')
+    return zlib.crc32(response[end + 4:] if end != -1 else b'')
+
+def response_order(path, response):
+    # Urutan backend memproses request, dibaca dari responsnya (-1 jika tidak diketahui):
+    # matchmake dari (game_id, player_id) karena id dibagikan berurutan, action dari version game sesudahnya;
+    # aksi yang tidak berlaku dan GET /state melihat version itu, jadi diurutkan setelah aksi yang menghasilkannya
+    end = response.find(b'\r\n\r\n')
+    if path == '/matchmake':
+        game, player = GAME_ID.search(response, end), PLAYER_ID.search(response, end)
+        if game and player:
+            return int(game.group(1)) * SEATS + int(player.group(1))
+    elif path == '/action':
+        match = VERSION.search(response, end)
+        if match:
+            return int(match.group(1)) * 2 + (1 if NOT_APPLIED.search(response, end) else 0)
+    elif path == '/state' and response[9:12] == b'200':
+        match = VERSION.search(response, end)
+        if match:
+            return int(match.group(1)) * 2 + 1
+    return -1
+
+def request_path(request):
+    line = request[:request.find(b'\r\n')].split(b' ')
+    return line[1].split(b'?', 1)[0].decode('latin-1') if len(line) > 1 else ''
+
+class CaptureWriter:
+    # Menulis record ke file capture; label backend ditulis sekali sebagai record 'B' saat pertama dipakai
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.backends = {}
+
+    def write(self, record):
+        index = self.backends.get(record.backend)
+        if index is None:
+            index = self.backends[record.backend] = len(self.backends)
+            label = record.backend.encode()
+            self.file.write(BACKEND.pack(b'B', index, len(label)) + label)
+        self.file.write(REQUEST.pack(b'R', record.seq, record.t, record.client, index, record.status, record.latency, record.crc, record.order, len(record.request)) + record.request)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class CaptureLog:
+    # Dipakai load balancer: record masuk antrian dan ditulis thread sendiri, jalur proxy tidak pernah menunggu disk.
+    # Jika antrian penuh record dibuang dan dihitung di dropped
+    def __init__(self, path, started):
+        self.writer = CaptureWriter(path)
+        self.started = started
+        self.seq = itertools.count()
+        self.clients = itertools.count()
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.dropped = 0
+        threading.Thread(target=self.run, name='capture', daemon=True).start()
+
+    def record(self, client, backend, request, response, arrived, latency):
+        record = Record(next(self.seq), arrived - self.started, client, backend, int(response[9:12] or 0), latency, body_crc(response), response_order(request_path(request), response), request)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            try:
+                self.writer.write(record)
+                if self.queue.empty():
+                    self.writer.flush()
+            except OSError as e:
+                logging.error("capture write failed: %s", e)
+
+def read_capture(path):
+    # Mengembalikan list Record dengan backend berupa label "host:port"
+    records = []
+    backends = {}
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a capture file".format(path))
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        kind = data[offset:offset + 1]
+        if kind == b'B' and offset + BACKEND.size <= len(data):
+            _, index, length = BACKEND.unpack_from(data, offset)
+            offset += BACKEND.size
+            backends[index] = data[offset:offset + length].decode()
+            offset += length
+        elif kind == b'R' and offset + REQUEST.size <= len(data):
+            _, seq, t, client, index, status, latency, crc, order, length = REQUEST.unpack_from(data, offset)
+            offset += REQUEST.size
+            if offset + length > len(data):
+                break
+            records.append(Record(seq, t, client, backends[index], status, latency, crc, order, data[offset:offset + length]))
+            offset += length
+        else:
+            # Ekor file yang terpotong (balancer dimatikan saat menulis)
+            break
+    return records
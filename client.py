@@ -1,7 +1,6 @@
 import pygame
 import sys
-import requests
-import json
+from coup_client import CoupClient, CoupError
 import time
 import random
 import ctypes
@@ -34,6 +33,8 @@ PLAYER_COLORS = [
 ]
 
 SERVER_URL = "http://127.0.0.1:8003" 
+# Quit dikirim saat jendela ditutup; jangan menahan penutupan lebih lama dari ini
+QUIT_TIMEOUT = 1
 
 class PygameGUI:
     def __init__(self):
@@ -55,6 +56,7 @@ class PygameGUI:
         self.card_back_img = pygame.image.load("assets/coup_back.png")
         self.card_back_img = pygame.transform.scale(self.card_back_img, (CARD_WIDTH, CARD_HEIGHT))
 
+        self.api = CoupClient(SERVER_URL)
         self.FETCH_STATE_EVENT = pygame.USEREVENT + 1
         self.reset_to_menu()
         pygame.display.set_caption("Coup - Not Connected")
@@ -62,6 +64,7 @@ class PygameGUI:
     def reset_to_menu(self):
         self.player_id = None
         self.game_id = None
+        self.match = None
         self.player_name = "" 
         self.ui_state = 'MENU' 
         self.game_state = {} 
@@ -81,24 +84,19 @@ class PygameGUI:
         self.ui_state = 'WAITING_IN_LOBBY'
         self.game_state['message'] = "Finding a match..."
         try:
-            payload = {'name': player_name_to_send}
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(f"{SERVER_URL}/matchmake", data=json.dumps(payload), headers=headers)
+            self.match = self.api.matchmake(player_name_to_send)
+            self.player_id = self.match.player_id
+            self.game_id = self.match.game_id
             
-            if response.status_code == 200:
-                data = response.json()
-                self.player_id = data['player_id']
-                self.game_id = data['game_id'] 
-                
-                pygame.display.set_caption(f"Coup - {self.player_name} (Game {self.game_id})")
-                
-                pygame.time.set_timer(self.FETCH_STATE_EVENT, 500) 
-                self.fetch_game_state()
-            else:
-                self.game_state['message'] = response.json().get('error', 'Failed to find a match')
-                self.ui_state = 'FAILED'
+            pygame.display.set_caption(f"Coup - {self.player_name} (Game {self.game_id})")
+            
+            pygame.time.set_timer(self.FETCH_STATE_EVENT, 500) 
+            self.fetch_game_state()
 
-        except requests.exceptions.RequestException as e:
+        except CoupError as e:
+            self.game_state['message'] = e.message or 'Failed to find a match'
+            self.ui_state = 'FAILED'
+        except OSError as e:
             print(f"Error finding match: {e}")
             self.game_state['message'] = "Could not connect to server."
             self.ui_state = 'FAILED'
@@ -106,47 +104,48 @@ class PygameGUI:
     def fetch_game_state(self):
         if self.player_id is None or self.game_id is None: return
         try:
-            response = requests.get(f"{SERVER_URL}/state?player_id={self.player_id}&game_id={self.game_id}")
-            response.raise_for_status()
-            
-            new_game_state = response.json()
+            # Kirim versi yang sudah ditampilkan; server membalas 304 (None) jika belum ada perubahan
+            view = self.api.state(self.match, self.game_state.get('version'))
+            if view is not None:
+                self.apply_game_state(view.raw)
 
-            if self.ui_state == 'WAITING_IN_LOBBY' and new_game_state.get('game_state') != 'WAITING_FOR_PLAYERS':
-                self.ui_state = 'PLAYING'
+        except (CoupError, OSError) as e:
+            print(f"Error fetching state: {e}")
+            self.game_state['message'] = "Error connecting to server..."
 
-            if new_game_state.get('game_state') == 'GAME_OVER':
-                self.ui_state = 'GAME_OVER'
+    def apply_game_state(self, new_game_state):
+        # Abaikan state yang lebih lama dari yang sudah ditampilkan (poll yang datang terlambat)
+        if new_game_state.get('version', 0) < self.game_state.get('version', 0):
+            return
 
-            self.game_state = new_game_state
-            
-            if self.game_state.get('game_state') != 'AMBASSADOR_EXCHANGE':
-                self.exchange_selection = []
+        if self.ui_state == 'WAITING_IN_LOBBY' and new_game_state.get('game_state') != 'WAITING_FOR_PLAYERS':
+            self.ui_state = 'PLAYING'
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching state: {e}")
-            self.game_state['message'] = "Error connecting to server..."
+        if new_game_state.get('game_state') == 'GAME_OVER':
+            self.ui_state = 'GAME_OVER'
+
+        self.game_state = new_game_state
+        
+        if self.game_state.get('game_state') != 'AMBASSADOR_EXCHANGE':
+            self.exchange_selection = []
 
     def post_action(self, payload):
         if self.player_id is None or self.game_id is None: return
         try:
-            headers = {'Content-Type': 'application/json'}
-            payload['player_id'] = self.player_id
-            payload['game_id'] = self.game_id
-            
-            response = requests.post(f"{SERVER_URL}/action", data=json.dumps(payload), headers=headers)
-            response.raise_for_status()
-            self.fetch_game_state()
-        except requests.exceptions.RequestException as e:
+            view = self.api.action(self.match, payload)
+            if view is not None:
+                self.apply_game_state(view.raw)
+            else:
+                self.fetch_game_state()
+        except (CoupError, OSError) as e:
             print(f"Error posting action: {e}")
             self.game_state['message'] = "Error sending action to server..."
 
     def send_quit_signal(self):
         if self.player_id is None or self.game_id is None: return
         try:
-            payload = {'player_id': self.player_id, 'game_id': self.game_id}
-            headers = {'Content-Type': 'application/json'}
-            requests.post(f"{SERVER_URL}/quit", data=json.dumps(payload), headers=headers, timeout=1)
-        except requests.exceptions.RequestException as e:
+            self.api.quit(self.match, timeout=QUIT_TIMEOUT)
+        except (CoupError, OSError) as e:
             print(f"Could not send quit signal to server: {e}")
 
     def run(self):
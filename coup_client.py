@@ -0,0 +1,474 @@
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlsplit, urlencode
+import httpio
+
+DEFAULT_URL = "http://127.0.0.1:8003"
+TIMEOUT = 10
+POOL_SIZE = 8
+IDLE_TIMEOUT = 30
+RETRIES = 4
+BACKOFF = 0.1
+BACKOFF_MAX = 2.0
+# Sama dengan httpfile.LONG_POLL_MAX; server memotong nilai yang lebih besar
+LONG_POLL = 4
+# 429 dan 503 ditolak sebelum game diproses, jadi aman diulang untuk semua request;
+# 502 hanya diulang untuk request idempotent karena backend mungkin sudah memprosesnya
+RETRY_ALWAYS = (429, 503)
+RETRY_IDEMPOTENT = (502,)
+
+class CoupError(Exception):
+    def __init__(self, status, message):
+        super().__init__("{} {}".format(status, message))
+        self.status = status
+        self.message = message
+
+class ConnectFailed(OSError):
+    pass
+
+@dataclass
+class Match:
+    game_id: int
+    player_id: int
+    # Backend tempat game dibuat, jika meja dibentuk matchmaker pusat load balancer
+    backend: Optional[str] = None
+
+@dataclass
+class PlayerInfo:
+    id: int
+    name: str
+    coins: int
+    influence_count: int
+    is_out: bool
+
+@dataclass
+class GameView:
+    game_state: str
+    message: str
+    version: int
+    players: list
+    current_player_idx: int
+    your_id: Optional[int] = None
+    your_cards: list = field(default_factory=list)
+    ui_context: dict = field(default_factory=dict)
+    # Dict asli dari server, untuk kode yang masih bekerja dengan JSON mentah (GUI)
+    raw: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(game_state=data.get('game_state'), message=data.get('message', ''), version=data.get('version', 0), players=[PlayerInfo(**p) for p in data.get('players', [])], current_player_idx=data.get('current_player_idx', 0), your_id=data.get('your_id'), your_cards=list(data.get('your_cards', [])), ui_context=dict(data.get('ui_context') or {}), raw=data)
+
+    @property
+    def is_over(self):
+        return self.game_state == 'GAME_OVER'
+
+    @property
+    def my_turn(self):
+        return self.your_id is not None and self.your_id == self.current_player_idx
+
+@dataclass
+class Response:
+    status: int
+    headers: dict
+    body: bytes
+
+    def json(self):
+        return json.loads(self.body) if self.body else {}
+
+def build_request(host, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    head = "{} {} HTTP/1.1\r\nHost: {}\r\nConnection: keep-alive\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(method, path, host, len(body))
+    return head.encode() + body
+
+def parse_response(raw):
+    head, _, body = raw.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return Response(int(lines[0][9:12]), headers, body)
+
+def retry_delay(attempt, response, rng):
+    # Exponential backoff dengan full jitter agar ribuan client tidak mengulang serempak; Retry-After jadi batas bawah
+    delay = rng.uniform(0, min(BACKOFF_MAX, BACKOFF * 2 ** attempt))
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get('retry-after', 0)))
+        except ValueError:
+            pass
+    return delay
+
+def retryable(response, idempotent):
+    return response.status in RETRY_ALWAYS or (idempotent and response.status in RETRY_IDEMPOTENT)
+
+def state_path(match, version=None, wait=None):
+    params = {'game_id': match.game_id, 'player_id': match.player_id}
+    if version is not None:
+        params['version'] = version
+        if wait:
+            params['wait'] = wait
+    return '/state?' + urlencode(params)
+
+def match_result(response):
+    data = check(response)
+    return Match(data['game_id'], data['player_id'], data.get('backend'))
+
+def view_result(response):
+    # None berarti versi yang dimiliki client masih terbaru (304)
+    if response.status == 304:
+        return None
+    data = check(response)
+    if 'error' in data:
+        raise CoupError(response.status, data['error'])
+    return GameView.from_dict(data)
+
+def action_result(response):
+    data = check(response)
+    return GameView.from_dict(data['state']) if 'state' in data else None
+
+def check(response):
+    if response.status != 200:
+        try:
+            message = response.json().get('error', '')
+        except ValueError:
+            message = response.body[:200].decode('utf-8', errors='ignore')
+        raise CoupError(response.status, message)
+    return response.json()
+
+def split_url(url):
+    parts = urlsplit(url)
+    return parts.hostname or '127.0.0.1', parts.port or 80
+
+class ConnectionPool:
+    # Koneksi keep-alive ke satu host; LIFO agar koneksi yang paling baru dipakai (paling kecil kemungkinan sudah ditutup server)
+    def __init__(self, address, size=POOL_SIZE, timeout=TIMEOUT):
+        self.address = address
+        self.size = size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.idle = []
+
+    def connect(self, timeout=None):
+        try:
+            sock = socket.create_connection(self.address, timeout=timeout or self.timeout)
+        except OSError as e:
+            raise ConnectFailed(e)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def acquire(self, timeout=None):
+        now = time.monotonic()
+        with self.lock:
+            while self.idle:
+                sock, since = self.idle.pop()
+                if now - since < IDLE_TIMEOUT:
+                    sock.settimeout(timeout or self.timeout)
+                    return sock, True
+                sock.close()
+        return self.connect(timeout), False
+
+    def release(self, sock):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append((sock, time.monotonic()))
+                return
+        sock.close()
+
+    def flush(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for sock, _ in idle:
+            sock.close()
+
+    def roundtrip(self, sock, data):
+        sock.sendall(data)
+        raw, rest = httpio.read_message(sock)
+        if raw is None:
+            raise ConnectionError("connection closed by server")
+        return raw, not rest and httpio.wants_keep_alive(raw)
+
+    def exchange(self, data, timeout=None):
+        # timeout menggantikan timeout pool untuk request ini saja
+        sock, reused = self.acquire(timeout)
+        try:
+            raw, keep = self.roundtrip(sock, data)
+        except (OSError, httpio.MessageTooLarge) as e:
+            sock.close()
+            # Hanya koneksi idle yang ditutup/di-reset server (bukan timeout) yang aman dikirim ulang:
+            # server belum membaca request. Buang semua yang idle lalu ulang di koneksi baru
+            if not reused or not isinstance(e, ConnectionError):
+                raise
+            self.flush()
+            sock = self.connect(timeout)
+            try:
+                raw, keep = self.roundtrip(sock, data)
+            except (OSError, httpio.MessageTooLarge):
+                sock.close()
+                raise
+        if keep:
+            sock.settimeout(self.timeout)
+            self.release(sock)
+        else:
+            sock.close()
+        return parse_response(raw)
+
+class CoupClient:
+    # Client blocking; aman dipakai dari banyak thread karena setiap request meminjam koneksi sendiri dari pool
+    def __init__(self, url=DEFAULT_URL, timeout=TIMEOUT, pool_size=POOL_SIZE, retries=RETRIES, rng=None):
+        host, port = split_url(url)
+        self.host = '{}:{}'.format(host, port)
+        self.pool = ConnectionPool((host, port), pool_size, timeout)
+        self.retries = retries
+        self.rng = rng or random.Random()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.flush()
+
+    def request(self, method, path, payload=None, idempotent=True, timeout=None, retries=None):
+        data = build_request(self.host, method, path, payload)
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            last = attempt == retries
+            try:
+                response = self.pool.exchange(data, timeout)
+            except (OSError, httpio.MessageTooLarge) as e:
+                # Gagal connect berarti request belum terkirim; selain itu hanya request idempotent yang diulang
+                if last or not (idempotent or isinstance(e, ConnectFailed)):
+                    raise
+                time.sleep(retry_delay(attempt, None, self.rng))
+                continue
+            if last or not retryable(response, idempotent):
+                return response
+            time.sleep(retry_delay(attempt, response, self.rng))
+
+    def matchmake(self, name):
+        return match_result(self.request('POST', '/matchmake', {'name': name}))
+
+    def state(self, match, version=None, wait=None):
+        return view_result(self.request('GET', state_path(match, version, wait)))
+
+    def action(self, match, payload):
+        payload = dict(payload, player_id=match.player_id, game_id=match.game_id, return_state=True)
+        return action_result(self.request('POST', '/action', payload, idempotent=False))
+
+    def quit(self, match, timeout=None):
+        # Dengan timeout (mis. saat jendela ditutup) quit dikirim sekali saja dan tidak menunggu lebih lama dari itu
+        check(self.request('POST', '/quit', {'player_id': match.player_id, 'game_id': match.game_id}, idempotent=False, timeout=timeout, retries=0 if timeout else None))
+
+    def watch(self, match, wait=LONG_POLL):
+        # Generator view setiap kali versi berubah, memakai long-poll; berhenti setelah GAME_OVER
+        view = self.state(match)
+        yield view
+        while not view.is_over:
+            newer = self.state(match, view.version, wait)
+            if newer is not None:
+                view = newer
+                yield view
+
+async def read_message_async(reader):
+    # Padanan httpio.read_message untuk asyncio.StreamReader (framing Content-Length)
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+        match = httpio.CONTENT_LENGTH.search(b'\r\n' + head)
+        length = int(match.group(1)) if match else 0
+        if length > httpio.MAX_BODY:
+            raise httpio.MessageTooLarge()
+        return head + await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("connection closed by server")
+    except asyncio.LimitOverrunError:
+        raise httpio.MessageTooLarge()
+
+class AsyncConnectionPool:
+    # Versi asyncio dari ConnectionPool; jumlah koneksi terbuka dibatasi semaphore agar ribuan pemain simulasi berbagi pool
+    def __init__(self, address, size=POOL_SIZE, timeout=TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+
+    async def connect(self):
+        try:
+            return await asyncio.wait_for(asyncio.open_connection(*self.address), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ConnectFailed(e)
+
+    def flush(self):
+        idle, self.idle = self.idle, []
+        for (_, writer), _ in idle:
+            writer.close()
+
+    async def roundtrip(self, conn, data):
+        reader, writer = conn
+        writer.write(data)
+        await writer.drain()
+        raw = await read_message_async(reader)
+        return raw, httpio.wants_keep_alive(raw)
+
+    async def exchange(self, data):
+        async with self.slots:
+            now = time.monotonic()
+            conn, reused = None, False
+            while self.idle and conn is None:
+                candidate, since = self.idle.pop()
+                if now - since < IDLE_TIMEOUT:
+                    conn, reused = candidate, True
+                else:
+                    candidate[1].close()
+            if conn is None:
+                conn = await self.connect()
+            try:
+                raw, keep = await asyncio.wait_for(self.roundtrip(conn, data), self.timeout)
+            except (OSError, httpio.MessageTooLarge, asyncio.TimeoutError) as e:
+                conn[1].close()
+                if not reused or not isinstance(e, ConnectionError):
+                    raise
+                self.flush()
+                conn = await self.connect()
+                try:
+                    raw, keep = await asyncio.wait_for(self.roundtrip(conn, data), self.timeout)
+                except (OSError, httpio.MessageTooLarge, asyncio.TimeoutError):
+                    conn[1].close()
+                    raise
+            if keep:
+                self.idle.append((conn, time.monotonic()))
+            else:
+                conn[1].close()
+            return parse_response(raw)
+
+class AsyncCoupClient:
+    # API yang sama dengan CoupClient untuk asyncio; satu instance per event loop
+    def __init__(self, url=DEFAULT_URL, timeout=TIMEOUT, pool_size=100, retries=RETRIES, rng=None):
+        host, port = split_url(url)
+        self.host = '{}:{}'.format(host, port)
+        self.pool = AsyncConnectionPool((host, port), pool_size, timeout)
+        self.retries = retries
+        self.rng = rng or random.Random()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.flush()
+
+    async def request(self, method, path, payload=None, idempotent=True):
+        data = build_request(self.host, method, path, payload)
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = await self.pool.exchange(data)
+            except (OSError, httpio.MessageTooLarge, asyncio.TimeoutError) as e:
+                if last or not (idempotent or isinstance(e, ConnectFailed)):
+                    raise
+                await asyncio.sleep(retry_delay(attempt, None, self.rng))
+                continue
+            if last or not retryable(response, idempotent):
+                return response
+            await asyncio.sleep(retry_delay(attempt, response, self.rng))
+
+    async def matchmake(self, name):
+        return match_result(await self.request('POST', '/matchmake', {'name': name}))
+
+    async def state(self, match, version=None, wait=None):
+        return view_result(await self.request('GET', state_path(match, version, wait)))
+
+    async def action(self, match, payload):
+        payload = dict(payload, player_id=match.player_id, game_id=match.game_id, return_state=True)
+        return action_result(await self.request('POST', '/action', payload, idempotent=False))
+
+    async def quit(self, match):
+        check(await self.request('POST', '/quit', {'player_id': match.player_id, 'game_id': match.game_id}, idempotent=False))
+
+    async def watch(self, match, wait=LONG_POLL):
+        view = await self.state(match)
+        yield view
+        while not view.is_over:
+            newer = await self.state(match, view.version, wait)
+            if newer is not None:
+                view = newer
+                yield view
+
+def auto_move(view, rng=random):
+    # Kebijakan sederhana untuk pemain simulasi: jawab apa pun yang diminta ui_context, atau Income/Coup di giliran sendiri
+    context = view.ui_context
+    kind = context.get('type')
+    if kind == 'selecting_target':
+        targets = [p.id for p in view.players if p.id != view.your_id and not p.is_out]
+        return {'action': context['action'], 'target_id': rng.choice(targets)} if targets else None
+    if kind in ('broadcast_response', 'challenge_block'):
+        return {'response': 'Pass'}
+    if kind == 'lose_influence':
+        return {'card': rng.choice(context['cards'])}
+    if kind == 'ambassador_exchange':
+        return {'action': 'ConfirmExchange', 'cards': rng.sample(context['cards'], context['num_to_keep'])}
+    if view.my_turn and view.game_state in ('AWAITING_ACTION', 'MUST_COUP'):
+        me = view.players[view.your_id]
+        if me.coins >= 7:
+            return {'action': 'Coup'}
+        return {'action': rng.choice(['Income', 'ForeignAid', 'Tax'])}
+    return None
+
+async def simulated_player(client, name, stats, rng):
+    match = await client.matchmake(name)
+    view = await client.state(match)
+    while not view.is_over:
+        move = auto_move(view, rng)
+        if move is not None:
+            newer = await client.action(match, move)
+            stats['actions'] += 1
+            if newer is not None and newer.version != view.version:
+                view = newer
+                continue
+        # Versi dari respons action ikut dipakai, sehingga long-poll berikutnya tidak langsung kembali dengan state yang sudah diketahui
+        newer = await client.state(match, view.version, LONG_POLL)
+        if newer is not None:
+            view = newer
+    stats['games'] += 1
+
+async def run_players(url, players, pool_size, seed):
+    rng = random.Random(seed)
+    stats = {'games': 0, 'actions': 0, 'errors': 0}
+    async with AsyncCoupClient(url, pool_size=pool_size, rng=rng) as client:
+        async def one(i):
+            try:
+                await simulated_player(client, 'sim{}'.format(i), stats, rng)
+            except (OSError, CoupError, httpio.MessageTooLarge, asyncio.TimeoutError) as e:
+                stats['errors'] += 1
+                logging.warning("sim%s failed: %s", i, e)
+        await asyncio.gather(*(one(i) for i in range(players)))
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Pemain simulasi memakai AsyncCoupClient (load test)")
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--players', type=int, default=100, help="jumlah pemain simulasi bersamaan")
+    parser.add_argument('--pool-size', type=int, default=200, help="koneksi keep-alive maksimum")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    start = time.perf_counter()
+    stats = asyncio.run(run_players(args.url, args.players, args.pool_size, args.seed))
+    elapsed = time.perf_counter() - start
+    print("players {} games {} actions {} errors {} in {:.1f}s ({:.0f} actions/s)".format(args.players, stats['games'], stats['actions'], stats['errors'], elapsed, stats['actions'] / elapsed if elapsed else 0))
+
+if __name__=="__main__":
+    main()
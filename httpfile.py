@@ -7,7 +7,21 @@ import json
 from urllib.parse import urlparse, parse_qs
 from collections import Counter
 import random
+import itertools
 import threading
+import time
+import logging
+from metrics import Registry
+import tracing
+import math
+from ratelimit import TokenBucketLimiter
+from scheduler import DeadlineScheduler
+from broadcast import BroadcastHub
+from staticfiles import StaticFiles, FileResponse, parse_range
+from bot import BotDriver, THINK_BUDGET
+import migration
+import httpio
+import profiling
 
 class Action:
     name = ""
@@ -88,9 +102,9 @@ class GameState:
         self.actions = {'Income': Income(), 'ForeignAid': ForeignAid(), 'Coup': Coup(), 'Tax': Tax(), 'Steal': Steal(), 'Assassinate': Assassinate(), 'Exchange': Exchange()}
         self.cards_available = ['Duke', 'Captain', 'Assassin', 'Ambassador', 'Contessa']
 
-    def get_new_deck(self):
+    def get_new_deck(self, rng=random):
         deck = self.cards_available * 3
-        random.shuffle(deck)
+        rng.shuffle(deck)
         return deck
 
 class Player:
@@ -109,11 +123,52 @@ class Player:
         return card_name in self.influence
     def to_dict_for_others(self):
         return {'id': self.id, 'name': self.name, 'coins': self.coins, 'influence_count': len(self.influence), 'is_out': self.is_out}
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'coins': self.coins, 'influence': list(self.influence), 'is_out': self.is_out}
+    @classmethod
+    def from_dict(cls, data):
+        player = cls.__new__(cls)
+        player.id = data['id']
+        player.name = data['name']
+        player.coins = data['coins']
+        player.influence = list(data['influence'])
+        player.is_out = data['is_out']
+        return player
+
+TURN_TIMEOUT = 30
+# Ruang id game per node: id game unik di seluruh fleet selama setiap backend memakai --node-id berbeda
+GAME_ID_STRIDE = 1000000
+# Batas tunggu long-poll /state; di bawah timeout forwarder antar worker (migration.TIMEOUT) dan upstream load balancer
+LONG_POLL_MAX = 4
+# Game aktif (lobby dan berjalan) per worker yang boleh dibuat matchmaker pusat lewat /admin/games
+MAX_GAMES = 1000
+# Detik game selesai tetap disimpan agar pemain dan penonton masih bisa membaca hasil akhirnya
+FINISHED_GAME_GRACE = 300
+
+# Peer yang boleh menyisipkan X-Forwarded-For: balancer lokal dan worker lain di host yang sama
+LOOPBACK = ('127.0.0.1', '::1')
+
+# State yang menunggu input pemain tertentu; jika deadline lewat, aksi default dijalankan
+TIMED_STATES = ['AWAITING_ACTION', 'MUST_COUP', 'SELECTING_TARGET', 'AWAITING_BROADCAST_RESPONSE', 'AWAITING_BLOCK_CHALLENGE', 'CHOOSING_INFLUENCE_TO_LOSE', 'AMBASSADOR_EXCHANGE']
+
+class GameMoved(Exception):
+    # Game sudah dimigrasikan ke backend lain; request harus diteruskan ke sana
+    def __init__(self, target):
+        super().__init__(target)
+        self.target = target
 
 class GameController:
-    def __init__(self, num_players=4):
+    def __init__(self, num_players=4, scheduler=None, turn_timeout=TURN_TIMEOUT, rng=None):
         self.num_players_required = num_players
-        self.deck = GameState().get_new_deck()
+        self.scheduler = scheduler
+        self.turn_timeout = turn_timeout
+        # Sumber acak per game; default modul random sehingga random.seed() tetap berlaku
+        self.rng = rng if rng is not None else random
+        self.version = 0
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.listeners = []
+        self.deck = GameState().get_new_deck(self.rng)
         self.players = []
         self.state = 'WAITING_FOR_PLAYERS'
         self.current_player_idx = 0
@@ -129,28 +184,356 @@ class GameController:
         self.ambassador_cards = []
         self.pre_exchange_influence_count = 0
         self.players_who_passed = set()
+        # Turunan players/potential_responders yang diperbarui per event, bukan dipindai ulang setiap aksi:
+        # jumlah pemain hidup, ring kursi hidup (kursi giliran yang sudah keluar tetap menunjuk ke kursi hidup
+        # berikutnya), bitmask potential_responders, dan jumlah responder hidup yang belum Pass
+        self.alive_count = 0
+        self.next_seat = []
+        self.prev_seat = []
+        self.responder_mask = 0
+        self.pending_responses = 0
+        self.moved_to = None
+        # Snapshot game sedang dikirim ke backend lain; perubahan ditahan sampai migrasi selesai atau dibatalkan
+        self.migrating = False
+        self.bot_driver = None
+        # Riwayat untuk recorder; None berarti game tidak direkam
+        self.history = None
+        self.starting_hands = None
+        self.pending_claim = None
+        self.pending_block = None
+
+    def to_dict(self):
+        # Referensi ke Player disimpan sebagai id; action sebagai nama di GameState().actions
+        def pid(player):
+            return player.id if player else None
+        return {
+            'format': 1, 'num_players': self.num_players_required, 'version': self.version,
+            'deck': list(self.deck), 'players': [p.to_dict() for p in self.players],
+            'state': self.state, 'current_player_idx': self.current_player_idx, 'message': self.message,
+            'action': self.action.name if self.action else None,
+            'action_player': pid(self.action_player), 'target_player': pid(self.target_player),
+            'potential_responders': [p.id for p in self.potential_responders],
+            'blocker': pid(self.blocker), 'challenger': pid(self.challenger),
+            'player_losing_influence': pid(self.player_losing_influence),
+            'post_influence_loss_state': self.post_influence_loss_state,
+            'ambassador_cards': list(self.ambassador_cards),
+            'pre_exchange_influence_count': self.pre_exchange_influence_count,
+            'players_who_passed': sorted(self.players_who_passed),
+            'bots': sorted(self.bot_driver.bots) if self.bot_driver else [],
+            'history': [list(e) for e in self.history] if self.history is not None else None,
+            'starting_hands': self.starting_hands,
+            'pending_claim': self.pending_claim, 'pending_block': self.pending_block,
+        }
+
+    @classmethod
+    def from_dict(cls, data, scheduler=None, turn_timeout=TURN_TIMEOUT):
+        if data.get('format') != 1:
+            raise ValueError("unsupported game format")
+        game = cls(data['num_players'], scheduler, turn_timeout)
+        game.version = data['version']
+        game.deck = list(data['deck'])
+        game.players = [Player.from_dict(p) for p in data['players']]
+        def player(player_id):
+            return game.players[player_id] if player_id is not None else None
+        game.state = data['state']
+        game.current_player_idx = data['current_player_idx']
+        game.message = data['message']
+        game.action = GameState().actions[data['action']] if data['action'] else None
+        game.action_player = player(data['action_player'])
+        game.target_player = player(data['target_player'])
+        game.potential_responders = [game.players[i] for i in data['potential_responders']]
+        game.blocker = player(data['blocker'])
+        game.challenger = player(data['challenger'])
+        game.player_losing_influence = player(data['player_losing_influence'])
+        game.post_influence_loss_state = data['post_influence_loss_state']
+        game.ambassador_cards = list(data['ambassador_cards'])
+        game.pre_exchange_influence_count = data['pre_exchange_influence_count']
+        game.players_who_passed = set(data['players_who_passed'])
+        game.reset_seats()
+        game.restored_bots = data.get('bots', [])
+        if data.get('history') is not None:
+            game.history = [tuple(e) for e in data['history']]
+        game.starting_hands = data.get('starting_hands')
+        game.pending_claim = tuple(data['pending_claim']) if data.get('pending_claim') else None
+        game.pending_block = data.get('pending_block')
+        return game
+
+    def snapshot(self):
+        # State yang berubah selama permainan sebagai tuple datar: murah dibuat dan dipulihkan untuk pencarian bot.
+        # Objek Action tidak disalin karena tidak punya state; Player dirujuk lewat id.
+        def pid(player):
+            return player.id if player else None
+        return (tuple(self.deck), tuple((p.coins, tuple(p.influence), p.is_out) for p in self.players), self.state, self.current_player_idx, self.message, self.action, pid(self.action_player), pid(self.target_player), tuple(p.id for p in self.potential_responders), pid(self.blocker), pid(self.challenger), pid(self.player_losing_influence), self.post_influence_loss_state, tuple(self.ambassador_cards), self.pre_exchange_influence_count, frozenset(self.players_who_passed), self.pending_claim, self.pending_block, self.alive_count, tuple(self.next_seat), tuple(self.prev_seat), self.responder_mask, self.pending_responses)
+
+    def restore(self, snap):
+        (deck, players, self.state, self.current_player_idx, self.message, self.action, action_player, target_player, responders, blocker, challenger, losing, self.post_influence_loss_state, ambassador_cards, self.pre_exchange_influence_count, passed, self.pending_claim, self.pending_block, self.alive_count, next_seat, prev_seat, self.responder_mask, self.pending_responses) = snap
+        self.deck = list(deck)
+        for player, (coins, influence, is_out) in zip(self.players, players):
+            player.coins = coins
+            player.influence = list(influence)
+            player.is_out = is_out
+        by_id = self.players
+        self.action_player = by_id[action_player] if action_player is not None else None
+        self.target_player = by_id[target_player] if target_player is not None else None
+        self.potential_responders = [by_id[i] for i in responders]
+        self.blocker = by_id[blocker] if blocker is not None else None
+        self.challenger = by_id[challenger] if challenger is not None else None
+        self.player_losing_influence = by_id[losing] if losing is not None else None
+        self.ambassador_cards = list(ambassador_cards)
+        self.players_who_passed = set(passed)
+        self.next_seat = list(next_seat)
+        self.prev_seat = list(prev_seat)
+
+    def clone_for_search(self, rng=None):
+        # Salinan tanpa lock, scheduler, listener, atau version; hanya untuk simulasi dengan dispatch_action
+        clone = GameController.__new__(GameController)
+        clone.num_players_required = self.num_players_required
+        clone.scheduler = None
+        clone.rng = rng if rng is not None else random.Random()
+        clone.moved_to = None
+        clone.history = None
+        clone.players = [Player.from_dict({'id': p.id, 'name': p.name, 'coins': 0, 'influence': [], 'is_out': False}) for p in self.players]
+        clone.restore(self.snapshot())
+        return clone
+
+    def determinize(self, player_id, rng):
+        # Acak ulang kartu yang tidak terlihat oleh player_id: deck, kartu lawan, dan tawaran ambassador milik pemain lain.
+        # Jumlah kartu setiap pemain tetap, sehingga state tetap konsisten untuk rollout.
+        hidden_players = [p for p in self.players if p.id != player_id]
+        pool = list(self.deck)
+        for p in hidden_players:
+            pool.extend(p.influence)
+        ambassador_hidden = self.state == 'AMBASSADOR_EXCHANGE' and self.action_player and self.action_player.id != player_id
+        if ambassador_hidden:
+            pool.extend(self.ambassador_cards)
+        rng.shuffle(pool)
+        for p in hidden_players:
+            count = len(p.influence)
+            p.influence, pool = pool[:count], pool[count:]
+        if ambassador_hidden:
+            count = len(self.ambassador_cards)
+            self.ambassador_cards, pool = pool[:count], pool[count:]
+        self.deck = pool
+
+    def reset_seats(self):
+        # Hitung ulang semua turunan dari awal; hanya saat pemain bergabung dan setelah from_dict
+        count = len(self.players)
+        alive = [p.id for p in self.players if not p.is_out]
+        self.alive_count = len(alive)
+        self.next_seat = [0] * count
+        self.prev_seat = [0] * count
+        for i, seat in enumerate(alive):
+            self.next_seat[seat] = alive[(i + 1) % len(alive)]
+            self.prev_seat[seat] = alive[i - 1]
+        if alive:
+            # Kursi yang sudah keluar menunjuk ke kursi hidup berikutnya
+            following = alive[0]
+            for seat in range(count - 1, -1, -1):
+                if self.players[seat].is_out:
+                    self.next_seat[seat] = following
+                else:
+                    following = seat
+        self.set_responders(self.potential_responders, clear=False)
+
+    def set_responders(self, players, clear=True):
+        if clear:
+            self.players_who_passed.clear()
+        self.potential_responders = players
+        self.responder_mask = 0
+        self.pending_responses = 0
+        for p in players:
+            self.responder_mask |= 1 << p.id
+            if not p.is_out and p.id not in self.players_who_passed:
+                self.pending_responses += 1
+
+    def is_responder(self, player_id):
+        return isinstance(player_id, int) and player_id >= 0 and self.responder_mask >> player_id & 1
+
+    def seat_out(self, player):
+        # Dipanggil sekali saat is_out pemain berubah menjadi True: lepas kursinya dari ring
+        seat = player.id
+        self.alive_count -= 1
+        before, after = self.prev_seat[seat], self.next_seat[seat]
+        self.next_seat[before] = after
+        self.prev_seat[after] = before
+        # Hanya kursi giliran yang dibaca next_turn/last_standing, jadi hanya penunjuknya yang dijaga tetap hidup
+        current = self.current_player_idx
+        if self.players[current].is_out and self.next_seat[current] == seat:
+            self.next_seat[current] = after
+        if self.responder_mask >> seat & 1 and seat not in self.players_who_passed:
+            self.pending_responses -= 1
+
+    def last_standing(self):
+        # Pemain hidup terakhir (atau None); dipakai saat alive_count <= 1
+        if not self.alive_count:
+            return None
+        return self.players[self.next_seat[self.current_player_idx]]
+
+    def end_if_decided(self):
+        if self.alive_count > 1:
+            return False
+        winner = self.last_standing()
+        self.state = 'GAME_OVER'
+        self.message = f"Winner: {winner.name if winner else 'None'}"
+        return True
+
+    def acting_players(self):
+        # Id pemain yang bisa mengirim aksi pada state sekarang
+        if self.state in ['AWAITING_ACTION', 'MUST_COUP']:
+            return [self.current_player_idx]
+        if self.state in ['SELECTING_TARGET', 'AWAITING_BLOCK_CHALLENGE', 'AMBASSADOR_EXCHANGE']:
+            return [self.action_player.id] if self.action_player else []
+        if self.state == 'AWAITING_BROADCAST_RESPONSE':
+            return [p.id for p in self.potential_responders if p.id not in self.players_who_passed and not p.is_out]
+        if self.state == 'CHOOSING_INFLUENCE_TO_LOSE' and self.player_losing_influence:
+            return [self.player_losing_influence.id]
+        return []
+
+    def legal_moves(self, player_id):
+        # Data aksi yang valid untuk dispatch_action, mengikuti aturan yang sama dengan ui_context
+        if player_id not in self.acting_players():
+            return []
+        player = self.players[player_id]
+        if self.state == 'MUST_COUP':
+            return [{'player_id': player_id, 'action': 'Coup'}]
+        if self.state == 'AWAITING_ACTION':
+            return [{'player_id': player_id, 'action': name} for name, action in GameState().actions.items() if player.coins >= action.coins_needed]
+        if self.state == 'SELECTING_TARGET':
+            return [{'player_id': player_id, 'target_id': p.id} for p in self.players if p.id != player_id and not p.is_out]
+        if self.state == 'AWAITING_BROADCAST_RESPONSE':
+            moves = [{'player_id': player_id, 'response': 'Pass'}]
+            if self.action.can_be_bluffed:
+                moves.append({'player_id': player_id, 'response': 'Challenge'})
+            if self.action.name in ['ForeignAid', 'Steal', 'Assassinate']:
+                moves.append({'player_id': player_id, 'response': 'Block'})
+            return moves
+        if self.state == 'AWAITING_BLOCK_CHALLENGE':
+            return [{'player_id': player_id, 'response': 'Pass'}, {'player_id': player_id, 'response': 'Challenge'}]
+        if self.state == 'CHOOSING_INFLUENCE_TO_LOSE':
+            return [{'player_id': player_id, 'card': card} for card in sorted(set(player.influence))] or [{'player_id': player_id, 'card': None}]
+        if self.state == 'AMBASSADOR_EXCHANGE':
+            keeps = sorted(set(itertools.combinations(sorted(self.ambassador_cards), self.pre_exchange_influence_count)))
+            return [{'player_id': player_id, 'cards': list(keep)} for keep in keeps]
+        return []
+
+    def record(self, kind, actor, other, bluff, success):
+        # Satu event: (kind, action, actor, other, bluff, success); -1 berarti tidak berlaku
+        self.history.append((kind, self.action.name if self.action else None, actor, other, bluff, success))
+
+    def settle_claim(self, success):
+        # Aksi yang diumumkan selesai: berhasil dieksekusi atau dihentikan oleh challenge/block
+        if self.pending_claim is not None:
+            actor, target, bluff = self.pending_claim
+            self.pending_claim = None
+            self.record('action', actor, target, bluff, int(success))
+
+    def check_moved(self):
+        if self.moved_to is not None:
+            raise GameMoved(self.moved_to)
+
+    def wait_migration(self):
+        # Dipanggil dengan self.lock; jangan dipanggil sambil memegang lock ServerManager
+        while self.migrating:
+            self.changed.wait()
+
+    def fingerprint(self):
+        return (self.state, self.message, self.current_player_idx, len(self.players), len(self.players_who_passed), len(self.ambassador_cards), tuple((p.coins, len(p.influence)) for p in self.players))
+
+    def commit_change(self, before):
+        # Naikkan version hanya jika ada yang berubah, bangunkan yang menunggu, lalu pasang deadline baru
+        if self.fingerprint() == before:
+            return
+        self.version += 1
+        self.changed.notify_all()
+        for listener in self.listeners:
+            listener(self)
+        self.schedule_deadline()
+
+    def schedule_deadline(self):
+        if self.scheduler is not None and self.state in TIMED_STATES:
+            self.scheduler.schedule(self.turn_timeout, self.on_deadline, self.version)
+
+    def wait_for_change(self, version, timeout):
+        with self.lock:
+            if self.version == version:
+                self.changed.wait(timeout)
+            return self.version
+
+    def on_deadline(self, version):
+        with self.lock:
+            # Migrasi yang dibatalkan memasang deadline lagi
+            if version != self.version or self.moved_to is not None or self.migrating:
+                return
+            before = self.fingerprint()
+            self.apply_default_action()
+            self.commit_change(before)
+
+    def apply_default_action(self):
+        if self.state in ['AWAITING_ACTION', 'MUST_COUP']:
+            if self.state == 'MUST_COUP':
+                self.dispatch_action({'player_id': self.current_player_idx, 'action': 'Coup'})
+            else:
+                self.dispatch_action({'player_id': self.current_player_idx, 'action': 'Income'})
+        # Coup default langsung memilih target pada deadline yang sama
+        if self.state == 'SELECTING_TARGET':
+            targets = [p for p in self.players if p.id != self.action_player.id and not p.is_out]
+            if targets:
+                self.dispatch_action({'player_id': self.action_player.id, 'target_id': targets[0].id})
+        elif self.state == 'AWAITING_BROADCAST_RESPONSE':
+            for p in list(self.potential_responders):
+                if self.state != 'AWAITING_BROADCAST_RESPONSE':
+                    break
+                if p.id not in self.players_who_passed:
+                    self.dispatch_action({'player_id': p.id, 'response': 'Pass'})
+        elif self.state == 'AWAITING_BLOCK_CHALLENGE':
+            self.dispatch_action({'player_id': self.action_player.id, 'response': 'Pass'})
+        elif self.state == 'CHOOSING_INFLUENCE_TO_LOSE' and self.player_losing_influence:
+            self.dispatch_action({'player_id': self.player_losing_influence.id, 'card': None})
+        elif self.state == 'AMBASSADOR_EXCHANGE':
+            self.handle_ambassador_cards(self.ambassador_cards[:self.pre_exchange_influence_count])
 
     def add_player(self, name):
+        with self.lock:
+            self.wait_migration()
+            self.check_moved()
+            before = self.fingerprint()
+            player_id = self.join_player(name)
+            self.commit_change(before)
+            return player_id
+
+    def join_player(self, name):
         if len(self.players) >= self.num_players_required:
             return None 
         player_id = len(self.players)
         new_player = Player(player_id, name, self.deck)
         self.players.append(new_player)
+        self.reset_seats()
         self.message = f"Waiting for {self.num_players_required - len(self.players)} more players..."
         if len(self.players) == self.num_players_required:
             self.state = 'AWAITING_ACTION'
             self.message = f"Game starting! {self.players[0].name}'s turn."
+            if self.history is not None:
+                self.starting_hands = [list(p.influence) for p in self.players]
         return player_id
 
     def eliminate_player(self, player_id):
+        with self.lock:
+            self.wait_migration()
+            self.check_moved()
+            before = self.fingerprint()
+            self.remove_player(player_id)
+            self.commit_change(before)
+
+    def remove_player(self, player_id):
         if 0 <= player_id < len(self.players):
             player = self.players[player_id]
             if not player.is_out:
                 player.is_out = True
+                self.seat_out(player)
                 player.coins = 0
                 for card in player.influence:
                     self.deck.append(card)
-                random.shuffle(self.deck)
+                self.rng.shuffle(self.deck)
                 player.influence = []
                 self.message = f"{player.name} has been eliminated."
                 
@@ -159,22 +542,23 @@ class GameController:
                 elif self.current_player_idx == player_id:
                     self.next_turn()
             
-            alive = [p for p in self.players if not p.is_out]
-            if len(alive) <= 1:
-                self.state = 'GAME_OVER'
-                self.message = f"Winner: {alive[0].name if alive else 'None'}"
-                return
+            self.end_if_decided()
 
     def get_state_for_player(self, player_id):
+        with self.lock:
+            self.check_moved()
+            return self.build_state_for_player(player_id)
+
+    def build_state_for_player(self, player_id):
         if player_id >= len(self.players):
             return {'error': 'Player not joined yet'}
         player = self.players[player_id]
-        state = {'game_state': self.state, 'message': self.message, 'your_id': player.id, 'your_cards': player.influence, 'players': [p.to_dict_for_others() for p in self.players], 'current_player_idx': self.current_player_idx, 'ui_context': {}}
+        state = {'game_state': self.state, 'message': self.message, 'your_id': player.id, 'your_cards': list(player.influence), 'players': [p.to_dict_for_others() for p in self.players], 'current_player_idx': self.current_player_idx, 'ui_context': {}, 'version': self.version}
         
         if self.state == 'SELECTING_TARGET' and self.action_player.id == player_id:
             state['ui_context'] = {'type': 'selecting_target', 'action': self.action.name}
         elif self.state == 'AWAITING_BROADCAST_RESPONSE':
-            if any(p.id == player_id for p in self.potential_responders):
+            if self.is_responder(player_id):
                 action_name = self.action.name
                 can_challenge = self.action.can_be_bluffed
                 can_block = (action_name == 'ForeignAid')
@@ -191,13 +575,28 @@ class GameController:
         elif self.state == 'AWAITING_BLOCK_CHALLENGE' and self.action_player.id == player_id:
             state['ui_context'] = {'type': 'challenge_block'}
         elif self.state == 'CHOOSING_INFLUENCE_TO_LOSE' and self.player_losing_influence and self.player_losing_influence.id == player_id:
-            state['ui_context'] = {'type': 'lose_influence', 'cards': self.player_losing_influence.influence, 'player_losing_influence_id': self.player_losing_influence.id}
+            state['ui_context'] = {'type': 'lose_influence', 'cards': list(self.player_losing_influence.influence), 'player_losing_influence_id': self.player_losing_influence.id}
         elif self.state == 'AMBASSADOR_EXCHANGE' and self.action_player.id == player_id:
-            state['ui_context'] = {'type': 'ambassador_exchange', 'cards': self.ambassador_cards, 'num_to_keep': self.pre_exchange_influence_count}
+            state['ui_context'] = {'type': 'ambassador_exchange', 'cards': list(self.ambassador_cards), 'num_to_keep': self.pre_exchange_influence_count}
         
         return state
 
+    def build_spectator_view(self):
+        # View publik untuk penonton: tanpa kartu siapa pun, hanya data to_dict_for_others
+        view = {'game_state': self.state, 'message': self.message, 'players': [p.to_dict_for_others() for p in self.players], 'current_player_idx': self.current_player_idx, 'version': self.version, 'spectator': True, 'pending': None}
+        if self.action and self.action_player:
+            view['pending'] = {'action': self.action.name, 'player_id': self.action_player.id, 'target_id': self.target_player.id if self.target_player else None, 'blocker_id': self.blocker.id if self.blocker else None}
+        return view
+
     def handle_action(self, data):
+        with self.lock:
+            self.wait_migration()
+            self.check_moved()
+            before = self.fingerprint()
+            self.dispatch_action(data)
+            self.commit_change(before)
+
+    def dispatch_action(self, data):
         player_id = data.get('player_id')
         if self.state in ['AWAITING_ACTION', 'MUST_COUP']:
             if player_id != self.current_player_idx: return
@@ -213,10 +612,12 @@ class GameController:
                     return
                 
                 self.target_player = target_player
+                if self.history is not None and self.pending_claim is not None:
+                    self.pending_claim = (self.pending_claim[0], target_player.id, self.pending_claim[2])
                 self.begin_response_phase()
         
         elif self.state == 'AWAITING_BROADCAST_RESPONSE':
-            if not any(p.id == player_id for p in self.potential_responders): return
+            if not self.is_responder(player_id): return
             response = data.get('response')
             if response in ['Challenge', 'Block']:
                 if response == 'Challenge': 
@@ -224,17 +625,23 @@ class GameController:
                     self.resolve_action_challenge()
                 elif response == 'Block': 
                     self.blocker = self.players[player_id]
+                    if self.history is not None:
+                        self.pending_block = int(not any(self.blocker.has_card(card) for card in self.action.blockable_by))
                     self.state = 'AWAITING_BLOCK_CHALLENGE'
                     self.message = f"{self.blocker.name} blocks. {self.action_player.name}, do you challenge?"
-                self.potential_responders = []
-                self.players_who_passed.clear()
+                self.set_responders([])
             elif response == 'Pass':
-                self.players_who_passed.add(player_id)
+                if player_id not in self.players_who_passed:
+                    self.players_who_passed.add(player_id)
+                    if not self.players[player_id].is_out:
+                        self.pending_responses -= 1
                 self.check_all_passed()
         elif self.state == 'AWAITING_BLOCK_CHALLENGE':
             if player_id != self.action_player.id: return
             if data.get('response') == 'Pass':
                 self.message = f"Block by {self.blocker.name} succeeds."
+                if self.history is not None:
+                    self.record('block', self.blocker.id, self.action_player.id, self.pending_block, 1)
                 self.next_turn()
             elif data.get('response') == 'Challenge':
                 self.challenger = self.action_player
@@ -246,10 +653,13 @@ class GameController:
             if card_to_lose not in self.player_losing_influence.influence and self.player_losing_influence.influence:
                 card_to_lose = self.player_losing_influence.influence[0]
             
+            was_out = self.player_losing_influence.is_out
             self.player_losing_influence.lose_influence(card_to_lose)
+            if self.player_losing_influence.is_out and not was_out:
+                self.seat_out(self.player_losing_influence)
             
             if self.player_losing_influence.is_out:
-                self.eliminate_player(self.player_losing_influence.id)
+                self.remove_player(self.player_losing_influence.id)
             
             if self.post_influence_loss_state == 'EXECUTE_ACTION': self.execute_action()
             else: self.next_turn()
@@ -268,6 +678,10 @@ class GameController:
 
         if self.action.coins_needed > 0:
             self.action_player.coins -= self.action.coins_needed
+        if self.history is not None:
+            # Bluff: aksi karakter diumumkan tanpa memegang kartunya; -1 untuk aksi tanpa karakter
+            bluff = int(not self.action_player.has_card(self.action.character)) if self.action.character else -1
+            self.pending_claim = (self.action_player.id, -1, bluff)
         
         if self.action.has_target:
             self.state = 'SELECTING_TARGET'
@@ -276,7 +690,7 @@ class GameController:
             self.begin_response_phase()
 
     def begin_response_phase(self):
-        self.players_who_passed.clear()
+        self.set_responders([])
         action_name = self.action.name
         if self.target_player: self.message = f"{self.action_player.name} uses {action_name} on {self.target_player.name}."
         else: self.message = f"{self.action_player.name} uses {action_name}."
@@ -284,22 +698,22 @@ class GameController:
             self.execute_action()
             return
         if action_name in ['Steal', 'Assassinate']:
-            if self.target_player and not self.target_player.is_out: self.potential_responders = [self.target_player]
-            else: self.potential_responders = []
+            if self.target_player and not self.target_player.is_out: self.set_responders([self.target_player])
         elif action_name == 'Coup':
             self.execute_action()
             return
         else:
-            self.potential_responders = [p for p in self.players if p.id != self.action_player.id and not p.is_out]
+            self.set_responders([p for p in self.players if p.id != self.action_player.id and not p.is_out])
         if self.potential_responders: self.state = 'AWAITING_BROADCAST_RESPONSE'
         else: self.execute_action()
 
     def check_all_passed(self):
-        responder_ids = {p.id for p in self.potential_responders if not p.is_out}
-        if self.players_who_passed.issuperset(responder_ids):
+        if not self.pending_responses:
             self.execute_action()
 
     def execute_action(self):
+        if self.history is not None:
+            self.settle_claim(True)
         self.message = f"{self.action_player.name}'s {self.action.name} succeeds."
         self.action.play(self.action_player, self.target_player)
         if self.action.name in ['Coup', 'Assassinate']:
@@ -313,10 +727,7 @@ class GameController:
             self.post_influence_loss_state = 'NEXT_TURN'
             self.message = f"{self.target_player.name} must lose an influence."
         elif self.action.name == 'Exchange':
-            alive = [p for p in self.players if not p.is_out]
-            if len(alive) <= 1:
-                self.state = 'GAME_OVER'
-                self.message = f"Winner: {alive[0].name if alive else 'None'}"
+            if self.end_if_decided():
                 return
             
             self.state = 'AMBASSADOR_EXCHANGE'
@@ -328,11 +739,14 @@ class GameController:
 
     def resolve_action_challenge(self):
         char = self.action.character
+        if self.history is not None:
+            bluff = int(not self.action_player.has_card(char))
+            self.record('challenge', self.action_player.id, self.challenger.id, bluff, bluff)
         if self.action_player.has_card(char):
             self.message = f"{self.action_player.name} reveals {char}!"
             self.action_player.influence.remove(char)
             self.deck.append(char)
-            random.shuffle(self.deck)
+            self.rng.shuffle(self.deck)
             self.action_player.influence.append(self.deck.pop())
             self.player_losing_influence = self.challenger
             self.state = 'CHOOSING_INFLUENCE_TO_LOSE'
@@ -345,6 +759,10 @@ class GameController:
 
     def resolve_block_challenge(self):
         possible = self.action.blockable_by
+        if self.history is not None:
+            bluff = int(not any(self.blocker.has_card(card) for card in possible))
+            self.record('block_challenge', self.blocker.id, self.challenger.id, bluff, bluff)
+            self.record('block', self.blocker.id, self.action_player.id, self.pending_block, 1 - bluff)
         if any(self.blocker.has_card(card) for card in possible):
             self.message = f"Block by {self.blocker.name} was valid!"
             self.player_losing_influence = self.challenger
@@ -367,21 +785,19 @@ class GameController:
             return
         cards_to_return = self.ambassador_cards[:]
         for card in cards_to_keep: cards_to_return.remove(card)
-        self.action_player.influence = cards_to_keep
+        self.action_player.influence = list(cards_to_keep)
         self.deck.extend(cards_to_return)
-        random.shuffle(self.deck)
+        self.rng.shuffle(self.deck)
         self.next_turn()
 
     def next_turn(self):
-        self.action = None; self.action_player = None; self.target_player = None; self.potential_responders = []; self.blocker = None; self.challenger = None; self.player_losing_influence = None; self.post_influence_loss_state = None; self.players_who_passed.clear()
-        alive = [p for p in self.players if not p.is_out]
-        if len(alive) <= 1:
-            self.state = 'GAME_OVER'
-            self.message = f"Winner: {alive[0].name if alive else 'None'}"
+        if self.history is not None:
+            self.settle_claim(False)
+            self.pending_block = None
+        self.action = None; self.action_player = None; self.target_player = None; self.set_responders([]); self.blocker = None; self.challenger = None; self.player_losing_influence = None; self.post_influence_loss_state = None
+        if self.end_if_decided():
             return
-        self.current_player_idx = (self.current_player_idx + 1) % len(self.players)
-        while self.players[self.current_player_idx].is_out:
-            self.current_player_idx = (self.current_player_idx + 1) % len(self.players)
+        self.current_player_idx = self.next_seat[self.current_player_idx]
         self.state = 'AWAITING_ACTION'
         if self.players[self.current_player_idx].coins >= 10:
             self.state = 'MUST_COUP'
@@ -390,31 +806,218 @@ class GameController:
             self.message = f"{self.players[self.current_player_idx].name}'s turn."
 
 class ServerManager:
-    def __init__(self):
+    def __init__(self, worker_id=0, num_workers=1, scheduler=None, turn_timeout=TURN_TIMEOUT):
+        self.scheduler = scheduler
+        self.turn_timeout = turn_timeout
         self.game_instances = {}
-        self.next_game_id = 0
+        # game_id -> "host:port" backend tujuan untuk game yang sudah dimigrasikan
+        self.moved = {}
+        self.draining = False
+        self.node_id = 0
+        # Detik sebelum kursi kosong di lobby diisi bot; None berarti tanpa bot
+        self.bot_fill_delay = None
+        self.bot_think = THINK_BUDGET
+        # GameRecorder (recorder.py) untuk game yang selesai; None berarti tidak merekam
+        self.recorder = None
+        # Jika diisi, dek setiap game diacak dari (seed, game_id) sehingga replay traffic menghasilkan game yang sama
+        self.seed = None
+        # Kapasitas yang diumumkan ke matchmaker pusat; create_games menolak meja baru jika game aktif sudah sebanyak ini
+        self.max_games = MAX_GAMES
+        # Game selesai dibuang dari game_instances setelah sekian detik; None berarti disimpan selamanya
+        self.finished_grace = FINISHED_GAME_GRACE
         self.lock = threading.Lock() 
+        self.configure_workers(worker_id, num_workers)
+
+    def configure_workers(self, worker_id, num_workers, node_id=None):
+        # (game_id % GAME_ID_STRIDE) % num_workers == worker_id, sehingga pemilik game bisa dihitung dari id-nya
+        if node_id is not None:
+            self.node_id = node_id
+        self.worker_id = worker_id
+        self.num_workers = num_workers
+        self.next_game_id = self.node_id * GAME_ID_STRIDE + worker_id
+
+    def owner_of(self, game_id):
+        return (game_id % GAME_ID_STRIDE) % self.num_workers
 
     def find_or_create_game(self, player_name):
         with self.lock:
+            if self.draining:
+                return None, None
             for game_id, instance in self.game_instances.items():
-                if instance.state == 'WAITING_FOR_PLAYERS' and len(instance.players) < instance.num_players_required:
+                if instance.state == 'WAITING_FOR_PLAYERS' and len(instance.players) < instance.num_players_required and not instance.migrating:
                     player_id = instance.add_player(player_name)
                     return game_id, player_id
-            new_game_id = self.next_game_id
-            new_game_instance = GameController()
-            self.game_instances[new_game_id] = new_game_instance
-            self.next_game_id += 1
+            new_game_id, new_game_instance = self.new_game()
             player_id = new_game_instance.add_player(player_name)
             return new_game_id, player_id
 
+    def new_game(self):
+        # Dipanggil dengan self.lock
+        new_game_id = self.next_game_id
+        rng = random.Random('{}:{}'.format(self.seed, new_game_id)) if self.seed is not None else None
+        new_game_instance = GameController(scheduler=self.scheduler, turn_timeout=self.turn_timeout, rng=rng)
+        self.game_instances[new_game_id] = new_game_instance
+        self.next_game_id += self.num_workers
+        if self.recorder is not None:
+            self.recorder.attach(new_game_instance, new_game_id)
+        self.watch_finished(new_game_instance, new_game_id)
+        if self.bot_fill_delay and self.scheduler is not None:
+            self.scheduler.schedule(self.bot_fill_delay, self.fill_with_bots, new_game_id)
+        return new_game_id, new_game_instance
+
+    def create_games(self, tables):
+        # Meja yang sudah dibentuk matchmaker pusat: satu game per daftar nama, game langsung mulai jika meja penuh.
+        # Berhenti saat draining atau kapasitas habis; meja sisanya dikembalikan matchmaker ke antrian
+        created = []
+        with self.lock:
+            active = sum(1 for instance in self.game_instances.values() if instance.state != 'GAME_OVER')
+            for names in tables:
+                if self.draining or active >= self.max_games:
+                    break
+                game_id, game = self.new_game()
+                created.append({'game_id': game_id, 'player_ids': [game.add_player(name) for name in names[:game.num_players_required]]})
+                active += 1
+        return created
+
+    def join_game(self, game_id, names):
+        # Kursi kosong di meja sebagian yang dibuat matchmaker pusat; mengembalikan player_id yang berhasil duduk
+        # (bisa kurang dari names jika game sudah penuh, sudah mulai, atau sudah dimigrasikan)
+        with self.lock:
+            game = self.game_instances.get(game_id)
+            if game is None or game.migrating or self.draining:
+                return []
+            player_ids = []
+            try:
+                for name in names:
+                    if game.state != 'WAITING_FOR_PLAYERS' or len(game.players) >= game.num_players_required:
+                        break
+                    player_ids.append(game.add_player(name))
+            except GameMoved:
+                pass
+            return player_ids
+
     def get_game(self, game_id):
         return self.game_instances.get(game_id)
 
+    def fill_with_bots(self, game_id):
+        with self.lock:
+            game = self.game_instances.get(game_id)
+            if game is None:
+                return
+            if game.migrating:
+                self.scheduler.schedule(self.bot_fill_delay, self.fill_with_bots, game_id)
+                return
+            with game.lock:
+                if game.state != 'WAITING_FOR_PLAYERS' or not game.players:
+                    return
+                driver = game.bot_driver or self.attach_bots(game)
+                while len(game.players) < game.num_players_required:
+                    # Kursi didaftarkan ke driver sebelum join, karena join terakhir langsung memulai game
+                    driver.add_bot(len(game.players))
+                    game.add_player(f"Bot {len(driver.bots)}")
+
+    def attach_bots(self, game, player_ids=()):
+        driver = BotDriver(game, self.scheduler, budget=self.bot_think)
+        for player_id in player_ids:
+            driver.add_bot(player_id)
+        return driver
+
+    def import_game(self, game_id, data):
+        game = GameController.from_dict(data, self.scheduler, self.turn_timeout)
+        with self.lock:
+            if game_id in self.game_instances:
+                return False
+            self.game_instances[game_id] = game
+            # Game yang kembali ke backend ini tidak lagi diteruskan
+            self.moved.pop(game_id, None)
+        with game.lock:
+            if self.recorder is not None and game.history is not None:
+                self.recorder.attach(game, game_id)
+            self.watch_finished(game, game_id)
+            if game.restored_bots and self.scheduler is not None:
+                self.attach_bots(game, game.restored_bots).on_change(game)
+            # Deadline tidak ikut diserialisasi; pemain yang sedang giliran mendapat waktu penuh lagi
+            game.schedule_deadline()
+        return True
+
+    def watch_finished(self, game, game_id):
+        def on_change(changed):
+            # Dipanggil dengan game.lock dipegang; self.lock baru diambil oleh scheduler
+            if changed.state != 'GAME_OVER' or getattr(changed, 'prune_scheduled', False):
+                return
+            if self.finished_grace is None or self.scheduler is None:
+                return
+            changed.prune_scheduled = True
+            self.scheduler.schedule(self.finished_grace, self.prune_game, game_id, changed)
+        game.listeners.append(on_change)
+
+    def prune_game(self, game_id, game):
+        # Hanya instance yang sama yang dibuang; id yang sudah diimpor ulang sebagai game lain dibiarkan
+        with self.lock:
+            if self.game_instances.get(game_id) is game:
+                del self.game_instances[game_id]
+
+    def migrate_game(self, game_id, send):
+        # send(data) mengimpor game di backend tujuan dan mengembalikan alamatnya, atau None jika gagal.
+        # Snapshot diambil dan game ditandai migrating di bawah lock; pengiriman berjalan tanpa lock sehingga
+        # game lain tidak tertahan, sementara perubahan pada game ini menunggu sampai migrasi selesai atau dibatalkan.
+        with self.lock:
+            game = self.game_instances.get(game_id)
+            if game is None or game.migrating:
+                return None
+            with game.lock:
+                game.migrating = True
+                data = game.to_dict()
+        target = None
+        try:
+            target = send(data)
+        finally:
+            with self.lock:
+                with game.lock:
+                    game.migrating = False
+                    if target is not None:
+                        game.moved_to = target
+                        del self.game_instances[game_id]
+                        self.moved[game_id] = target
+                    else:
+                        game.schedule_deadline()
+                    game.changed.notify_all()
+        return target
+
+    def live_game_ids(self):
+        with self.lock:
+            return [game_id for game_id, instance in self.game_instances.items() if instance.state != 'GAME_OVER']
+
+    def count_games(self):
+        counts = {'waiting': 0, 'live': 0, 'finished': 0}
+        with self.lock:
+            for instance in self.game_instances.values():
+                if instance.state == 'WAITING_FOR_PLAYERS':
+                    counts['waiting'] += 1
+                elif instance.state == 'GAME_OVER':
+                    counts['finished'] += 1
+                else:
+                    counts['live'] += 1
+        return counts
+
+    def count_players(self):
+        counts = {'players': 0, 'bots': 0}
+        with self.lock:
+            for instance in self.game_instances.values():
+                counts['players'] += len(instance.players)
+                if instance.bot_driver is not None:
+                    counts['bots'] += len(instance.bot_driver.bots)
+        return counts
+
 class HttpServer:
     def __init__(self):
         GameState().initialize()
-        self.server_manager = ServerManager()
+        self.scheduler = DeadlineScheduler()
+        self.server_manager = ServerManager(scheduler=self.scheduler)
+        self.forwarder = None
+        self.local = threading.local()
+        self.broadcast = BroadcastHub()
+        self.configure_rate_limits({'/state': (5, 10), '/action': (5, 10)})
         self.sessions={}
         self.types={}
         self.types['.pdf']='application/pdf'
@@ -422,18 +1025,78 @@ class HttpServer:
         self.types['.txt']='text/plain'
         self.types['.html']='text/html'
         self.types['.json']='application/json' 
+        self.types['.png']='image/png'
+        self.types['.css']='text/css'
+        self.types['.js']='application/javascript'
+        self.static = StaticFiles(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets'))
+        self.routes = ['/', '/state', '/matchmake', '/action', '/quit', '/metrics', '/ws', '/spectate', '/ws/spectate']
+        self.trace_sample_rate = float(os.environ.get('COUP_TRACE_SAMPLE', '0'))
+        self.trace_slow_ms = float(os.environ['COUP_TRACE_SLOW_MS']) if os.environ.get('COUP_TRACE_SLOW_MS') else None
+        # Endpoint /admin/* memakai token ini; tanpa token hanya diterima langsung dari localhost
+        self.admin_token = os.environ.get('COUP_ADMIN_TOKEN') or None
+        # Alamat admin load balancer ("host:port") yang diberi tahu saat game pindah backend
+        self.lb_admin = os.environ.get('COUP_LB_ADMIN') or None
+        # Profil dan snapshot memori on-demand lewat /admin/profile dan /admin/memory
+        self.profiler = profiling.Profiler()
+
+        self.metrics = Registry()
+        self.requests_total = self.metrics.counter('coup_http_requests_total', 'HTTP requests handled', ('route', 'method', 'code'))
+        self.request_latency = self.metrics.histogram('coup_http_request_duration_seconds', 'Time spent in HttpServer.proses', ('route',))
+        self.connections_in_flight = self.metrics.gauge('coup_connections_in_flight', 'Client connections currently being served')
+        self.bytes_in = self.metrics.counter('coup_bytes_received_total', 'Request bytes read from clients')
+        self.bytes_out = self.metrics.counter('coup_bytes_sent_total', 'Response bytes written to clients')
+        self.metrics.gauge('coup_games', 'Games by lifecycle state', ('state',), callback=lambda: {(k,): v for k, v in self.server_manager.count_games().items()})
+        self.websocket_sessions = self.metrics.gauge('coup_websocket_sessions', 'Open WebSocket game sessions')
+        self.metrics.gauge('coup_spectators', 'WebSocket spectators subscribed to broadcast channels', callback=self.broadcast.subscriber_count)
+        self.rate_limited = self.metrics.counter('coup_rate_limited_total', 'Requests rejected with 429', ('route',))
+        self.metrics.gauge('coup_threads', 'Live Python threads', callback=threading.active_count)
+        self.migrations = self.metrics.counter('coup_migrations_total', 'Games exported to another backend', ('result',))
 
-    def response(self,kode=404,message='Not Found',messagebody=bytes(),headers={}):
+    def configure_rate_limits(self, limits, per_address_factor=8):
+        # Satu budget per (game_id, player_id) dan budget lebih besar per alamat client (beberapa pemain bisa berbagi IP)
+        self.player_limits = {route: TokenBucketLimiter(rate, burst) for route, (rate, burst) in limits.items()}
+        self.address_limits = {route: TokenBucketLimiter(rate * per_address_factor, burst * per_address_factor) for route, (rate, burst) in limits.items()}
+
+    def check_rate_limit(self, route, game_id, player_id, client_ip):
+        if route not in self.player_limits:
+            return None
+        allowed, retry_after = self.player_limits[route].allow((game_id, player_id))
+        if allowed and client_ip:
+            allowed, retry_after = self.address_limits[route].allow(client_ip)
+        if allowed:
+            return None
+        self.rate_limited.inc(route=route)
+        return self.response(429, 'Too Many Requests', json.dumps({"error": "Rate limit exceeded"}), {'Content-Type': self.types['.json'], 'Retry-After': max(1, math.ceil(retry_after))})
+
+    def mark_handled(self):
+        trace = tracing.current()
+        if trace is not None:
+            trace.mark('handle')
+
+    def route_label(self, object_address):
+        path = object_address.split('?', 1)[0]
+        if path.startswith('/assets/'):
+            return '/assets'
+        if path.startswith('/admin/'):
+            return '/admin'
+        return path if path in self.routes else 'other'
+
+    def response(self,kode=404,message='Not Found',messagebody=bytes(),headers={},content_length=None):
         tanggal = datetime.now().strftime('%c')
         resp=[]
         resp.append("HTTP/1.0 {} {}\r\n" . format(kode,message))
         resp.append("Date: {}\r\n" . format(tanggal))
-        resp.append("Connection: close\r\n")
+        resp.append("Connection: keep-alive\r\n" if getattr(self.local, 'keep_alive', False) else "Connection: close\r\n")
         resp.append("Server: myserver/1.0\r\n")
-        resp.append("Content-Length: {}\r\n" . format(len(messagebody)))
+        resp.append("Content-Length: {}\r\n" . format(len(messagebody) if content_length is None else content_length))
         resp.append("Access-Control-Allow-Origin: *\r\n") 
         for kk in headers:
             resp.append("{}:{}\r\n" . format(kk,headers[kk]))
+        trace = tracing.current()
+        if trace is not None:
+            trace.mark('serialize')
+            resp.append("X-Request-ID: {}\r\n" . format(trace.request_id))
+            resp.append("Server-Timing: {}\r\n" . format(trace.server_timing()))
         resp.append("\r\n")
         
         response_headers=''
@@ -447,7 +1110,64 @@ class HttpServer:
         
         return response
 
-    def proses(self, data):
+    def parse_headers(self, lines):
+        headers = {}
+        for line in lines:
+            if line == '':
+                break
+            name, sep, value = line.partition(':')
+            if sep:
+                # Header pertama yang menang, sehingga header yang disisipkan proxy tidak bisa ditimpa client
+                headers.setdefault(name.strip().lower(), value.strip())
+        return headers
+
+    def request_game_id(self, method, object_address, body):
+        try:
+            if method == 'GET':
+                value = parse_qs(urlparse(object_address).query).get('game_id', [None])[0]
+            else:
+                value = json.loads(body).get('game_id') if body else None
+            return int(value) if value is not None else None
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def owning_worker(self, method, object_address, body):
+        # Hanya relevan pada mode multi-worker: None berarti request diproses di worker ini
+        if self.forwarder is None:
+            return None
+        game_id = self.request_game_id(method, object_address, body)
+        if game_id is None:
+            return None
+        owner = self.server_manager.owner_of(game_id)
+        return owner if owner != self.server_manager.worker_id else None
+
+    def websocket_target(self, data):
+        # Validasi request upgrade /ws?game_id=&player_id=; mengembalikan (respons error, None) atau (None, target)
+        requests = data.split("\r\n")
+        headers = self.parse_headers(requests[1:])
+        j = requests[0].split(" ")
+        if len(j) < 2 or not j[1].startswith('/ws'):
+            return self.response(404, 'Not Found', '', {}), None
+        spectate = urlparse(j[1]).path == '/ws/spectate'
+        try:
+            params = parse_qs(urlparse(j[1]).query)
+            game_id = int(params['game_id'][0])
+            player_id = None if spectate else int(params['player_id'][0])
+        except (KeyError, ValueError):
+            return self.response(400, 'Bad Request', json.dumps({"error": "game_id and player_id required"}), {'Content-Type': self.types['.json']}), None
+        game = self.server_manager.get_game(game_id)
+        if game and spectate:
+            return None, (game, None, game_id, headers['sec-websocket-key'])
+        if not game or not 0 <= player_id < len(game.players):
+            return self.response(404, 'Not Found', json.dumps({"error": "Game not found"}), {'Content-Type': self.types['.json']}), None
+        return None, (game, player_id, game_id, headers['sec-websocket-key'])
+
+    def finish_trace(self, trace):
+        tracing.finish(trace, self.trace_sample_rate, self.trace_slow_ms)
+
+    def proses(self, data, client_address=None):
+        start = time.perf_counter()
+        method, route = '', 'other'
         requests = data.split("\r\n")
         baris = requests[0]
         
@@ -456,42 +1176,383 @@ class HttpServer:
         if header_end_index != -1:
             body = data[header_end_index+4:]
 
+        headers = self.parse_headers(requests[1:])
+        client_ip = self.client_ip(headers, client_address)
+
+        trace = tracing.current()
+        if trace is not None:
+            if headers.get('x-request-id'):
+                trace.request_id = headers['x-request-id'][:64]
+            trace.upstream_timing = headers.get('x-lb-timing', '')
+            trace.mark('parse')
+
         j = baris.split(" ")
         try:
             method = j[0].upper().strip()
 
-            if (method=='GET'):
+            if method in ('GET', 'POST'):
                 object_address = j[1].strip()
-                return self.http_get(object_address)
-            if (method=='POST'):
-                object_address = j[1].strip()
-                return self.http_post(object_address, body)
+                route = self.route_label(object_address)
+                if trace is not None: trace.route = route
+                owner = self.owning_worker(method, object_address, body)
+                moved_to = self.moved_target(method, object_address, body)
+                if route == '/admin' and not self.admin_allowed(headers, client_address):
+                    # Diperiksa sebelum forward: worker pemilik melihat request dari loopback internal
+                    hasil = self.admin_forbidden()
+                elif owner is not None:
+                    # Request /admin sudah diotorisasi di sini dan diteruskan apa adanya
+                    hasil = self.forwarder(owner, data if route == '/admin' else self.stamp_forwarded(data, client_ip))
+                elif route == '/admin':
+                    hasil = self.http_admin(method, object_address, body, headers, client_address)
+                elif moved_to is not None:
+                    hasil = self.forward_moved(moved_to, data)
+                elif (method=='GET'):
+                    hasil = self.http_get(object_address, client_ip, headers)
+                else:
+                    hasil = self.http_post(object_address, body, client_ip)
             else:
-                return self.response(400,'Bad Request','',{})
+                hasil = self.response(400,'Bad Request','',{})
         except IndexError:
-            return self.response(400,'Bad Request','',{})
+            hasil = self.response(400,'Bad Request','',{})
+        except GameMoved as e:
+            # Game pindah saat request ini menunggu lock game
+            hasil = self.forward_moved(e.target, data)
+
+        status_line = hasil.headers if isinstance(hasil, FileResponse) else hasil
+        self.requests_total.inc(route=route, method=method if method in ('GET', 'POST') else 'other', code=status_line[9:12].decode())
+        self.request_latency.observe(time.perf_counter() - start, route=route)
+        return hasil
+
+    def moved_target(self, method, object_address, body):
+        if not self.server_manager.moved:
+            return None
+        return self.server_manager.moved.get(self.request_game_id(method, object_address, body))
+
+    def forward_moved(self, target, data):
+        # Client yang masih memakai backend lama dilayani lewat proxy sampai load balancer mengarahkannya ke tujuan
+        try:
+            hasil = migration.exchange(target, data.encode() if isinstance(data, str) else data)
+        except (OSError, httpio.MessageTooLarge) as e:
+            logging.error("forwarding to %s failed: %s", target, e)
+            return self.response(502, 'Bad Gateway', json.dumps({"error": "Game backend unavailable"}), {'Content-Type': self.types['.json']})
+        return httpio.set_header(hasil, 'Connection', 'keep-alive' if getattr(self.local, 'keep_alive', False) else 'close')
+
+    def admin_allowed(self, headers, client_address):
+        if self.admin_token:
+            return headers.get('x-admin-token') == self.admin_token
+        return bool(client_address) and client_address[0] in LOOPBACK and 'x-forwarded-for' not in headers
+
+    def client_ip(self, headers, client_address):
+        # X-Forwarded-For hanya dipercaya dari loopback atau host balancer (--lb-admin); selain itu client bisa
+        # memalsukannya untuk lolos dari limit per alamat
+        peer = client_address[0] if client_address else None
+        forwarded = headers.get('x-forwarded-for', '').split(',')[0].strip()
+        if forwarded and (peer in LOOPBACK or (self.lb_admin and peer == migration.parse_address(self.lb_admin)[0])):
+            return forwarded
+        return peer
+
+    def stamp_forwarded(self, data, client_ip):
+        # Worker pemilik melihat request dari loopback; alamat client asli dibawa sebagai X-Forwarded-For pertama
+        # (header pertama yang menang di parse_headers)
+        if not client_ip:
+            return data
+        stamp = 'X-Forwarded-For: {}\r\n'.format(client_ip)
+        newline = '\r\n'
+        if isinstance(data, bytes):
+            stamp, newline = stamp.encode(), b'\r\n'
+        line_end = data.find(newline)
+        if line_end == -1:
+            return data
+        return data[:line_end + 2] + stamp + data[line_end + 2:]
+
+    def admin_forbidden(self):
+        return self.response(403, 'Forbidden', json.dumps({"error": "Admin token required"}), {'Content-Type': self.types['.json']})
+
+    def http_admin(self, method, object_address, body, headers, client_address):
+        if not self.admin_allowed(headers, client_address):
+            return self.admin_forbidden()
+        path = urlparse(object_address).path
+        if method == 'GET':
+            if path == '/admin/export':
+                game_id = self.request_game_id(method, object_address, body)
+                game = self.server_manager.get_game(game_id)
+                if not game:
+                    return self.response(404, 'Not Found', json.dumps({"error": "Game not found"}), {'Content-Type': self.types['.json']})
+                with game.lock:
+                    data = game.to_dict()
+                return self.response(200, 'OK', json.dumps({'game_id': game_id, 'game': data}), {'Content-Type': self.types['.json']})
+            if path == '/admin/status':
+                response_data = {'worker_id': self.server_manager.worker_id, 'draining': self.server_manager.draining, 'games': self.server_manager.count_games(), 'max_games': self.server_manager.max_games, 'moved': len(self.server_manager.moved)}
+                response_data.update(self.profiler.status())
+                return self.response(200, 'OK', json.dumps(response_data), {'Content-Type': self.types['.json']})
+            if path == '/admin/profile':
+                # Profil selama `seconds` detik dalam satu request; hasilnya teks (pstats atau stack terlipat)
+                params = parse_qs(urlparse(object_address).query)
+                try:
+                    mode = params.get('mode', ['sample'])[0]
+                    seconds = profiling.positive(params.get('seconds', [5])[0], profiling.MAX_SECONDS)
+                    interval = profiling.positive(params.get('interval', [profiling.SAMPLE_INTERVAL])[0], profiling.MAX_INTERVAL)
+                    top = profiling.count(params.get('top', [profiling.TOP])[0])
+                    sort = profiling.sort_key(params.get('sort', ['cumulative'])[0])
+                except (OverflowError, ValueError):
+                    return self.response(400, 'Bad Request', json.dumps({"error": "Invalid parameter"}), {'Content-Type': self.types['.json']})
+                if mode not in profiling.MODES:
+                    return self.response(400, 'Bad Request', json.dumps({"error": "mode must be sample or cprofile"}), {'Content-Type': self.types['.json']})
+                report = self.profiler.run_for(mode, seconds, interval, top, sort)
+                if report is None:
+                    return self.response(409, 'Conflict', json.dumps({"error": "Profiler already running"}), {'Content-Type': self.types['.json']})
+                return self.response(200, 'OK', report, {'Content-Type': self.types['.txt']})
+            if path == '/admin/objects':
+                params = parse_qs(urlparse(object_address).query)
+                response_data = {'worker_id': self.server_manager.worker_id, 'games': self.server_manager.count_games(), 'threads': profiling.thread_counts()}
+                response_data.update(self.server_manager.count_players())
+                if params.get('types', ['0'])[0] == '1':
+                    # Menelusuri semua objek gc: mahal, jadi hanya jika diminta
+                    response_data['types'] = profiling.type_counts()
+                return self.response(200, 'OK', json.dumps(response_data), {'Content-Type': self.types['.json']})
+            return self.response(404, 'Not Found', '', {})
+
+        try:
+            post_data = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            return self.response(400, 'Bad Request', json.dumps({"error": "Invalid JSON"}), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/import':
+            try:
+                imported = self.server_manager.import_game(int(post_data['game_id']), post_data['game'])
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                return self.response(400, 'Bad Request', json.dumps({"error": "Invalid game: {}".format(e)}), {'Content-Type': self.types['.json']})
+            if not imported:
+                return self.response(409, 'Conflict', json.dumps({"error": "Game id already exists"}), {'Content-Type': self.types['.json']})
+            return self.response(200, 'OK', json.dumps({"status": "ok"}), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/games':
+            tables = post_data.get('tables')
+            if not isinstance(tables, list) or not all(isinstance(names, list) and names for names in tables):
+                return self.response(400, 'Bad Request', json.dumps({"error": "tables must be a list of player name lists"}), {'Content-Type': self.types['.json']})
+            created = self.server_manager.create_games([[str(name) for name in names] for names in tables])
+            return self.response(200, 'OK', json.dumps({'games': created}), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/games/join':
+            names = post_data.get('names')
+            if not isinstance(post_data.get('game_id'), int) or not isinstance(names, list):
+                return self.response(400, 'Bad Request', json.dumps({"error": "game_id and names required"}), {'Content-Type': self.types['.json']})
+            player_ids = self.server_manager.join_game(post_data['game_id'], [str(name) for name in names])
+            return self.response(200, 'OK', json.dumps({'player_ids': player_ids}), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/migrate':
+            try:
+                game_id, target = int(post_data['game_id']), post_data['target']
+            except (KeyError, TypeError, ValueError):
+                return self.response(400, 'Bad Request', json.dumps({"error": "game_id and target required"}), {'Content-Type': self.types['.json']})
+            if not self.migrate(game_id, target, post_data.get('lb', self.lb_admin)):
+                return self.response(502, 'Bad Gateway', json.dumps({"error": "Migration failed"}), {'Content-Type': self.types['.json']})
+            return self.response(200, 'OK', json.dumps({"status": "ok", "target": target}), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/profile/start':
+            mode = post_data.get('mode', 'sample')
+            if mode not in profiling.MODES:
+                return self.response(400, 'Bad Request', json.dumps({"error": "mode must be sample or cprofile"}), {'Content-Type': self.types['.json']})
+            try:
+                interval = profiling.positive(post_data.get('interval', profiling.SAMPLE_INTERVAL), profiling.MAX_INTERVAL)
+                seconds = profiling.positive(post_data.get('seconds', profiling.MAX_SECONDS), profiling.MAX_SECONDS)
+            except (OverflowError, TypeError, ValueError):
+                return self.response(400, 'Bad Request', json.dumps({"error": "Invalid parameter"}), {'Content-Type': self.types['.json']})
+            if not self.profiler.start(mode, interval, seconds):
+                return self.response(409, 'Conflict', json.dumps({"error": "Profiler already running"}), {'Content-Type': self.types['.json']})
+            return self.response(200, 'OK', json.dumps({"status": "ok", "mode": mode}), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/profile/stop':
+            try:
+                top = profiling.count(post_data.get('top', profiling.TOP))
+                sort = profiling.sort_key(post_data.get('sort', 'cumulative'))
+            except (OverflowError, TypeError, ValueError):
+                return self.response(400, 'Bad Request', json.dumps({"error": "Invalid parameter"}), {'Content-Type': self.types['.json']})
+            report = self.profiler.stop(top, sort)
+            if report is None:
+                return self.response(409, 'Conflict', json.dumps({"error": "Profiler not running"}), {'Content-Type': self.types['.json']})
+            return self.response(200, 'OK', report, {'Content-Type': self.types['.txt']})
+
+        if path == '/admin/memory/start':
+            try:
+                frames = profiling.count(post_data.get('frames', profiling.TRACE_FRAMES), 1)
+            except (OverflowError, TypeError, ValueError):
+                return self.response(400, 'Bad Request', json.dumps({"error": "Invalid parameter"}), {'Content-Type': self.types['.json']})
+            self.profiler.memory_start(frames)
+            return self.response(200, 'OK', json.dumps({"status": "ok"}), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/memory/snapshot':
+            try:
+                top = profiling.count(post_data.get('top', profiling.TOP))
+            except (OverflowError, TypeError, ValueError):
+                return self.response(400, 'Bad Request', json.dumps({"error": "Invalid parameter"}), {'Content-Type': self.types['.json']})
+            snapshot = self.profiler.memory_snapshot(top)
+            if snapshot is None:
+                return self.response(409, 'Conflict', json.dumps({"error": "tracemalloc not started"}), {'Content-Type': self.types['.json']})
+            return self.response(200, 'OK', json.dumps(snapshot), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/memory/stop':
+            self.profiler.memory_stop()
+            return self.response(200, 'OK', json.dumps({"status": "ok"}), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/drain':
+            targets = post_data.get('targets') or []
+            if not targets:
+                return self.response(400, 'Bad Request', json.dumps({"error": "targets required"}), {'Content-Type': self.types['.json']})
+            return self.response(200, 'OK', json.dumps(self.drain(targets, post_data)), {'Content-Type': self.types['.json']})
+
+        if path == '/admin/resume':
+            # Membatalkan drain yang tidak selesai: game baru diterima lagi
+            self.server_manager.draining = False
+            self.to_other_workers('/admin/resume', post_data)
+            return self.response(200, 'OK', json.dumps({"status": "ok"}), {'Content-Type': self.types['.json']})
+
+        return self.response(404, 'Not Found', '', {})
 
-    def http_get(self, object_address):
+    def migrate(self, game_id, target, lb=None):
+        def send(data):
+            try:
+                status, _ = migration.request_json(target, 'POST', '/admin/import', {'game_id': game_id, 'game': data}, self.admin_token)
+            except (OSError, httpio.MessageTooLarge) as e:
+                logging.error("migrating game %s to %s failed: %s", game_id, target, e)
+                return None
+            if status != 200:
+                logging.error("migrating game %s to %s failed with status %s", game_id, target, status)
+                return None
+            return target
+
+        moved = self.server_manager.migrate_game(game_id, send)
+        self.migrations.inc(result='ok' if moved else 'failed')
+        if not moved:
+            return False
+        # Penonton WebSocket diputus agar menyambung ulang ke backend tujuan
+        self.broadcast.close_game(game_id)
+        if lb:
+            try:
+                migration.request_json(lb, 'POST', '/routes', {'game_id': game_id, 'backend': target}, self.admin_token)
+            except OSError as e:
+                # Tetap aman: backend ini meneruskan request game tersebut ke tujuan
+                logging.warning("updating balancer route for game %s failed: %s", game_id, e)
+        return True
+
+    def drain(self, targets, post_data):
+        # Tolak game baru lalu pindahkan setiap game yang belum selesai, bergiliran ke backend tujuan
+        self.server_manager.draining = True
+        result = {'migrated': [], 'failed': []}
+        lb = post_data.get('lb', self.lb_admin)
+        for i, game_id in enumerate(self.server_manager.live_game_ids()):
+            target = targets[i % len(targets)]
+            result['migrated' if self.migrate(game_id, target, lb) else 'failed'].append(game_id)
+        for worker_result in self.to_other_workers('/admin/drain', post_data):
+            result['migrated'].extend(worker_result.get('migrated', []))
+            result['failed'].extend(worker_result.get('failed', []))
+        return result
+
+    def to_other_workers(self, path, post_data):
+        # Game dan status draining disimpan per worker, jadi request admin ini diteruskan ke worker lain;
+        # mengembalikan body JSON setiap worker yang menjawab
+        results = []
+        if self.forwarder is None or post_data.get('local'):
+            return results
+        for worker in range(self.server_manager.num_workers):
+            if worker == self.server_manager.worker_id:
+                continue
+            request = migration.build_request('POST', path, dict(post_data, local=True), self.admin_token)
+            try:
+                reply = self.forwarder(worker, request)
+                results.append(json.loads(reply[reply.find(b'\r\n\r\n') + 4:]))
+            except (OSError, ValueError) as e:
+                logging.error("%s on worker %s failed: %s", path, worker, e)
+        return results
+
+    def http_get(self, object_address, client_ip=None, headers=None):
         if object_address.startswith('/state'):
             try:
                 params = parse_qs(urlparse(object_address).query)
                 player_id = int(params.get('player_id', [0])[0])
                 game_id = int(params.get('game_id', [0])[0])
+
+                limited = self.check_rate_limit('/state', game_id, player_id, client_ip)
+                if limited:
+                    return limited
                 
                 game = self.server_manager.get_game(game_id)
                 if game:
+                    # version=V: client sudah punya versi V; wait=S: tahan request sampai versi berubah (long-poll)
+                    known = int(params['version'][0]) if 'version' in params else None
+                    if known is not None and 'wait' in params:
+                        game.wait_for_change(known, min(float(params['wait'][0]), LONG_POLL_MAX))
+                    if known is not None and game.version == known:
+                        game.check_moved()
+                        self.mark_handled()
+                        return self.response(304, 'Not Modified', b'', {})
                     response_data = game.get_state_for_player(player_id)
+                    self.mark_handled()
                     return self.response(200, 'OK', json.dumps(response_data), {'Content-Type': self.types['.json']})
                 else:
                     return self.response(404, 'Not Found', json.dumps({"error": "Game not found"}), {'Content-Type': self.types['.json']})
+            except GameMoved:
+                raise
             except Exception as e:
                 return self.response(500, 'Internal Server Error', str(e), {})
         
+        if object_address.startswith('/spectate'):
+            try:
+                game_id = int(parse_qs(urlparse(object_address).query).get('game_id', [0])[0])
+            except ValueError:
+                return self.response(400, 'Bad Request', json.dumps({"error": "Invalid game_id"}), {'Content-Type': self.types['.json']})
+            game = self.server_manager.get_game(game_id)
+            if not game:
+                return self.response(404, 'Not Found', json.dumps({"error": "Game not found"}), {'Content-Type': self.types['.json']})
+            # Body yang sama dipakai ulang untuk semua penonton selama versinya belum berubah
+            version, body, _ = self.broadcast.channel(game_id, game).snapshot()
+            etag = '"{}-{}"'.format(game_id, version)
+            self.mark_handled()
+            if headers and headers.get('if-none-match') == etag:
+                return self.response(304, 'Not Modified', b'', {'ETag': etag})
+            return self.response(200, 'OK', body, {'Content-Type': self.types['.json'], 'ETag': etag})
+
+        if object_address.startswith('/assets/'):
+            return self.http_static(urlparse(object_address).path[len('/assets/'):], headers or {})
+
+        if object_address == '/metrics':
+            return self.response(200, 'OK', self.metrics.render(), {'Content-Type': self.metrics.content_type})
+
         if object_address == '/':
             return self.response(200,'OK','Coup Game Server is running', {})
         return self.response(404,'Not Found','',{})
 
-    def http_post(self, object_address, body):
+    def http_static(self, name, headers):
+        entry = self.static.lookup(name, headers.get('accept-encoding', ''))
+        if entry is None:
+            return self.response(404, 'Not Found', '', {})
+        extra = {'Content-Type': self.types.get(os.path.splitext(name)[1].lower(), 'application/octet-stream'), 'ETag': entry.etag, 'Cache-Control': 'public, max-age=86400', 'Accept-Ranges': 'bytes', 'Vary': 'Accept-Encoding'}
+        if entry.encoding:
+            extra['Content-Encoding'] = entry.encoding
+        if headers.get('if-none-match') == entry.etag:
+            return self.response(304, 'Not Modified', b'', extra)
+
+        byte_range = None
+        if headers.get('if-range', entry.etag) == entry.etag:
+            byte_range = parse_range(headers.get('range'), entry.size)
+        if byte_range == 'invalid':
+            extra['Content-Range'] = 'bytes */{}'.format(entry.size)
+            return self.response(416, 'Range Not Satisfiable', b'', extra)
+        if byte_range:
+            start, end = byte_range
+            kode, message = 206, 'Partial Content'
+            extra['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, entry.size)
+        else:
+            start, end = 0, entry.size - 1
+            kode, message = 200, 'OK'
+        length = end - start + 1
+
+        data = self.static.content(entry)
+        if data is not None:
+            return self.response(kode, message, data[start:end + 1], extra)
+        return FileResponse(self.response(kode, message, b'', extra, content_length=length), entry.path, start, length)
+
+    def http_post(self, object_address, body, client_ip=None):
         try:
             post_data = json.loads(body)
         except json.JSONDecodeError:
@@ -499,7 +1560,10 @@ class HttpServer:
 
         if object_address == '/matchmake':
             player_name = post_data.get('name', 'Anon')
+            if self.server_manager.draining:
+                return self.response(503, 'Service Unavailable', json.dumps({"error": "Server draining"}), {'Content-Type': self.types['.json'], 'Retry-After': 1})
             game_id, player_id = self.server_manager.find_or_create_game(player_name)
+            self.mark_handled()
             if player_id is not None:
                 response_data = {'player_id': player_id, 'game_id': game_id}
                 return self.response(200, 'OK', json.dumps(response_data), {'Content-Type': self.types['.json']})
@@ -508,13 +1572,31 @@ class HttpServer:
 
         if object_address in ['/action', '/quit']:
             game_id = post_data.get('game_id')
+            if object_address == '/action':
+                limited = self.check_rate_limit('/action', game_id, post_data.get('player_id'), client_ip)
+                if limited:
+                    return limited
             game = self.server_manager.get_game(game_id)
             if game:
+                response_data = {"status": "ok"}
                 if object_address == '/action':
-                    game.handle_action(post_data)
+                    player_id = post_data.get('player_id')
+                    if post_data.get('return_state') and isinstance(player_id, int):
+                        # Kembalikan view terbaru dalam respons yang sama, tanpa GET /state tambahan
+                        with game.lock:
+                            before = game.version
+                            game.handle_action(post_data)
+                            view = game.build_state_for_player(player_id)
+                        response_data['version'] = view.get('version')
+                        # false jika aksi ditolak atau tidak berlaku lagi (state game tidak berubah)
+                        response_data['applied'] = view.get('version') != before
+                        response_data['state'] = view
+                    else:
+                        game.handle_action(post_data)
                 elif object_address == '/quit':
                     game.eliminate_player(post_data.get('player_id'))
-                return self.response(200, 'OK', json.dumps({"status": "ok"}), {'Content-Type': self.types['.json']})
+                self.mark_handled()
+                return self.response(200, 'OK', json.dumps(response_data), {'Content-Type': self.types['.json']})
             else:
                 return self.response(404, 'Not Found', json.dumps({"error": "Game not found"}), {'Content-Type': self.types['.json']})
         
@@ -0,0 +1,81 @@
+import re
+
+MAX_HEADER = 64 * 1024
+MAX_BODY = 1024 * 1024
+
+CONTENT_LENGTH = re.compile(rb'\r\ncontent-length:[ \t]*(\d+)', re.IGNORECASE)
+CONNECTION = re.compile(rb'\r\nconnection:[ \t]*([^\r\n]*)', re.IGNORECASE)
+
+class MessageTooLarge(Exception):
+    pass
+
+def read_head(sock, buffer=b''):
+    # Membaca sampai akhir header. Mengembalikan (header termasuk \r\n\r\n, sisa buffer);
+    # header None jika koneksi ditutup sebelum header lengkap.
+    buffer = bytearray(buffer)
+    while True:
+        header_end = buffer.find(b'\r\n\r\n')
+        if header_end != -1:
+            break
+        if len(buffer) > MAX_HEADER:
+            raise MessageTooLarge()
+        d = sock.recv(8192)
+        if not d:
+            return None, bytes(buffer)
+        buffer += d
+    header_end += 4
+    return bytes(buffer[:header_end]), bytes(buffer[header_end:])
+
+def content_length(head):
+    match = CONTENT_LENGTH.search(head)
+    return int(match.group(1)) if match else 0
+
+def read_body(sock, buffer, length):
+    # Mengembalikan (body sepanjang length atau kurang jika koneksi ditutup, sisa buffer)
+    buffer = bytearray(buffer)
+    while len(buffer) < length:
+        d = sock.recv(max(8192, length - len(buffer)))
+        if not d:
+            break
+        buffer += d
+    return bytes(buffer[:length]), bytes(buffer[length:])
+
+def read_message(sock, buffer=b''):
+    # Membaca satu pesan HTTP (request atau response) berdasarkan Content-Length.
+    # Mengembalikan (pesan, sisa buffer); pesan None jika koneksi ditutup sebelum header lengkap.
+    head, buffer = read_head(sock, buffer)
+    if head is None:
+        return None, buffer
+    length = content_length(head)
+    if length > MAX_BODY:
+        raise MessageTooLarge()
+    body, rest = read_body(sock, buffer, length)
+    return head + body, rest
+
+def header_block(message):
+    end = message.find(b'\r\n\r\n')
+    return message[:end + 2] if end != -1 else message
+
+def wants_keep_alive(message):
+    # HTTP/1.1 persistent secara default; HTTP/1.0 hanya jika meminta keep-alive
+    head = header_block(message)
+    first_line = head[:head.find(b'\r\n')]
+    match = CONNECTION.search(head)
+    token = match.group(1).strip().lower() if match else b''
+    if b'close' in token:
+        return False
+    if first_line.endswith(b'HTTP/1.1') or first_line.startswith(b'HTTP/1.1'):
+        return True
+    return b'keep-alive' in token
+
+def set_header(message, name, value):
+    # Mengganti (atau menambah) satu header pada pesan HTTP mentah
+    end = message.find(b'\r\n\r\n')
+    head, rest = message[:end + 2], message[end + 2:]
+    pattern = re.compile(rb'\r\n' + re.escape(name.encode()) + rb':[^\r\n]*', re.IGNORECASE)
+    line = b'\r\n' + name.encode() + b': ' + value.encode()
+    if pattern.search(head):
+        head = pattern.sub(lambda m: line, head, count=1)
+    else:
+        head = head[:-2] + line + b'\r\n'
+    return head + rest
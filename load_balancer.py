@@ -3,25 +3,100 @@ import socket
 import time
 import sys
 import logging
-import multiprocessing
-from concurrent.futures import ProcessPoolExecutor
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from metrics import Registry
+import logsetup
+import admission
+import argparse
+import os
+import re
+import json
+import httpio
+from capture import CaptureLog
+from matchmaker import Matchmaker
+
+metrics = Registry()
+connections_total = metrics.counter('coup_lb_connections_total', 'Client connections routed to each backend', ('backend',))
+connections_active = metrics.gauge('coup_lb_connections_active', 'Client connections currently relayed to each backend', ('backend',))
+connect_errors = metrics.counter('coup_lb_backend_connect_errors_total', 'Failed connects to each backend', ('backend',))
+relay_bytes = metrics.counter('coup_lb_relay_bytes_total', 'Bytes relayed per backend and direction', ('backend', 'direction'))
+metrics.gauge('coup_lb_threads', 'Live Python threads', callback=threading.active_count)
+upstream_connects = metrics.counter('coup_lb_upstream_connects_total', 'New TCP connections opened to each backend', ('backend',))
+upstream_reused = metrics.counter('coup_lb_upstream_reused_total', 'Requests sent over a pooled keep-alive connection', ('backend',))
+upstream_latency = metrics.histogram('coup_lb_upstream_seconds', 'Time from forwarding a request to receiving the backend response', ('backend',))
+pools = {}
+pools_lock = threading.Lock()
+metrics.gauge('coup_lb_upstream_idle', 'Idle keep-alive connections pooled per backend', ('backend',), callback=lambda: {(p.label,): p.idle_count() for p in pools.values()})
+admission_control = admission.AdmissionControl(max_connections=100)
+# CaptureLog jika --capture dipakai; setiap request yang diproxy beserta ringkasan responsnya direkam untuk replay.py
+capture = None
+metrics.counter('coup_lb_capture_dropped_total', 'Captured requests dropped because the capture queue was full', callback=lambda: capture.dropped if capture else 0)
+# Matchmaker jika --matchmaker dipakai; POST /matchmake dijawab balancer dari antrian seluruh fleet
+matchmaking = None
+metrics.gauge('coup_lb_matchmaker_waiting', 'Players queued in the central matchmaker', callback=lambda: matchmaking.waiting_count() if matchmaking else 0)
+matchmaker_games = metrics.counter('coup_lb_matchmaker_games_total', 'Tables created by the central matchmaker on each backend', ('backend',))
+matchmaker_wait = metrics.histogram('coup_lb_matchmaker_wait_seconds', 'Time from POST /matchmake to a seat at a table', buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10))
+metrics.counter('coup_lb_shed_total', 'Client connections rejected with 503', callback=lambda: admission_control.shed_counts()['connections'])
+
+DEFAULT_BACKENDS = [('127.0.0.1', 8000), ('127.0.0.1', 8001), ('127.0.0.1', 8002)]
+GAME_ID_QUERY = re.compile(rb'[?&]game_id=(\d+)')
+GAME_ID_BODY = re.compile(rb'"game_id"\s*:\s*(\d+)')
+ADMIN_TOKEN = os.environ.get('COUP_ADMIN_TOKEN') or None
+POOL_MIN_IDLE = 2
+CONNECT_TIMEOUT = 1
+UPSTREAM_TIMEOUT = 10
+# Harus lebih pendek dari KEEPALIVE_TIMEOUT backend (60 detik) agar pool tidak memakai koneksi yang sudah ditutup
+UPSTREAM_IDLE_TIMEOUT = 30
+# Koneksi baru yang belum pernah membawa request ditutup backend setelah READ_TIMEOUT (10 detik), jadi koneksi
+# hasil warm dibuang lebih awal dari itu
+UPSTREAM_FRESH_TIMEOUT = 5
+CLIENT_TIMEOUT = 10
+# Game yang tidak menerima request selama ini dianggap selesai; game pindahan yang dibuang routenya tetap
+# sampai karena backend lama meneruskan request ke tujuan migrasinya
+ROUTE_IDLE_TIMEOUT = 600
+MAX_ROUTES = 100000
+# Body respons upstream yang lebih besar dari ini diteruskan per potongan, tidak dibaca utuh ke memori
+STREAM_THRESHOLD = 64 * 1024
+STREAM_CHUNK = 64 * 1024
+KEEPALIVE_TIMEOUT = 60
+BAD_GATEWAY = b"HTTP/1.1 502 Bad Gateway\r\nConnection: close\r\nContent-Length: 0\r\n\r\n"
+NOT_FOUND = b"HTTP/1.1 404 Not Found\r\nConnection: close\r\nContent-Length: 0\r\n\r\n"
+NO_TABLE = b'{"error": "No table available"}'
 
 class BackendList:
-	def __init__(self):
+	def __init__(self, backends=DEFAULT_BACKENDS):
 		self.servers=[]
 		self.client_map = {}
-		self.servers.append({'host': '127.0.0.1', 'port': 8000, 'counter': 0})
-		self.servers.append({'host': '127.0.0.1', 'port': 8001, 'counter': 0})
-		self.servers.append({'host': '127.0.0.1', 'port': 8002, 'counter': 0})
+		# game_id -> (host, port) untuk game yang dimigrasikan atau dibuat matchmaker; menang atas pemetaan per IP client.
+		# Urut dari yang paling lama tidak dipakai: route game yang selesai atau ditinggal dibuang setelah
+		# ROUTE_IDLE_TIMEOUT, dan tabel dibatasi MAX_ROUTES
+		self.routes = OrderedDict()
+		self.route_used = {}
+		self.lock = threading.Lock()
+		for host, port in backends:
+			self.servers.append({'host': host, 'port': port, 'counter': 0, 'state': 'active'})
 		self.current = 0
 
+	def is_active(self, address):
+		return any((server['host'], server['port']) == address and server['state'] == 'active' for server in self.servers)
+
 	def getserver(self, client_ip):
-		logging.warning(f"new client connected from {client_ip}")
-		
-		if client_ip in self.client_map: # Jika suatu ip client pernah connect ke server sebelumnya
+		logging.warning("new client connected from %s", client_ip, extra={'event': 'connection'})
+		with self.lock:
 			s = self.client_map.get(client_ip)
-		
-		else: # Jika suatu ip client belum pernah connect ke server sebelumnya
+			if s is not None and self.is_active(s): # Jika suatu ip client pernah connect ke server yang masih aktif
+				return s
+
+			# Jika suatu ip client belum pernah connect, atau servernya sedang di-drain
+			if not any(server['state'] == 'active' for server in self.servers):
+				return None
+			if self.current >= len(self.servers):
+				self.current = 0
+			while self.servers[self.current]['state'] != 'active':
+				self.current = (self.current + 1) % len(self.servers)
 			s = (self.servers[self.current]['host'], self.servers[self.current]['port'])
 			self.servers[self.current]['counter'] = self.servers[self.current]['counter'] + 1
 			self.client_map[client_ip] = s
@@ -36,64 +111,473 @@ class BackendList:
 
 		return s
 
-def ProcessTheClient(connection, address, backend_sock, mode='toupstream'):
+	def active_addresses(self):
+		with self.lock:
+			return [(s['host'], s['port']) for s in self.servers if s['state'] == 'active']
+
+	def set_state(self, address, state):
+		# state: active (menerima client baru), draining (hanya melayani game yang sudah ada), removed
+		with self.lock:
+			for server in self.servers:
+				if (server['host'], server['port']) == address:
+					break
+			else:
+				if state == 'removed':
+					return
+				server = {'host': address[0], 'port': address[1], 'counter': 0, 'state': state}
+				self.servers.append(server)
+			server['state'] = state
+			if state == 'removed':
+				self.servers.remove(server)
+				self.client_map = {ip: s for ip, s in self.client_map.items() if s != address}
+				self.routes = OrderedDict((game_id, s) for game_id, s in self.routes.items() if s != address)
+				self.route_used = {game_id: self.route_used[game_id] for game_id in self.routes}
+
+	def set_route(self, game_id, address):
+		now = time.monotonic()
+		with self.lock:
+			self.routes[game_id] = address
+			self.routes.move_to_end(game_id)
+			self.route_used[game_id] = now
+			self.expire_routes(now)
+
+	def route(self, game_id):
+		if game_id is None:
+			return None
+		now = time.monotonic()
+		with self.lock:
+			address = self.routes.get(game_id)
+			if address is not None:
+				self.routes.move_to_end(game_id)
+				self.route_used[game_id] = now
+			self.expire_routes(now)
+			return address
+
+	def expire_routes(self, now):
+		# Dipanggil dengan self.lock; hanya memeriksa ujung yang paling lama tidak dipakai
+		while self.routes:
+			game_id = next(iter(self.routes))
+			if len(self.routes) <= MAX_ROUTES and now - self.route_used[game_id] < ROUTE_IDLE_TIMEOUT:
+				break
+			del self.routes[game_id]
+			del self.route_used[game_id]
+
+	def describe(self):
+		with self.lock:
+			return [{'backend': f"{s['host']}:{s['port']}", 'state': s['state'], 'clients': sum(1 for a in self.client_map.values() if a == (s['host'], s['port'])), 'routes': sum(1 for a in self.routes.values() if a == (s['host'], s['port']))} for s in self.servers]
+
+def pool_for(address):
+	with pools_lock:
+		pool = pools.get(address)
+		if pool is None:
+			pool = pools[address] = UpstreamPool(address[0], address[1], min_idle=POOL_MIN_IDLE)
+		return pool
+
+def request_game_id(request):
+	# game_id dari query string (GET) atau body JSON (POST), tanpa parsing penuh
+	line_end = request.find(b'\r\n')
+	match = GAME_ID_QUERY.search(request, 0, line_end) or GAME_ID_BODY.search(request, request.find(b'\r\n\r\n'))
+	return int(match.group(1)) if match else None
+
+def json_response(status, body, keep_alive, extra=''):
+	return (f"HTTP/1.0 {status}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n{extra}Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+def matchmake(request, keep_alive):
+	# Pemain masuk antrian matchmaker dan menunggu sampai mejanya dibuat; respons berisi backend tujuan.
+	# Request berikutnya untuk game itu diarahkan lewat tabel route, tidak lagi lewat IP client
 	try:
+		name = str(json.loads(request[request.find(b'\r\n\r\n') + 4:]).get('name', 'Anon'))
+	except (ValueError, AttributeError):
+		return json_response('400 Bad Request', b'{"error": "Invalid JSON"}', keep_alive)
+	started = time.perf_counter()
+	result = matchmaking.join(name)
+	if result is None:
+		return json_response('503 Service Unavailable', NO_TABLE, keep_alive, 'Retry-After: 1\r\n')
+	matchmaker_wait.observe(time.perf_counter() - started)
+	return json_response('200 OK', json.dumps(result).encode(), keep_alive)
+
+def stamp_request(data, request_id, timing, client_ip=''):
+	# Sisipkan X-Request-ID, X-Forwarded-For dan timing balancer tepat setelah request line
+	line_end = data.find(b'\r\n')
+	if line_end == -1:
+		return data, request_id
+	header_end = data.find(b'\r\n\r\n')
+	existing = data[:header_end].lower().find(b'\r\nx-request-id:') if header_end != -1 else -1
+	if existing != -1:
+		# Pakai request id dari client bila sudah ada
+		value_start = existing + len(b'\r\nx-request-id:')
+		request_id = data[value_start:data.find(b'\r\n', value_start)].decode('latin-1').strip()
+		stamp = f"X-LB-Timing: {timing}\r\n"
+	else:
+		stamp = f"X-Request-ID: {request_id}\r\nX-LB-Timing: {timing}\r\n"
+	if client_ip:
+		stamp += f"X-Forwarded-For: {client_ip}\r\n"
+	return data[:line_end + 2] + stamp.encode() + data[line_end + 2:], request_id
+
+class UpstreamPool:
+	# Koneksi keep-alive ke satu backend; dipakai bergantian (satu request per koneksi pada satu waktu)
+	def __init__(self, host, port, min_idle=2, max_idle=32, idle_timeout=UPSTREAM_IDLE_TIMEOUT, fresh_timeout=UPSTREAM_FRESH_TIMEOUT):
+		self.address = (host, port)
+		self.label = f"{host}:{port}"
+		self.min_idle = min_idle
+		self.max_idle = max_idle
+		self.idle_timeout = idle_timeout
+		self.fresh_timeout = fresh_timeout
+		self.lock = threading.Lock()
+		# (sock, waktu kedaluwarsa)
+		self.idle = []
+		self.wake = threading.Event()
+		threading.Thread(target=self.warm, name=f"pool-{self.label}", daemon=True).start()
+
+	def connect(self):
+		sock = socket.create_connection(self.address, timeout=CONNECT_TIMEOUT)
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		sock.settimeout(UPSTREAM_TIMEOUT)
+		upstream_connects.inc(backend=self.label)
+		return sock
+
+	def acquire(self):
+		# LIFO: koneksi yang paling baru dipakai paling kecil kemungkinannya sudah ditutup backend
+		now = time.monotonic()
+		with self.lock:
+			while self.idle:
+				sock, expires = self.idle.pop()
+				if now < expires:
+					upstream_reused.inc(backend=self.label)
+					if len(self.idle) < self.min_idle:
+						self.wake.set()
+					return sock, True
+				sock.close()
+		self.wake.set()
+		return self.connect(), False
+
+	def release(self, sock, timeout=None):
+		expires = time.monotonic() + (self.idle_timeout if timeout is None else timeout)
+		with self.lock:
+			if len(self.idle) < self.max_idle:
+				self.idle.append((sock, expires))
+				return
+		sock.close()
+
+	def idle_count(self):
+		with self.lock:
+			return len(self.idle)
+
+	def warm(self):
+		# Membuang koneksi idle yang kedaluwarsa dan menjaga min_idle koneksi siap pakai, di luar jalur accept
+		while True:
+			self.wake.wait(self.fresh_timeout / 2)
+			self.wake.clear()
+			now = time.monotonic()
+			with self.lock:
+				expired = [s for s, expires in self.idle if now >= expires]
+				self.idle = [(s, expires) for s, expires in self.idle if now < expires]
+				missing = self.min_idle - len(self.idle)
+			for sock in expired:
+				sock.close()
+			for _ in range(missing):
+				try:
+					sock = self.connect()
+				except OSError as e:
+					connect_errors.inc(backend=self.label)
+					logging.warning("warming %s failed: %s", self.label, e)
+					break
+				self.release(sock, self.fresh_timeout)
+
+	def exchange(self, request):
+		# Kirim satu request dan baca satu response. Bila koneksi dari pool ternyata sudah ditutup backend
+		# (misalnya backend restart), hanya koneksi itu yang dibuang dan request diulang sekali lewat koneksi baru.
+		# Mengembalikan (response, stream): body besar (mis. /assets) tidak ditampung di memori; response hanya
+		# berisi header dan stream(target) meneruskan sisa body ke target sebelum koneksi kembali ke pool
+		sock, reused = self.acquire()
 		while True:
 			try:
-				if (mode == 'toupstream'):
-					datafrom_client = connection.recv(8192)
-					if datafrom_client:
-							backend_sock.sendall(datafrom_client)
-					else:
-							backend_sock.close()
-							break
-				elif (mode == 'toclient'):
-					datafrom_backend = backend_sock.recv(8192)
-
-					if datafrom_backend:
-						connection.sendall(datafrom_backend)
-					else:
-						connection.close()
-						break
-			except OSError as e:
-				pass
+				sock.sendall(request)
+				head, rest = httpio.read_head(sock)
+			except OSError:
+				head, rest = None, b''
+			except httpio.MessageTooLarge:
+				sock.close()
+				raise
+			if head is not None:
+				break
+			sock.close()
+			if not reused:
+				raise ConnectionError("backend closed connection")
+			sock, reused = self.connect(), False
+		length = httpio.content_length(head)
+		if length > STREAM_THRESHOLD:
+			return head + rest[:length], self.streamer(sock, head, length - len(rest[:length]), rest[length:])
+		try:
+			body, rest = httpio.read_body(sock, rest, length)
+		except OSError:
+			sock.close()
+			raise
+		self.finish(sock, head, rest)
+		return head + body, None
+
+	def finish(self, sock, head, rest):
+		if httpio.wants_keep_alive(head) and not rest:
+			self.release(sock)
+		else:
+			sock.close()
+
+	def streamer(self, sock, head, remaining, rest):
+		def stream(target):
+			# Mengembalikan jumlah byte body yang diteruskan
+			sent = 0
+			try:
+				while sent < remaining:
+					data = sock.recv(min(STREAM_CHUNK, remaining - sent))
+					if not data:
+						raise ConnectionError("backend closed connection mid-body")
+					target.sendall(data)
+					sent += len(data)
+			except OSError:
+				sock.close()
+				raise
+			self.finish(sock, head, rest)
+			return sent
+		return stream
+
+def relay(source, target, backend_label, direction):
+	try:
+		while True:
+			data = source.recv(8192)
+			if not data:
+				break
+			target.sendall(data)
+			relay_bytes.inc(len(data), backend=backend_label, direction=direction)
+	except OSError:
+		# Socket sudah ditutup oleh arah relay yang lain
+		pass
+	for sock in (source, target):
+		try:
+			sock.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+
+def relay_websocket(connection, data, pool):
+	# Upgrade WebSocket memakai koneksi backend khusus yang direlay mentah sampai salah satu sisi menutup
+	backend_sock = pool.connect()
+	backend_sock.settimeout(None)
+	connection.settimeout(None)
+	backend_sock.sendall(data)
+	relay_bytes.inc(len(data), backend=pool.label, direction='upstream')
+	downstream = threading.Thread(target=relay, args=(backend_sock, connection, pool.label, 'downstream'), daemon=True)
+	downstream.start()
+	relay(connection, backend_sock, pool.label, 'upstream')
+	downstream.join()
+	backend_sock.close()
+
+def ProcessTheClient(connection, address, pool, accepted_at=None, backend=None):
+	buffer = b''
+	first_request = True
+	client_id = next(capture.clients) if capture is not None else None
+	connections_total.inc(backend=pool.label)
+	connections_active.inc(backend=pool.label)
+	try:
+		connection.settimeout(CLIENT_TIMEOUT)
+		while True:
+			request, buffer = httpio.read_message(connection, buffer)
+			if request is None:
+				break
+			request_line = request[:request.find(b'\r\n')].split(b' ')
+			if len(request_line) > 1 and request_line[1].startswith(b'/admin'):
+				# Endpoint admin backend tidak boleh dicapai dari luar lewat balancer
+				connection.sendall(NOT_FOUND)
+				break
+			if matchmaking is not None and len(request_line) > 1 and request_line[0] == b'POST' and request_line[1] == b'/matchmake':
+				client_keep_alive = httpio.wants_keep_alive(request)
+				connection.sendall(matchmake(request, client_keep_alive))
+				if not client_keep_alive:
+					break
+				connection.settimeout(KEEPALIVE_TIMEOUT)
+				continue
+			# Game yang sudah dimigrasikan diarahkan ke backend barunya, request lain ke backend client
+			routed = backend.route(request_game_id(request)) if backend is not None else None
+			upstream = pool_for(routed) if routed else pool
+			head = httpio.header_block(request).lower()
+			if b'\r\nupgrade: websocket' in head:
+				request, _ = stamp_request(request, uuid.uuid4().hex, "lb-queue;dur=0.000", address[0])
+				relay_websocket(connection, request + buffer, upstream)
+				break
+			queued = time.perf_counter() - accepted_at if first_request and accepted_at else 0.0
+			first_request = False
+			client_keep_alive = httpio.wants_keep_alive(request)
+			upstream_start = time.perf_counter()
+			timing = f"lb-queue;dur={queued * 1000:.3f}"
+			request, request_id = stamp_request(request, uuid.uuid4().hex, timing, address[0])
+			request = httpio.set_header(request, 'Connection', 'keep-alive')
+			try:
+				response, stream = upstream.exchange(request)
+			except (OSError, httpio.MessageTooLarge) as e:
+				connect_errors.inc(backend=upstream.label)
+				logging.error("%s request %s to %s failed: %s", address, request_id, upstream.label, e)
+				connection.sendall(BAD_GATEWAY)
+				break
+			latency = time.perf_counter() - upstream_start
+			relay_bytes.inc(len(request), backend=upstream.label, direction='upstream')
+			upstream_latency.observe(latency, backend=upstream.label)
+			# Respons yang di-stream (file statis) tidak direkam: body-nya tidak pernah utuh di balancer
+			if capture is not None and stream is None:
+				capture.record(client_id, upstream.label, request, response, upstream_start, latency)
+			logging.warning("%s request %s via %s (%s)", address, request_id, upstream.label, timing, extra={'event': 'request'})
+			# Connection ke client mengikuti permintaan client, bukan status koneksi upstream
+			response = httpio.set_header(response, 'Connection', 'keep-alive' if client_keep_alive else 'close')
+			connection.sendall(response)
+			streamed = stream(connection) if stream is not None else 0
+			relay_bytes.inc(len(response) + streamed, backend=upstream.label, direction='downstream')
+			if not client_keep_alive:
+				break
+			connection.settimeout(KEEPALIVE_TIMEOUT)
+	except httpio.MessageTooLarge:
+		pass
+	except OSError:
+		pass
 	except Exception as ee:
-		logging.warning(f"error {str(ee)}")
+		logging.warning("error %s", ee)
+	connection.close()
+	connections_active.dec(backend=pool.label)
+	admission_control.release_connection()
+
+class AdminServer(threading.Thread):
+	# Port admin balancer: /metrics, serta tabel backend dan route game untuk migrasi
+	def __init__(self, backend, port=8004):
+		self.backend = backend
+		self.port = port
+		self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		threading.Thread.__init__(self, daemon=True)
+
+	def run(self):
+		self.my_socket.bind(('0.0.0.0', self.port))
+		self.my_socket.listen(16)
+		logging.warning("Load balancer admin and metrics on port %s", self.port)
+		while True:
+			connection, client_address = self.my_socket.accept()
+			try:
+				connection.settimeout(2)
+				request, _ = httpio.read_message(connection)
+				status, body, content_type = self.handle(request or b'', client_address)
+				headers = f"HTTP/1.0 {status}\r\nConnection: close\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n"
+				connection.sendall(headers.encode() + body)
+			except (OSError, httpio.MessageTooLarge) as e:
+				logging.warning("admin error %s", e)
+			connection.close()
+
+	def allowed(self, request, client_address):
+		if ADMIN_TOKEN:
+			match = re.search(rb'\r\nx-admin-token:[ \t]*([^\r\n]*)', httpio.header_block(request), re.IGNORECASE)
+			return bool(match) and match.group(1).strip().decode('latin-1') == ADMIN_TOKEN
+		return client_address[0] in ('127.0.0.1', '::1')
+
+	def handle(self, request, client_address):
+		request_line = request[:request.find(b'\r\n')].decode('latin-1').split(' ')
+		method, path = (request_line[0], request_line[1]) if len(request_line) > 1 else ('', '')
+		if method == 'GET' and path == '/metrics':
+			return '200 OK', metrics.render().encode(), metrics.content_type
+		if path not in ('/backends', '/routes'):
+			return '404 Not Found', b'', 'text/plain'
+		if not self.allowed(request, client_address):
+			return '403 Forbidden', b'{"error": "Admin token required"}', 'application/json'
+		if method == 'GET' and path == '/backends':
+			return '200 OK', json.dumps(self.backend.describe()).encode(), 'application/json'
+		if method == 'GET' and path == '/routes':
+			with self.backend.lock:
+				routes = {str(game_id): f"{a[0]}:{a[1]}" for game_id, a in self.backend.routes.items()}
+			return '200 OK', json.dumps(routes).encode(), 'application/json'
+		if method != 'POST':
+			return '400 Bad Request', b'', 'text/plain'
+		try:
+			data = json.loads(request[request.find(b'\r\n\r\n') + 4:])
+			host, _, port = data['backend'].rpartition(':')
+			address = (host or '127.0.0.1', int(port))
+			if path == '/routes':
+				self.backend.set_route(int(data['game_id']), address)
+				logging.warning("game %s now routed to %s", data['game_id'], data['backend'], extra={'event': 'route'})
+			else:
+				if data.get('state', 'active') not in ('active', 'draining', 'removed'):
+					raise ValueError("unknown state")
+				self.backend.set_state(address, data.get('state', 'active'))
+				logging.warning("backend %s is %s", data['backend'], data.get('state', 'active'), extra={'event': 'backend'})
+		except (KeyError, ValueError, TypeError) as e:
+			return '400 Bad Request', json.dumps({'error': str(e)}).encode(), 'application/json'
+		return '200 OK', b'{"status": "ok"}', 'application/json'
+
+def shed(connection):
+	try:
+		connection.setblocking(False)
+		connection.send(admission.overload_response())
+	except OSError:
+		pass
 	connection.close()
-	return
 
-def Server():
-	the_clients = []
+def parse_backends(spec):
+	# "127.0.0.1:8000,127.0.0.1:8001" -> [('127.0.0.1', 8000), ('127.0.0.1', 8001)]
+	backends = []
+	for item in spec.split(','):
+		host, _, port = item.strip().rpartition(':')
+		if port:
+			backends.append((host or '127.0.0.1', int(port)))
+	return backends
+
+def route_game(backend, game_id, address):
+	backend.set_route(game_id, address)
+	matchmaker_games.inc(backend=f"{address[0]}:{address[1]}")
+
+def Server(port=8003, backlog=128, max_connections=100, min_idle=2, admin_port=8004, backends=DEFAULT_BACKENDS, central_matchmaker=False):
+	global POOL_MIN_IDLE, matchmaking
 	my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 	my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-	backend = BackendList()
+	backend = BackendList(backends)
+	admission_control.max_connections = max_connections
+	POOL_MIN_IDLE = min_idle
+	for server in backend.servers:
+		pool_for((server['host'], server['port']))
+	if central_matchmaker:
+		matchmaking = Matchmaker(backend.active_addresses, lambda game_id, address: route_game(backend, game_id, address), ADMIN_TOKEN)
+
+	my_socket.bind(('0.0.0.0', port))
+	my_socket.listen(backlog)
 
-	my_socket.bind(('0.0.0.0', 8003))
-	my_socket.listen(1)
+	logging.warning("Load balancer started on port %s", port)
 
-	logging.warning(f"Load balancer started on port 8003")
+	AdminServer(backend, admin_port).start()
 
-	with ProcessPoolExecutor(20) as executor:
+	# Jalur accept hanya menerima dan menyerahkan koneksi; connect ke backend terjadi di thread client
+	with ThreadPoolExecutor(max_connections) as executor:
 		while True:
 			connection, client_address = my_socket.accept()
-			client_ip = client_address[0]
-			backend_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-			backend_sock.settimeout(1)
-			backend_address = backend.getserver(client_ip)
-			logging.warning(f"{client_address} connecting to {backend_address}")
-			try:
-				backend_sock.connect(backend_address)
-
-				executor.submit(ProcessTheClient, connection, client_address,backend_sock,'toupstream')
-				
-				executor.submit(ProcessTheClient, connection, client_address,backend_sock,'toclient')
-				
-			except Exception as err:
-				logging.error(err)
-				pass
+			accepted_at = time.perf_counter()
+			if not admission_control.try_connect():
+				shed(connection)
+				continue
+			server_address = backend.getserver(client_address[0])
+			if server_address is None:
+				# Tidak ada backend aktif
+				shed(connection)
+				admission_control.release_connection()
+				continue
+			executor.submit(ProcessTheClient, connection, client_address, pool_for(server_address), accepted_at, backend)
 
 def main():
-	Server()
+	parser = argparse.ArgumentParser(description="Coup load balancer")
+	parser.add_argument('--port', type=int, default=8003)
+	parser.add_argument('--backlog', type=int, default=128, help="panjang antrian listen()")
+	parser.add_argument('--max-connections', type=int, default=100, help="koneksi client yang direlay bersamaan maksimum")
+	parser.add_argument('--min-idle', type=int, default=2, help="koneksi keep-alive siap pakai per backend")
+	parser.add_argument('--admin-port', type=int, default=8004, help="port /metrics dan admin backend/route")
+	parser.add_argument('--backends', default=','.join(f"{h}:{p}" for h, p in DEFAULT_BACKENDS), help="daftar awal backend host:port dipisah koma; kosong jika backend didaftarkan lewat POST /backends")
+	parser.add_argument('--matchmaker', action='store_true', help="bentuk meja di balancer dari antrian seluruh fleet dan buat gamenya di backend dengan kapasitas kosong terbanyak")
+	parser.add_argument('--capture', default=None, help="rekam request yang diproxy ke file ini untuk replay.py (file ditimpa)")
+	args = parser.parse_args()
+
+	logsetup.setup_logging(level=logging.WARNING)
+	if args.capture:
+		global capture
+		capture = CaptureLog(args.capture, time.perf_counter())
+	Server(args.port, args.backlog, args.max_connections, args.min_idle, args.admin_port, parse_backends(args.backends), args.matchmaker)
 
 if __name__=="__main__":
 	main()
\ No newline at end of file
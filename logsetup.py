@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+DEFAULT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+def parse_event_map(spec, cast=float):
+    # "connection=0.01,request=0.1" -> {'connection': 0.01, 'request': 0.1}
+    result = {}
+    for item in (spec or '').split(','):
+        name, sep, value = item.partition('=')
+        if sep and name.strip():
+            result[name.strip()] = cast(value)
+    return result
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, sample_rates=None, rate_limits=None):
+        super().__init__()
+        self.sample_rates = dict(sample_rates or {})
+        self.rate_limits = dict(rate_limits or {})
+        self.lock = threading.Lock()
+        self.seen = {}
+        self.buckets = {}
+        self.suppressed = {}
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        if event is None or record.levelno >= logging.ERROR:
+            return True
+        with self.lock:
+            rate = self.sample_rates.get(event, 1.0)
+            if rate < 1.0:
+                # Sampling deterministik: simpan 1 dari setiap round(1/rate) record
+                n = self.seen.get(event, 0)
+                self.seen[event] = n + 1
+                if rate <= 0 or n % max(1, round(1 / rate)) != 0:
+                    self.suppressed[event] = self.suppressed.get(event, 0) + 1
+                    return False
+            limit = self.rate_limits.get(event)
+            if limit is not None:
+                now = time.monotonic()
+                tokens, last = self.buckets.get(event, (limit, now))
+                tokens = min(limit, tokens + (now - last) * limit)
+                if tokens < 1:
+                    self.buckets[event] = (tokens, now)
+                    self.suppressed[event] = self.suppressed.get(event, 0) + 1
+                    return False
+                self.buckets[event] = (tokens - 1, now)
+            suppressed = self.suppressed.pop(event, 0)
+            if suppressed:
+                record.suppressed = suppressed
+        return True
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting pesan dilakukan oleh listener, bukan di thread request
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    reserved = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {'ts': round(record.created, 6), 'level': record.levelname, 'logger': record.name, 'msg': record.getMessage()}
+        for key, value in vars(record).items():
+            if key not in self.reserved and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def setup_logging(level=logging.WARNING, json_lines=None, sample_rates=None, rate_limits=None, filename=None, queue_size=10000):
+    if json_lines is None:
+        json_lines = os.environ.get('COUP_LOG_JSON', '') not in ('', '0')
+    if sample_rates is None:
+        sample_rates = parse_event_map(os.environ.get('COUP_LOG_SAMPLE'))
+    if rate_limits is None:
+        rate_limits = parse_event_map(os.environ.get('COUP_LOG_RATE'))
+    filename = filename or os.environ.get('COUP_LOG_FILE')
+
+    target = logging.FileHandler(filename) if filename else logging.StreamHandler(sys.stderr)
+    target.setFormatter(JsonFormatter() if json_lines else logging.Formatter(DEFAULT_FORMAT))
+
+    log_queue = queue.Queue(queue_size)
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_rates, rate_limits))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
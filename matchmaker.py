@@ -0,0 +1,181 @@
+import time
+import logging
+import threading
+from collections import deque
+import migration
+
+TABLE_SIZE = 4
+# Antrian diproses per tick: semua pemain yang menunggu dibagi menjadi meja penuh sekaligus
+TICK = 0.2
+# Pemain yang menunggu selama ini tanpa meja penuh ditempatkan di meja sebagian; kursi kosongnya diisi
+# pemain berikutnya yang masuk antrian (atau bot backend jika --bot-fill-delay dipakai)
+MAX_WAIT = 5
+# Tambahan waktu di atas MAX_WAIT sebelum join menyerah dan client diberi 503
+JOIN_GRACE = 3
+
+class Ticket:
+    def __init__(self, name):
+        self.name = name
+        self.since = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        # Client sudah menyerah; ticket yang dikembalikan ke antrian setelah itu dibuang di tick berikutnya
+        self.abandoned = False
+
+class Matchmaker:
+    # Antrian pemain untuk seluruh fleet di load balancer. Setiap tick meja dibentuk dari antrian (FIFO),
+    # ditempatkan di backend dengan kapasitas kosong terbanyak, lalu dibuat dengan satu POST /admin/games per backend
+    def __init__(self, backends, on_game=None, token=None, table_size=TABLE_SIZE, tick=TICK, max_wait=MAX_WAIT):
+        # backends: fungsi yang mengembalikan alamat (host, port) backend aktif; on_game(game_id, address) dipanggil
+        # untuk setiap game baru sebelum pemainnya diberi tahu
+        self.backends = backends
+        self.on_game = on_game
+        self.token = token
+        self.table_size = table_size
+        self.tick = tick
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.waiting = deque()
+        # Meja sebagian yang masih punya kursi kosong: [game_id, address, kursi kosong]; hanya dipakai thread tick
+        self.open_tables = deque()
+        threading.Thread(target=self.run, name='matchmaker', daemon=True).start()
+
+    def join(self, name):
+        # Dipanggil thread client; mengembalikan {'game_id', 'player_id', 'backend'} atau None jika tidak ada tempat
+        ticket = Ticket(name)
+        with self.lock:
+            self.waiting.append(ticket)
+        if ticket.done.wait(self.max_wait + JOIN_GRACE):
+            return ticket.result
+        with self.lock:
+            if ticket in self.waiting:
+                self.waiting.remove(ticket)
+                return None
+        # Mejanya sedang dibuat di backend
+        ticket.done.wait(migration.TIMEOUT)
+        if ticket.result is None:
+            ticket.abandoned = True
+        return ticket.result
+
+    def waiting_count(self):
+        with self.lock:
+            return len(self.waiting)
+
+    def run(self):
+        while True:
+            time.sleep(self.tick)
+            try:
+                self.fill_open_tables()
+            except Exception as e:
+                logging.error("matchmaker fill failed: %s", e)
+            tables = self.form_tables(time.monotonic())
+            if tables:
+                try:
+                    self.place(tables)
+                except Exception as e:
+                    logging.error("matchmaker tick failed: %s", e)
+                    self.requeue([ticket for table in tables for ticket in table])
+
+    def drop_abandoned(self):
+        # Dipanggil dengan self.lock
+        if any(ticket.abandoned for ticket in self.waiting):
+            self.waiting = deque(ticket for ticket in self.waiting if not ticket.abandoned)
+
+    def fill_open_tables(self):
+        # Pemain yang menunggu lebih dulu mengisi meja sebagian (yang terlama lebih dulu) sebelum meja baru dibentuk
+        active = set(self.backends())
+        while self.open_tables:
+            table = self.open_tables[0]
+            if table[1] not in active:
+                self.open_tables.popleft()
+                continue
+            with self.lock:
+                self.drop_abandoned()
+                tickets = [self.waiting.popleft() for _ in range(min(table[2], len(self.waiting)))]
+            if not tickets:
+                return
+            unseated = self.join_table(table, tickets)
+            table[2] -= len(tickets) - len(unseated)
+            if unseated or not table[2]:
+                # Meja penuh, sudah mulai (bot), atau hilang dari backend
+                self.open_tables.popleft()
+            if unseated:
+                self.requeue(unseated)
+
+    def join_table(self, table, tickets):
+        # Mengembalikan ticket yang tidak mendapat kursi
+        game_id, address, _ = table
+        try:
+            status, body = migration.request_json(address, 'POST', '/admin/games/join', {'game_id': game_id, 'names': [t.name for t in tickets]}, self.token)
+        except OSError as e:
+            logging.warning("matchmaker join on %s:%s failed: %s", address[0], address[1], e)
+            status, body = 0, None
+        player_ids = body.get('player_ids', []) if status == 200 and body else []
+        label = '{}:{}'.format(*address)
+        for ticket, player_id in zip(tickets, player_ids):
+            ticket.result = {'game_id': game_id, 'player_id': player_id, 'backend': label}
+            ticket.done.set()
+        return tickets[len(player_ids):]
+
+    def form_tables(self, now):
+        with self.lock:
+            self.drop_abandoned()
+            tables = []
+            while len(self.waiting) >= self.table_size:
+                tables.append([self.waiting.popleft() for _ in range(self.table_size)])
+            if self.waiting and now - self.waiting[0].since >= self.max_wait:
+                tables.append(list(self.waiting))
+                self.waiting.clear()
+            return tables
+
+    def requeue(self, tickets):
+        # Kembali ke depan antrian dengan urutan semula
+        with self.lock:
+            self.waiting.extendleft(reversed(tickets))
+
+    def free_capacity(self, address):
+        try:
+            status, body = migration.request_json(address, 'GET', '/admin/status', token=self.token)
+        except OSError as e:
+            logging.warning("matchmaker status from %s:%s failed: %s", address[0], address[1], e)
+            return 0
+        if status != 200 or not body or body.get('draining'):
+            return 0
+        games = body.get('games', {})
+        return body.get('max_games', 0) - games.get('waiting', 0) - games.get('live', 0)
+
+    def place(self, tables):
+        free = {address: self.free_capacity(address) for address in self.backends()}
+        assigned = {}
+        unplaced = []
+        for table in tables:
+            address = max(free, key=free.get, default=None)
+            if address is None or free[address] <= 0:
+                unplaced.extend(table)
+                continue
+            free[address] -= 1
+            assigned.setdefault(address, []).append(table)
+        for address, group in assigned.items():
+            unplaced.extend(self.create(address, group))
+        if unplaced:
+            logging.warning("matchmaker: no backend capacity for %s players", len(unplaced))
+            self.requeue(unplaced)
+
+    def create(self, address, group):
+        # Mengembalikan ticket yang mejanya tidak berhasil dibuat
+        try:
+            status, body = migration.request_json(address, 'POST', '/admin/games', {'tables': [[t.name for t in table] for table in group]}, self.token)
+        except OSError as e:
+            logging.warning("matchmaker create on %s:%s failed: %s", address[0], address[1], e)
+            status, body = 0, None
+        games = body.get('games', []) if status == 200 and body else []
+        label = '{}:{}'.format(*address)
+        for table, game in zip(group, games):
+            if self.on_game is not None:
+                self.on_game(game['game_id'], address)
+            for ticket, player_id in zip(table, game['player_ids']):
+                ticket.result = {'game_id': game['game_id'], 'player_id': player_id, 'backend': label}
+                ticket.done.set()
+            if len(game['player_ids']) < self.table_size:
+                self.open_tables.append([game['game_id'], address, self.table_size - len(game['player_ids'])])
+        return [ticket for table in group[len(games):] for ticket in table]
@@ -0,0 +1,131 @@
+import threading
+import bisect
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class Metric:
+    kind = 'untyped'
+    def __init__(self, name, help_text, labels=(), callback=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+        # callback dipanggil saat render, mengembalikan angka atau dict {label_values: angka}
+        self.callback = callback
+
+    def key(self, labels):
+        return tuple(labels.get(n, '') for n in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+    def refresh(self):
+        result = self.callback()
+        with self.lock:
+            if isinstance(result, dict):
+                self.values = {k if isinstance(k, tuple) else (k,): v for k, v in result.items()}
+            else:
+                self.values[()] = result
+
+    def samples(self):
+        if self.callback is not None:
+            self.refresh()
+        with self.lock:
+            items = list(self.values.items())
+        return [f"{self.name}{format_labels(self.label_names, k)} {format_value(v)}" for k, v in sorted(items)]
+
+    def render(self):
+        return self.header() + self.samples()
+
+class Counter(Metric):
+    kind = 'counter'
+    def inc(self, amount=1, **labels):
+        k = self.key(labels)
+        with self.lock:
+            self.values[k] = self.values.get(k, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        k = self.key(labels)
+        with self.lock:
+            self.values[k] = self.values.get(k, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    kind = 'histogram'
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        k = self.key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(k)
+            if entry is None:
+                entry = self.values[k] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self.values.items()]
+        lines = []
+        for k, (counts, total, count) in sorted(items):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, k, ('le', format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, k)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, k)} {count}")
+        return lines
+
+class Registry:
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=(), callback=None):
+        # callback untuk jumlah kumulatif yang sudah dihitung di tempat lain
+        return self.register(Counter(name, help_text, labels, callback))
+
+    def gauge(self, name, help_text, labels=(), callback=None):
+        return self.register(Gauge(name, help_text, labels, callback))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,38 @@
+import json
+import socket
+import httpio
+
+TIMEOUT = 5
+
+def parse_address(value):
+    host, _, port = value.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+def build_request(method, path, payload=None, token=None):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    head = "{} {} HTTP/1.1\r\nHost: coup\r\nConnection: close\r\nContent-Type: application/json\r\nContent-Length: {}\r\n".format(method, path, len(body))
+    if token:
+        head += "X-Admin-Token: {}\r\n".format(token)
+    return head.encode() + b"\r\n" + body
+
+def exchange(address, data):
+    # Kirim satu request mentah dan kembalikan respons mentah (dibaca sesuai Content-Length)
+    sock = socket.create_connection(parse_address(address) if isinstance(address, str) else address, timeout=TIMEOUT)
+    try:
+        sock.sendall(data)
+        response, _ = httpio.read_message(sock)
+    finally:
+        sock.close()
+    if not response:
+        raise ConnectionError("empty response from {}".format(address))
+    return response
+
+def request_json(address, method, path, payload=None, token=None):
+    # Mengembalikan (status, body JSON); body None jika respons bukan JSON
+    response = exchange(address, build_request(method, path, payload, token))
+    status = int(response[9:12])
+    body = response[response.find(b'\r\n\r\n') + 4:]
+    try:
+        return status, json.loads(body) if body else None
+    except ValueError:
+        return status, None
@@ -0,0 +1,243 @@
+import io
+import gc
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+
+SAMPLE_INTERVAL = 0.005
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1
+# Session yang lupa dihentikan berhenti sendiri setelah batas ini
+MAX_SECONDS = 300
+TOP = 40
+TRACE_FRAMES = 10
+MAX_TRACE_FRAMES = 100
+MODES = ('sample', 'cprofile')
+
+def positive(value, limit):
+    # Angka dari query/body admin; nol, negatif, dan nan ditolak, nilai di atas limit dipotong
+    value = float(value)
+    if not value > 0:
+        raise ValueError("must be positive")
+    return min(value, limit)
+
+def count(value, minimum=0):
+    value = int(value)
+    if value < minimum:
+        raise ValueError("must be at least {}".format(minimum))
+    return value
+
+def sort_key(value):
+    if value not in pstats.Stats.sort_arg_dict_default:
+        raise ValueError("unknown sort key")
+    return value
+
+def thread_group(name):
+    # "Thread-12 (serve)" dan "Thread-13 (serve)" dihitung sebagai satu kelompok
+    return re.sub(r'-\d+', '', name)
+
+def frame_label(code):
+    return '{}:{}'.format(os.path.basename(code.co_filename), code.co_name)
+
+class SamplingProfiler:
+    # Thread terpisah membaca stack semua thread lewat sys._current_frames; thread yang diprofil tidak diberi hook apa pun
+    def __init__(self, interval=SAMPLE_INTERVAL, seconds=MAX_SECONDS):
+        self.interval = interval
+        self.deadline = time.monotonic() + seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        me = threading.get_ident()
+        while self.running and time.monotonic() < self.deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(thread_group(names.get(ident, 'unknown')))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+    def report(self, top=TOP, sort=None):
+        # Stack terlipat ("thread;fungsi;fungsi jumlah"), bisa langsung dipakai flamegraph.pl/speedscope
+        lines = ['# {} samples every {:.1f} ms'.format(self.samples, self.interval * 1000)]
+        leaf = Counter()
+        for stack, count in self.stacks.items():
+            leaf[stack.rpartition(';')[2]] += count
+        lines.append('# top frames (self)')
+        lines.extend('#   {:>6} {}'.format(count, name) for name, count in leaf.most_common(top))
+        lines.extend('{} {}'.format(stack, count) for stack, count in self.stacks.most_common(top if top else None))
+        return '\n'.join(lines) + '\n'
+
+class CProfileSession:
+    # cProfile hanya merekam thread yang memanggil enable(), jadi setiap thread request memakai Profile sendiri
+    # di sekitar proses(); semua Profile digabung dengan pstats saat laporan dibuat
+    def __init__(self, seconds=MAX_SECONDS):
+        self.deadline = time.monotonic() + seconds
+        self.local = threading.local()
+        self.profiles = []
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.active = 0
+        self.running = True
+
+    def call(self, fn, *args):
+        with self.lock:
+            profile = None
+            if self.running and time.monotonic() < self.deadline:
+                profile = getattr(self.local, 'profile', None)
+                if profile is None:
+                    profile = self.local.profile = cProfile.Profile()
+                    self.profiles.append(profile)
+                self.active += 1
+        if profile is None:
+            return fn(*args)
+        self.local.inside = True
+        profile.enable()
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+            self.local.inside = False
+            with self.lock:
+                self.active -= 1
+                if not self.active:
+                    self.idle.notify_all()
+
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+    def stop(self, timeout=10):
+        # Tunggu request yang sedang diprofil selesai: Profile yang masih aktif di thread lain tidak boleh dibaca.
+        # Request /admin/profile/stop sendiri juga sedang diprofil; Profile-nya dimatikan saat laporan dibuat
+        own = 1 if getattr(self.local, 'inside', False) else 0
+        with self.lock:
+            self.running = False
+            self.idle.wait_for(lambda: self.active <= own, timeout)
+
+    def report(self, top=TOP, sort='cumulative'):
+        out = io.StringIO()
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return 'no requests profiled\n'
+        stats = pstats.Stats(profiles[0], stream=out)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+        return out.getvalue()
+
+def trace_stat(stat):
+    frame = stat.traceback[0]
+    result = {'where': '{}:{}'.format(os.path.basename(frame.filename), frame.lineno), 'size': stat.size, 'count': stat.count}
+    if hasattr(stat, 'size_diff'):
+        result['size_diff'] = stat.size_diff
+        result['count_diff'] = stat.count_diff
+    return result
+
+def type_counts(top=TOP):
+    # Hanya objek yang dilacak gc (container); cukup untuk melihat kelas yang bocor
+    return dict(Counter(type(o).__name__ for o in gc.get_objects()).most_common(top))
+
+def thread_counts():
+    return dict(Counter(thread_group(t.name) for t in threading.enumerate()))
+
+class Profiler:
+    # Satu session profil per process; saat tidak ada session, jalur request hanya membaca self.cprofile
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session = None
+        self.mode = None
+        self.cprofile = None
+        self.memory_baseline = None
+
+    def call(self, fn, *args):
+        session = self.cprofile
+        if session is None:
+            return fn(*args)
+        return session.call(fn, *args)
+
+    def current(self):
+        # Dipanggil dengan self.lock; session yang sudah melewati batas waktunya dilepas saat start berikutnya agar
+        # tidak menahan slot (laporannya tetap bisa diambil dengan stop sampai saat itu)
+        if self.session is not None and self.session.expired():
+            self.session.running = False
+            self.session = self.cprofile = self.mode = None
+        return self.session
+
+    def start(self, mode, interval=SAMPLE_INTERVAL, seconds=MAX_SECONDS):
+        seconds = min(seconds, MAX_SECONDS)
+        with self.lock:
+            if self.current() is not None:
+                return False
+            if mode == 'sample':
+                self.session = SamplingProfiler(min(max(interval, MIN_INTERVAL), MAX_INTERVAL), seconds)
+            else:
+                self.session = self.cprofile = CProfileSession(seconds)
+            self.mode = mode
+            return True
+
+    def stop(self, top=TOP, sort='cumulative'):
+        with self.lock:
+            session, self.session, self.cprofile, self.mode = self.session, None, None, None
+        if session is None:
+            return None
+        session.stop()
+        return session.report(top, sort)
+
+    def run_for(self, mode, seconds, interval=SAMPLE_INTERVAL, top=TOP, sort='cumulative'):
+        if not self.start(mode, interval, seconds):
+            return None
+        try:
+            time.sleep(min(seconds, MAX_SECONDS))
+        finally:
+            report = self.stop(top, sort)
+        return report
+
+    def status(self):
+        with self.lock:
+            mode = self.mode if self.session is not None and not self.session.expired() else None
+        return {'profiling': mode, 'tracemalloc': tracemalloc.is_tracing()}
+
+    def memory_start(self, frames=TRACE_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(min(frames, MAX_TRACE_FRAMES))
+        self.memory_baseline = None
+
+    def memory_stop(self):
+        tracemalloc.stop()
+        self.memory_baseline = None
+
+    def memory_snapshot(self, top=TOP):
+        # Snapshot baru dibandingkan dengan snapshot sebelumnya, lalu menjadi pembanding berikutnya
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap>')))
+        current, peak = tracemalloc.get_traced_memory()
+        result = {'current': current, 'peak': peak, 'top': [trace_stat(s) for s in snapshot.statistics('lineno')[:top]]}
+        with self.lock:
+            baseline, self.memory_baseline = self.memory_baseline, snapshot
+        if baseline is not None:
+            result['diff'] = [trace_stat(s) for s in snapshot.compare_to(baseline, 'lineno')[:top]]
+        return result
@@ -0,0 +1,54 @@
+import time
+import threading
+from collections import OrderedDict
+
+def parse_limits(spec):
+    # "/state=4:8,/action=10:20" -> {'/state': (4.0, 8.0), '/action': (10.0, 20.0)}
+    limits = {}
+    for item in (spec or '').split(','):
+        route, sep, value = item.partition('=')
+        if not sep:
+            continue
+        rate, _, burst = value.partition(':')
+        limits[route.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+class TokenBucketLimiter:
+    def __init__(self, rate, burst, max_entries=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        # Bucket yang diam selama burst/rate detik sudah penuh kembali, jadi aman dibuang
+        self.ttl = burst / rate if rate > 0 else float('inf')
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, key, now=None):
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            entry = self.buckets.get(key)
+            if entry is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+                self.buckets.move_to_end(key)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self.buckets[key] = (tokens, now)
+                allowed, retry_after = False, (1 - tokens) / self.rate if self.rate > 0 else 60.0
+            self.evict(now)
+        return allowed, retry_after
+
+    def evict(self, now):
+        while self.buckets:
+            oldest_key, (tokens, last) = next(iter(self.buckets.items()))
+            if len(self.buckets) > self.max_entries or now - last >= self.ttl:
+                del self.buckets[oldest_key]
+            else:
+                break
+
+    def __len__(self):
+        return len(self.buckets)
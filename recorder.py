@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import array
+import atexit
+import random
+import logging
+import argparse
+import threading
+
+CARDS = ['Duke', 'Captain', 'Assassin', 'Ambassador', 'Contessa']
+ACTIONS = ['Income', 'ForeignAid', 'Coup', 'Tax', 'Steal', 'Assassinate', 'Exchange']
+KINDS = ['action', 'challenge', 'block', 'block_challenge']
+CARD_CODES = {name: i for i, name in enumerate(CARDS)}
+ACTION_CODES = {name: i for i, name in enumerate(ACTIONS)}
+KIND_CODES = {name: i for i, name in enumerate(KINDS)}
+
+# Satu file per kolom (typecode modul array, little-endian); baris ke-i setiap kolom dalam satu tabel saling berpasangan.
+# Kolom "game" pada seats dan events adalah nomor baris di tabel games dalam shard yang sama.
+SCHEMA = {
+    'games': [('game_id', 'q'), ('players', 'b'), ('winner', 'b'), ('events', 'i'), ('version', 'i')],
+    'seats': [('game', 'q'), ('seat', 'b'), ('card1', 'b'), ('card2', 'b'), ('won', 'b')],
+    'events': [('game', 'q'), ('kind', 'b'), ('action', 'b'), ('actor', 'b'), ('other', 'b'), ('bluff', 'b'), ('success', 'b')],
+}
+
+def write_schema(directory):
+    path = os.path.join(directory, 'schema.json')
+    if not os.path.exists(path):
+        with open(path, 'w') as f:
+            json.dump({'byteorder': 'little', 'tables': SCHEMA, 'cards': CARDS, 'actions': ACTIONS, 'kinds': KINDS}, f, indent=1)
+
+class GameRecorder:
+    # Menampung game yang selesai di buffer array per kolom lalu menambahkannya ke file shard milik process ini
+    def __init__(self, directory, flush_games=256, flush_interval=None):
+        self.directory = directory
+        self.flush_games = flush_games
+        # Jika diisi, buffer juga ditulis setiap flush_interval detik agar server yang sepi tetap tercatat
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.shard = None
+        self.pid = None
+        self.rows = 0
+        self.pending = 0
+        self.buffers = {table: {name: array.array(code) for name, code in columns} for table, columns in SCHEMA.items()}
+        os.makedirs(directory, exist_ok=True)
+        write_schema(directory)
+        atexit.register(self.flush)
+
+    def attach(self, game, game_id):
+        game.record_id = game_id
+        if game.history is None:
+            game.history = []
+        game.listeners.append(self.on_change)
+
+    def on_change(self, game):
+        # Dipanggil dengan game.lock dipegang, jadi history dan pemain konsisten
+        if game.state != 'GAME_OVER' or getattr(game, 'recorded', False) or not game.starting_hands:
+            return
+        game.recorded = True
+        self.add(game)
+
+    def add(self, game):
+        alive = [p.id for p in game.players if not p.is_out]
+        winner = alive[0] if len(alive) == 1 else -1
+        with self.lock:
+            if self.pid != os.getpid():
+                # Shard baru per process (termasuk setelah fork), sehingga tidak ada dua penulis pada file yang sama
+                self.pid = os.getpid()
+                self.shard = os.path.join(self.directory, 'shard-{}-{}'.format(self.pid, time.time_ns()))
+                os.makedirs(self.shard)
+                self.rows = 0
+                if self.flush_interval:
+                    threading.Thread(target=self.flush_loop, name='recorder', daemon=True).start()
+            row = self.rows + len(self.buffers['games']['game_id'])
+            games = self.buffers['games']
+            games['game_id'].append(getattr(game, 'record_id', -1))
+            games['players'].append(len(game.players))
+            games['winner'].append(winner)
+            games['events'].append(len(game.history))
+            games['version'].append(game.version)
+            seats = self.buffers['seats']
+            for seat, hand in enumerate(game.starting_hands):
+                cards = sorted(CARD_CODES[c] for c in hand)
+                seats['game'].append(row)
+                seats['seat'].append(seat)
+                seats['card1'].append(cards[0])
+                seats['card2'].append(cards[1] if len(cards) > 1 else -1)
+                seats['won'].append(int(seat == winner))
+            events = self.buffers['events']
+            for kind, action, actor, other, bluff, success in game.history:
+                events['game'].append(row)
+                events['kind'].append(KIND_CODES[kind])
+                events['action'].append(ACTION_CODES.get(action, -1))
+                events['actor'].append(actor)
+                events['other'].append(other)
+                events['bluff'].append(bluff)
+                events['success'].append(success)
+            self.pending += 1
+            if self.pending >= self.flush_games:
+                self.flush_locked()
+
+    def flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if not self.pending or self.shard is None:
+            return
+        # games ditulis terakhir: pembaca memotong seats/events yang barisnya belum ada di games
+        for table in ('seats', 'events', 'games'):
+            for name, code in SCHEMA[table]:
+                buffer = self.buffers[table][name]
+                if sys.byteorder != 'little':
+                    buffer.byteswap()
+                with open(os.path.join(self.shard, '{}.{}'.format(table, name)), 'ab') as f:
+                    buffer.tofile(f)
+                self.buffers[table][name] = array.array(code)
+        self.rows += self.pending
+        self.pending = 0
+
+def simulate(recorder, count, seed=None):
+    # Mengisi dataset dengan game acak memakai kebijakan rollout bot, untuk menguji analitik
+    from httpfile import GameController, GameState
+    from bot import rollout_move
+    GameState().initialize()
+    rng = random.Random(seed)
+    for i in range(count):
+        game = GameController(rng=rng)
+        recorder.attach(game, i)
+        for n in range(game.num_players_required):
+            game.add_player(f"P{n}")
+        for _ in range(500):
+            if game.state == 'GAME_OVER':
+                break
+            move = rollout_move(game, rng)
+            if move is None:
+                break
+            game.handle_action(move)
+
+def main():
+    parser = argparse.ArgumentParser(description="Rekam game acak ke format kolom untuk analytics.py")
+    parser.add_argument('directory')
+    parser.add_argument('--simulate', type=int, default=1000, help="jumlah game acak yang dimainkan dan direkam")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    recorder = GameRecorder(args.directory, flush_games=4096)
+    start = time.perf_counter()
+    simulate(recorder, args.simulate, args.seed)
+    recorder.flush()
+    logging.warning("recorded %s games in %.1fs", args.simulate, time.perf_counter() - start)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,220 @@
+import re
+import time
+import asyncio
+import logging
+import argparse
+from collections import defaultdict, deque
+import httpio
+import migration
+from capture import SEATS, CaptureWriter, read_capture, body_crc, request_path, response_order
+from coup_client import read_message_async
+
+TIMEOUT = 15
+# Respons route ini memang berbeda setiap kali, jadi tidak dibandingkan
+IGNORED_ROUTES = ('/metrics',)
+MUTATING_ROUTES = ('/matchmake', '/action', '/quit')
+# Request yang di capture ditolak sebelum diproses tidak diputar ulang: jika diterima, state game akan menyimpang
+# dan long-poll yang dulu langsung ditolak akan menahan koneksinya
+REJECTED = (429, 503)
+GAME_ID_BODY = re.compile(rb'"game_id"\s*:\s*(\d+)')
+GAME_ID_QUERY = re.compile(rb'[?&]game_id=(\d+)')
+
+def sequence_keys(record):
+    # Antrian tempat request diurutkan beserta Record.order-nya di antrian itu. Matchmake per backend (menentukan
+    # id game dan kursi) sekaligus per game, karena join ke-n menaikkan version game menjadi n; action/quit dan
+    # GET /state per game. Request tanpa order (-1) tidak diurutkan
+    if record.order < 0:
+        return []
+    path = request_path(record.request)
+    line = record.request[:record.request.find(b'\r\n')]
+    if path == '/matchmake' and line.startswith(b'POST'):
+        game, player = divmod(record.order, SEATS)
+        return [((record.backend, None), record.order), ((record.backend, game), (player + 1) * 2)]
+    if path in MUTATING_ROUTES and line.startswith(b'POST'):
+        match = GAME_ID_BODY.search(record.request)
+    elif path == '/state' and line.startswith(b'GET'):
+        match = GAME_ID_QUERY.search(line)
+    else:
+        return []
+    return [((record.backend, int(match.group(1))), record.order)] if match else []
+
+class Sequencer:
+    # Setiap antrian berisi request dengan urutan (order, waktu kedatangan). Request yang mengubah state dikirim saat
+    # menjadi kepala antrian; GET /state dikirim setelah semua request dengan order lebih kecil selesai, dan
+    # perubahan sesudahnya menunggu GET itu, sehingga version yang dilihatnya sama dengan di capture
+    def __init__(self, records):
+        queues = defaultdict(list)
+        for record in records:
+            for key, order in sequence_keys(record):
+                queues[key].append((order, record.t, record.seq))
+        self.queues = {key: deque(sorted(items)) for key, items in queues.items()}
+        self.changed = asyncio.Condition()
+
+    def ready(self, record, keys):
+        if mutating(record):
+            return all(self.queues[key][0][2] == record.seq for key, _ in keys)
+        return all(self.queues[key][0][0] >= order for key, order in keys)
+
+    async def wait(self, record):
+        keys = sequence_keys(record)
+        if keys:
+            async with self.changed:
+                await self.changed.wait_for(lambda: self.ready(record, keys))
+
+    async def done(self, record):
+        keys = sequence_keys(record)
+        if keys:
+            async with self.changed:
+                for key, order in keys:
+                    self.queues[key].remove((order, record.t, record.seq))
+                self.changed.notify_all()
+
+def mutating(record):
+    return record.request.startswith(b'POST') and request_path(record.request) in MUTATING_ROUTES
+
+def backend_map(records, target=None, backends=None):
+    # Label backend di capture (urut) -> alamat fleet baru; backend ke-i menerima traffic backend ke-i,
+    # sehingga dengan --node-id dan --seed yang sama id game dan deknya ikut sama
+    labels = sorted({r.backend for r in records})
+    if target:
+        return {label: migration.parse_address(target) for label in labels}
+    if backends:
+        addresses = [migration.parse_address(b.strip()) for b in backends.split(',') if b.strip()]
+        if len(addresses) < len(labels):
+            raise SystemExit("capture uses {} backends but only {} given".format(len(labels), len(addresses)))
+        return dict(zip(labels, addresses))
+    return {label: migration.parse_address(label) for label in labels}
+
+async def replay_connection(records, addresses, speed, origin, results, timeout, sequencer):
+    # Satu koneksi client asli diputar ulang berurutan: request berikutnya dikirim setelah respons sebelumnya,
+    # tidak lebih awal dari waktunya di capture (dibagi speed)
+    loop = asyncio.get_running_loop()
+    conns = {}
+    try:
+        for record in records:
+            if speed:
+                delay = origin + record.t / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            address = addresses[record.backend]
+            await sequencer.wait(record)
+            started = loop.time()
+            try:
+                conn = conns.get(address)
+                if conn is None:
+                    conn = conns[address] = await asyncio.wait_for(asyncio.open_connection(*address), timeout)
+                conn[1].write(record.request)
+                await conn[1].drain()
+                raw = await asyncio.wait_for(read_message_async(conn[0]), timeout)
+            except (OSError, httpio.MessageTooLarge, asyncio.TimeoutError) as e:
+                logging.warning("seq %s to %s failed: %s", record.seq, address, e)
+                dropped = conns.pop(address, None)
+                if dropped is not None:
+                    dropped[1].close()
+                results.append(record._replace(t=started - origin, status=0, latency=loop.time() - started, crc=0))
+                await sequencer.done(record)
+                continue
+            results.append(record._replace(t=started - origin, status=int(raw[9:12]), latency=loop.time() - started, crc=body_crc(raw), order=response_order(request_path(record.request), raw)))
+            await sequencer.done(record)
+            if not httpio.wants_keep_alive(raw):
+                conns.pop(address)[1].close()
+    finally:
+        for _, writer in conns.values():
+            writer.close()
+
+async def replay(records, addresses, speed, timeout):
+    records = [r for r in records if r.status not in REJECTED]
+    by_client = defaultdict(list)
+    for record in sorted(records, key=lambda r: r.t):
+        by_client[record.client].append(record)
+    results = []
+    sequencer = Sequencer(records)
+    origin = asyncio.get_running_loop().time()
+    await asyncio.gather(*(replay_connection(stream, addresses, speed, origin, results, timeout, sequencer) for stream in by_client.values()))
+    return sorted(results, key=lambda r: r.seq)
+
+def percentiles(values):
+    if not values:
+        return '-'
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+    return '{:.1f}/{:.1f}/{:.1f}'.format(pick(0.5), pick(0.95), pick(0.99))
+
+def compare(base, other, examples=5):
+    # Pasangkan record dengan seq yang sama; bandingkan status, crc body, dan latency per route
+    others = {r.seq: r for r in other}
+    latencies = defaultdict(lambda: ([], []))
+    status_diff, body_diff, missing = [], [], 0
+    skipped = 0
+    for record in base:
+        replayed = others.get(record.seq)
+        if replayed is None:
+            if record.status in REJECTED:
+                skipped += 1
+            else:
+                missing += 1
+            continue
+        route = request_path(record.request)
+        latencies[route][0].append(record.latency)
+        latencies[route][1].append(replayed.latency)
+        if route in IGNORED_ROUTES:
+            continue
+        if record.status in REJECTED and replayed.status not in REJECTED:
+            # Ditolak rate limit/admission di capture, diterima di fleet baru (mis. --rate-limits ''): bukan selisih
+            skipped += 1
+        elif record.status != replayed.status:
+            status_diff.append((record.seq, route, record.status, replayed.status))
+        elif record.crc != replayed.crc:
+            body_diff.append((record.seq, route, record.status, replayed.status))
+    print("requests: {} base, {} other, {} missing, {} rejected in base".format(len(base), len(other), missing, skipped))
+    for title, diffs in (("status mismatches", status_diff), ("body mismatches", body_diff)):
+        print("{}: {}".format(title, len(diffs)))
+        by_route = defaultdict(int)
+        for _, route, _, _ in diffs:
+            by_route[route] += 1
+        for route, count in sorted(by_route.items()):
+            print("  {:<16} {}".format(route, count))
+        for seq, route, a, b in diffs[:examples]:
+            print("  seq {} {} {} -> {}".format(seq, route, a, b))
+    print("{:<16} {:>8} {:>22} {:>22}".format('route', 'count', 'base p50/p95/p99 ms', 'other p50/p95/p99 ms'))
+    for route, (a, b) in sorted(latencies.items()):
+        print("{:<16} {:>8} {:>22} {:>22}".format(route, len(a), percentiles(a), percentiles(b)))
+    return not status_diff and not body_diff and not missing
+
+def main():
+    parser = argparse.ArgumentParser(description="Putar ulang capture load balancer dan bandingkan hasilnya")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help="kirim capture ke fleet baru")
+    run.add_argument('capture')
+    run.add_argument('--target', default=None, help="host:port tunggal untuk semua traffic (mis. load balancer fleet baru)")
+    run.add_argument('--backends', default=None, help="backend fleet baru host:port dipisah koma, dipasangkan dengan backend capture sesuai urutan")
+    run.add_argument('--speed', type=float, default=1.0, help="1 = kecepatan asli, 10 = 10x lebih cepat, 0 = secepat mungkin (jalankan backend dengan --rate-limits '' agar tidak ditolak 429)")
+    run.add_argument('--timeout', type=float, default=TIMEOUT)
+    run.add_argument('--save', default=None, help="simpan hasil replay sebagai file capture (bisa dibandingkan atau diputar lagi)")
+    diff = sub.add_parser('compare', help="bandingkan dua capture/hasil replay")
+    diff.add_argument('base')
+    diff.add_argument('other')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.command == 'compare':
+        same = compare(read_capture(args.base), read_capture(args.other))
+        raise SystemExit(0 if same else 1)
+
+    records = read_capture(args.capture)
+    addresses = backend_map(records, args.target, args.backends)
+    for label, address in sorted(addresses.items()):
+        print("{} -> {}:{}".format(label, *address))
+    start = time.perf_counter()
+    results = asyncio.run(replay(records, addresses, args.speed, args.timeout))
+    print("replayed {} requests in {:.1f}s".format(len(results), time.perf_counter() - start))
+    if args.save:
+        writer = CaptureWriter(args.save)
+        for record in results:
+            writer.write(record)
+        writer.close()
+    same = compare(records, results)
+    raise SystemExit(0 if same else 1)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+# Menjaga agar hanya satu thread yang menjalankan (ulang) scheduler; dibuat baru di child setelah fork karena
+# lock bisa ikut ter-fork dalam keadaan terkunci
+start_lock = threading.Lock()
+
+def reset_start_lock():
+    global start_lock
+    start_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=reset_start_lock)
+
+class DeadlineScheduler:
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.pid = None
+
+    def ensure_started(self):
+        # Thread tidak ikut ter-fork ke worker process, jadi dijalankan ulang per process
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with start_lock:
+            if self.thread is None or self.pid != os.getpid():
+                self.cond = threading.Condition()
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, name='deadline-scheduler', daemon=True)
+                self.thread.start()
+
+    def schedule(self, delay, callback, *args):
+        entry = [time.monotonic() + delay, next(self.counter), callback, args]
+        self.ensure_started()
+        with self.cond:
+            heapq.heappush(self.heap, entry)
+            if self.heap[0] is entry:
+                self.cond.notify()
+        return entry
+
+    def cancel(self, entry):
+        # Entry yang dibatalkan tetap di heap dan dilewati saat jatuh tempo
+        entry[2] = None
+
+    def pending(self):
+        with self.cond:
+            return sum(1 for entry in self.heap if entry[2] is not None)
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.heap or self.heap[0][0] > time.monotonic():
+                    timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                    self.cond.wait(timeout)
+                _, _, callback, args = heapq.heappop(self.heap)
+            if callback is None:
+                continue
+            try:
+                callback(*args)
+            except Exception as e:
+                logging.error("deadline callback failed: %s", e)
@@ -2,12 +2,35 @@ from socket import *
 import socket
 import threading
 import time
+import os
 import sys
+import signal
 import logging
+import argparse
+import multiprocessing
 from httpfile import HttpServer
+from staticfiles import FileResponse
+import tracing
+import logsetup
+import admission
+import ratelimit
+import websocket
+import httpio
+import migration
+from recorder import GameRecorder
 
 # Global instance dari HTTP server
 httpserver = HttpServer()
+admission_control = admission.AdmissionControl()
+READ_TIMEOUT = 10
+KEEPALIVE_TIMEOUT = 60
+MAX_KEEPALIVE_REQUESTS = 10000
+INTERNAL_PORT_BASE = None
+SPECTATOR_SEND_TIMEOUT = 10
+# Batas tunggu worker keluar setelah SIGTERM sebelum dikirim SIGKILL
+WORKER_STOP_TIMEOUT = 5
+httpserver.metrics.gauge('coup_admission_inflight', 'Requests currently admitted per priority lane', ('lane',), callback=lambda: {(k,): v for k, v in admission_control.inflight.items()})
+httpserver.metrics.counter('coup_admission_shed_total', 'Connections and requests rejected with 503', ('reason',), callback=lambda: {(k,): v for k, v in admission_control.shed_counts().items()})
 
 class ProcessTheClient(threading.Thread):
     def __init__(self, connection, address):
@@ -16,70 +39,315 @@ class ProcessTheClient(threading.Thread):
         threading.Thread.__init__(self)
 
     def run(self):
-        raw_request = bytearray() # Bagus untuk data yang akumulatif seperti dibawah +=
-        
-        while True:
+        httpserver.connections_in_flight.inc()
+        try:
+            self.serve()
+        finally:
+            httpserver.connections_in_flight.dec()
+            admission_control.release_connection()
+
+    def serve(self):
+        # Koneksi yang diam tidak boleh menahan slot koneksi selamanya
+        self.connection.settimeout(READ_TIMEOUT)
+        buffer = b''
+        for _ in range(MAX_KEEPALIVE_REQUESTS):
+            trace = tracing.start()
             try:
-                d = self.connection.recv(1024)
-                if not d:
-                    break
-                raw_request += d
-                # Pengecekan end of header
-                if b'\r\n\r\n' in raw_request:
-                    break
+                raw_request, buffer = httpio.read_message(self.connection, buffer)
+            except (OSError, httpio.MessageTooLarge):
+                raw_request = None
+
+            # Jika tidak ada data yang dikirimkan, close koneksi
+            if not raw_request: 
+                tracing.finish(None)
+                break
+            httpserver.bytes_in.inc(len(raw_request))
+            trace.mark('read')
+                
+            # Proses full request dengan httpserver instance
+            full_request_string = raw_request.decode('utf-8', errors='ignore')
+            request_line = full_request_string.partition('\r\n')[0] or '(empty request)' # Memotong \r\n
+            logging.warning("data dari client: %s -> %s", self.address, request_line, extra={'event': 'request'})
+
+            if b'pgrade' in raw_request:
+                headers = httpserver.parse_headers(full_request_string.split('\r\n')[1:])
+                if websocket.is_upgrade(headers):
+                    tracing.finish(None)
+                    self.serve_websocket(full_request_string, raw_request, buffer)
+                    return
+
+            keep_alive = httpio.wants_keep_alive(raw_request)
+            httpserver.local.keep_alive = keep_alive
+            priority = admission.request_priority(request_line)
+            if admission_control.try_admit(priority):
+                try:
+                    hasil = httpserver.profiler.call(httpserver.proses, full_request_string, self.address)
+                finally:
+                    admission_control.release(priority)
+            else:
+                hasil = admission.overload_response()
+            
+            # Kirim hasil ke client yang terhubung
+            try:
+                if isinstance(hasil, FileResponse):
+                    self.send_file(hasil)
+                else:
+                    self.connection.sendall(hasil)
             except OSError:
+                tracing.finish(None)
                 break
+            httpserver.bytes_out.inc(len(hasil))
+            trace.mark('write')
+            httpserver.finish_trace(trace)
 
-        # Jika tidak ada data yang dikirimkan, close koneksi
-        if not raw_request: 
+            # Koneksi dipakai lagi hanya jika client dan respons sama-sama keep-alive
+            if not keep_alive or not httpio.wants_keep_alive(hasil.headers if isinstance(hasil, FileResponse) else hasil):
+                break
+            self.connection.settimeout(KEEPALIVE_TIMEOUT)
+
+        # Tutup koneksi
+        self.connection.close()
+
+    def send_file(self, hasil):
+        # socket.sendfile memakai os.sendfile (zero-copy) jika tersedia
+        self.connection.sendall(hasil.headers)
+        if hasil.length > 0:
+            with open(hasil.path, 'rb') as f:
+                self.connection.sendfile(f, hasil.offset, hasil.length)
+
+    def serve_websocket(self, request, raw_headers, leftover):
+        object_address = request.split(' ', 2)[1] if request.count(' ') >= 2 else ''
+        owner = httpserver.owning_worker('GET', object_address, '')
+        if owner is not None:
+            self.relay_to(('127.0.0.1', INTERNAL_PORT_BASE + owner), raw_headers + leftover)
+            return
+        moved_to = httpserver.moved_target('GET', object_address, '')
+        if moved_to is not None:
+            self.relay_to(migration.parse_address(moved_to), raw_headers + leftover)
+            return
+
+        error, target = httpserver.websocket_target(request)
+        if error is not None:
+            self.connection.sendall(error)
             self.connection.close()
             return
-            
-        # Proses full request dengan httpserver instance
-        full_request_string = raw_request.decode('utf-8', errors='ignore')
+
+        game, player_id, game_id, key = target
+        # Koneksi WebSocket berumur panjang, tidak memakai read timeout HTTP
+        self.connection.settimeout(None)
+        self.connection.sendall(websocket.handshake_response(key))
+        ws = websocket.WebSocketConnection(self.connection, leftover)
+        if player_id is None:
+            # Penonton lambat tidak boleh menahan thread selamanya saat mengirim
+            self.connection.settimeout(SPECTATOR_SEND_TIMEOUT)
+            try:
+                websocket.SpectatorSession(ws, httpserver.broadcast, game_id, game).run()
+            finally:
+                self.connection.close()
+            return
+        httpserver.websocket_sessions.inc()
         try:
-            logging.warning(f"data dari client: {self.address} -> {full_request_string.splitlines()[0]}") # Memotong \r\n
-        except IndexError:
-            logging.warning(f"data dari client: {self.address} -> (empty request)")
+            websocket.GameSession(ws, game, player_id, game_id, httpserver.player_limits.get('/action')).run()
+        finally:
+            httpserver.websocket_sessions.dec()
+            self.connection.close()
 
-        hasil = httpserver.proses(full_request_string)
-        
-        # Kirim hasil ke client yang terhubung
-        self.connection.sendall(hasil)
+    def relay_to(self, address, data):
+        # Stream yang di-upgrade diteruskan utuh ke worker pemilik game atau backend tujuan migrasi
+        upstream = socket.create_connection(address)
+        self.connection.settimeout(None)
+        upstream.sendall(data)
 
-        # Tutup koneksi
+        def pipe(src, dst):
+            try:
+                while True:
+                    d = src.recv(8192)
+                    if not d:
+                        break
+                    dst.sendall(d)
+            except OSError:
+                pass
+            for sock in (src, dst):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+        back = threading.Thread(target=pipe, args=(upstream, self.connection), daemon=True)
+        back.start()
+        pipe(self.connection, upstream)
+        back.join()
+        upstream.close()
         self.connection.close()
 
 class Server(threading.Thread):
-    def __init__(self, port=8000):
-        self.the_clients = []
+    def __init__(self, port=8000, address='0.0.0.0', reuse_port=False, backlog=128):
         self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            # Beberapa worker process bind ke port yang sama, kernel membagi koneksi
+            self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.address = address
         self.port = port
+        self.backlog = backlog
         threading.Thread.__init__(self)
 
     def run(self):
-        self.my_socket.bind(('0.0.0.0', self.port))
-        self.my_socket.listen(1)
+        self.my_socket.bind((self.address, self.port))
+        self.my_socket.listen(self.backlog)
         
-        logging.warning(f"Coup server started on port {self.port}")
+        logging.warning("Coup server started on port %s", self.port)
         
         while True:
             try:
                 self.connection, self.client_address = self.my_socket.accept()
-                logging.warning("connection from {}".format(self.client_address))
+                logging.warning("connection from %s", self.client_address, extra={'event': 'connection'})
+
+                if not admission_control.try_connect():
+                    # Terlalu banyak koneksi: tolak cepat tanpa membuat thread baru
+                    self.shed(self.connection)
+                    continue
 
                 clt = ProcessTheClient(self.connection, self.client_address)
                 clt.start()
-                self.the_clients.append(clt)
             except Exception as e:
-                logging.error(f"Error accepting connection: {e}")
+                logging.error("Error accepting connection: %s", e)
 
-def main():
-    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
-    
-    svr = Server(port=8000)
+    def shed(self, connection):
+        try:
+            connection.setblocking(False)
+            connection.send(admission.overload_response())
+        except OSError:
+            pass
+        connection.close()
+
+def make_forwarder(internal_port_base):
+    def forward(owner, data):
+        # Game milik worker lain: teruskan request mentah ke port internal worker tersebut
+        sock = socket.create_connection(('127.0.0.1', internal_port_base + owner), timeout=5)
+        try:
+            sock.sendall(data.encode() if isinstance(data, str) else data)
+            # Worker pemilik bisa membalas keep-alive, jadi respons dibaca sesuai Content-Length
+            response, _ = httpio.read_message(sock)
+        finally:
+            sock.close()
+        return response or b''
+    return forward
+
+def configure_admission(max_connections, max_inflight, reserved_high, max_waiting):
+    admission_control.max_connections = max_connections
+    admission_control.max_inflight = max_inflight
+    admission_control.reserved_high = min(reserved_high, max_inflight)
+    admission_control.max_waiting = max_waiting
+
+def run_worker(worker_id, num_workers, port, internal_port_base, backlog=128):
+    global INTERNAL_PORT_BASE
+    INTERNAL_PORT_BASE = internal_port_base
+    # Handler SIGTERM master ikut ter-fork; worker cukup mati dengan perilaku default
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    threading.Thread(target=watch_master, args=(os.getppid(),), name='watch-master', daemon=True).start()
+    logsetup.setup_logging(level=logging.WARNING)
+    httpserver.server_manager.configure_workers(worker_id, num_workers)
+    httpserver.forwarder = make_forwarder(internal_port_base)
+
+    Server(port=internal_port_base + worker_id, address='127.0.0.1').start()
+    svr = Server(port=port, reuse_port=True, backlog=backlog)
     svr.start()
+    logging.warning("worker %s/%s serving port %s", worker_id, num_workers, port)
+    svr.join()
+
+def watch_master(master_pid):
+    # Master yang mati tanpa sempat menghentikan worker (SIGKILL, crash) tidak boleh meninggalkan worker yatim
+    # yang tetap memegang port SO_REUSEPORT
+    while os.getppid() == master_pid:
+        time.sleep(1)
+    logging.error("master %s exited, worker stopping", master_pid)
+    os._exit(1)
+
+def run_prefork(port, num_workers, internal_port_base, backlog=128):
+    workers = {}
+    def spawn(worker_id):
+        proc = multiprocessing.Process(target=run_worker, args=(worker_id, num_workers, port, internal_port_base, backlog), daemon=True)
+        proc.start()
+        workers[worker_id] = proc
+
+    # SIGTERM ke master (mis. dari supervisor) dijadikan SystemExit agar worker ikut dihentikan dan port dilepas
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for worker_id in range(num_workers):
+            spawn(worker_id)
+        while True:
+            time.sleep(1)
+            for worker_id, proc in list(workers.items()):
+                if not proc.is_alive():
+                    logging.error("worker %s exited with code %s, restarting", worker_id, proc.exitcode)
+                    spawn(worker_id)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        stop_workers(workers.values())
+
+def stop_workers(procs):
+    for proc in procs:
+        proc.terminate()
+    deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+    for proc in procs:
+        proc.join(max(0, deadline - time.monotonic()))
+        if proc.is_alive():
+            logging.error("worker pid %s did not exit, killing", proc.pid)
+            proc.kill()
+            proc.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Coup game server")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1, help="jumlah worker process yang berbagi port (SO_REUSEPORT)")
+    parser.add_argument('--internal-port-base', type=int, default=None, help="port internal worker untuk handoff game, default port+100")
+    parser.add_argument('--backlog', type=int, default=128, help="panjang antrian listen()")
+    parser.add_argument('--max-connections', type=int, default=256, help="koneksi bersamaan maksimum per worker")
+    parser.add_argument('--max-inflight', type=int, default=64, help="request yang diproses bersamaan maksimum per worker")
+    parser.add_argument('--reserved-high', type=int, default=16, help="slot in-flight yang disisakan untuk /action, /quit dan /matchmake")
+    parser.add_argument('--max-waiting', type=int, default=128, help="long-poll /state yang menunggu bersamaan maksimum per worker")
+    parser.add_argument('--rate-limits', default='/state=5:10,/action=5:10', help="token bucket per pemain, format route=rate:burst dipisah koma")
+    parser.add_argument('--turn-timeout', type=float, default=30, help="detik sebelum pemain yang diam diberi aksi default")
+    parser.add_argument('--bot-fill-delay', type=float, default=0, help="detik sebelum kursi kosong di lobby diisi bot; 0 mematikan bot")
+    parser.add_argument('--bot-think', type=float, default=0.2, help="waktu pencarian bot per keputusan (detik)")
+    parser.add_argument('--record-dir', default=None, help="rekam game yang selesai ke direktori ini (format kolom, lihat analytics.py)")
+    parser.add_argument('--max-games', type=int, default=1000, help="kapasitas game aktif per worker yang diumumkan ke matchmaker pusat load balancer")
+    parser.add_argument('--finished-grace', type=float, default=300, help="detik game selesai disimpan sebelum dibuang dari memori; 0 menyimpannya selamanya")
+    parser.add_argument('--seed', default=None, help="seed dek per game (dengan game_id); dipakai untuk replay yang deterministik")
+    parser.add_argument('--node-id', type=int, default=0, help="id backend dalam fleet; harus berbeda per backend agar game bisa dimigrasikan")
+    parser.add_argument('--lb-admin', default=None, help="alamat admin load balancer (host:port) yang diberi tahu saat game dimigrasikan")
+    args = parser.parse_args()
+
+    httpserver.server_manager.turn_timeout = args.turn_timeout
+    httpserver.server_manager.configure_workers(0, 1, args.node_id)
+    httpserver.server_manager.bot_fill_delay = args.bot_fill_delay or None
+    httpserver.server_manager.bot_think = args.bot_think
+    httpserver.server_manager.seed = args.seed
+    httpserver.server_manager.max_games = args.max_games
+    httpserver.server_manager.finished_grace = args.finished_grace or None
+    if args.record_dir:
+        httpserver.server_manager.recorder = GameRecorder(args.record_dir, flush_interval=5)
+    if args.lb_admin:
+        httpserver.lb_admin = args.lb_admin
+    httpserver.configure_rate_limits(ratelimit.parse_limits(args.rate_limits))
+    logsetup.setup_logging(level=logging.WARNING)
+    configure_admission(args.max_connections, args.max_inflight, args.reserved_high, args.max_waiting)
+
+    workers = args.workers
+    if workers > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+        logging.warning("SO_REUSEPORT is not available on this platform, running a single worker")
+        workers = 1
+
+    if workers <= 1:
+        svr = Server(port=args.port, backlog=args.backlog)
+        svr.start()
+        return
+
+    internal_port_base = args.internal_port_base if args.internal_port_base is not None else args.port + 100
+    run_prefork(args.port, workers, internal_port_base, args.backlog)
 
 if __name__=="__main__":
     main()
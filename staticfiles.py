@@ -0,0 +1,121 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Varian precompressed yang dicari di samping file asli, urut preferensi
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+class FileResponse:
+    # Header sudah jadi; body dikirim langsung dari file dengan sendfile oleh server
+    def __init__(self, headers, path, offset, length):
+        self.headers = headers
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return len(self.headers) + self.length
+
+class FileEntry:
+    def __init__(self, path, size, mtime_ns, etag, encoding):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.etag = etag
+        self.encoding = encoding
+
+def parse_range(value, size):
+    # Hanya satu range "bytes=a-b"; mengembalikan (start, end) inklusif, None jika diabaikan, atau 'invalid'
+    if not value or not value.startswith('bytes=') or ',' in value:
+        return None
+    start, sep, end = value[6:].strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if start == '':
+            length = int(end)
+            if length <= 0:
+                return 'invalid'
+            return max(0, size - length), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return 'invalid'
+    return start, min(end, size - 1)
+
+class StaticFiles:
+    def __init__(self, root, cache_bytes=4 * 1024 * 1024, max_cached_file=256 * 1024):
+        self.root = os.path.abspath(root)
+        self.cache_bytes = cache_bytes
+        self.max_cached_file = max_cached_file
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.cache = OrderedDict()
+        self.cached_size = 0
+
+    def resolve(self, name):
+        # Tolak path traversal: hanya file di dalam root
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def entry(self, path, encoding):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            cached = self.entries.get(path)
+            if cached and cached.mtime_ns == st.st_mtime_ns and cached.size == st.st_size:
+                return cached
+        # ETag kuat dari hash isi file, dihitung ulang hanya jika file berubah
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        entry = FileEntry(path, st.st_size, st.st_mtime_ns, '"{}"'.format(digest.hexdigest()[:32]), encoding)
+        with self.lock:
+            self.entries[path] = entry
+            self.evict_content(path)
+        return entry
+
+    def lookup(self, name, accept_encoding=''):
+        path = self.resolve(name)
+        if path is None:
+            return None
+        accepted = [e.split(';')[0].strip() for e in accept_encoding.split(',')]
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.isfile(path + suffix):
+                entry = self.entry(path + suffix, encoding)
+                if entry:
+                    return entry
+        return self.entry(path, None)
+
+    def content(self, entry):
+        # Isi file kecil disimpan di LRU memory; file besar dikirim dengan sendfile
+        if entry.size > self.max_cached_file:
+            return None
+        with self.lock:
+            data = self.cache.get(entry.path)
+            if data is not None:
+                self.cache.move_to_end(entry.path)
+                return data
+        with open(entry.path, 'rb') as f:
+            data = f.read()
+        with self.lock:
+            if entry.path not in self.cache:
+                self.cache[entry.path] = data
+                self.cached_size += len(data)
+            while self.cached_size > self.cache_bytes and self.cache:
+                _, old = self.cache.popitem(last=False)
+                self.cached_size -= len(old)
+        return data
+
+    def evict_content(self, path):
+        old = self.cache.pop(path, None)
+        if old is not None:
+            self.cached_size -= len(old)
@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import uuid
+import signal
+import socket
+import logging
+import argparse
+import subprocess
+import logsetup
+import migration
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESTART_DELAY = 1
+# Backend yang tidak keluar setelah SIGTERM dalam batas ini dikirim SIGKILL
+STOP_TIMEOUT = 10
+# Port internal worker server.py (port + INTERNAL_PORT_OFFSET + worker_id) jika --workers lebih dari satu
+INTERNAL_PORT_OFFSET = 100
+LATENCY_EXCLUDED_ROUTES = ('/metrics', '/admin')
+
+def port_free(port):
+    # Tanpa SO_REUSEPORT bind gagal selama masih ada process (termasuk worker yatim) yang listen di port itu
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind(('0.0.0.0', port))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+def parse_metrics(text):
+    # Format teks Prometheus -> {(nama, ((label, nilai), ...)): angka}
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        name_part, _, value = line.rpartition(' ')
+        name, _, label_part = name_part.partition('{')
+        labels = []
+        for item in label_part.rstrip('}').split(','):
+            key, sep, val = item.partition('=')
+            if sep:
+                labels.append((key, val.strip('"')))
+        try:
+            samples[(name, tuple(labels))] = float(value)
+        except ValueError:
+            pass
+    return samples
+
+class Backend:
+    def __init__(self, port, node_id):
+        self.port = port
+        self.node_id = node_id
+        self.address = '127.0.0.1:{}'.format(port)
+        self.proc = None
+        self.state = 'starting'
+        self.restarts = 0
+        self.exited_at = None
+        self.stop_requested = None
+        self.live_games = 0
+        # (sum, count) histogram latency dari scrape sebelumnya
+        self.latency_totals = None
+        self.latency = None
+
+class Supervisor:
+    def __init__(self, args, token):
+        self.args = args
+        self.token = token
+        self.backends = []
+        self.next_node_id = 0
+        self.lb_proc = None
+        self.lb_admin = args.lb_admin or '127.0.0.1:{}'.format(args.lb_admin_port)
+        self.last_scale = 0
+
+    def env(self):
+        env = dict(os.environ)
+        env['COUP_ADMIN_TOKEN'] = self.token
+        return env
+
+    def start_balancer(self):
+        if self.args.lb_admin:
+            # Balancer dijalankan terpisah; supervisor hanya mendaftarkan backend
+            return
+        cmd = [sys.executable, os.path.join(HERE, 'load_balancer.py'), '--port', str(self.args.lb_port), '--admin-port', str(self.args.lb_admin_port), '--backends', '']
+        if self.args.capture:
+            cmd += ['--capture', self.args.capture]
+        if self.args.matchmaker:
+            cmd.append('--matchmaker')
+        self.lb_proc = subprocess.Popen(cmd, env=self.env())
+        logging.warning("load balancer started on port %s (pid %s)", self.args.lb_port, self.lb_proc.pid)
+
+    def ports(self, port):
+        if self.args.workers <= 1:
+            return [port]
+        return [port] + [port + INTERNAL_PORT_OFFSET + w for w in range(self.args.workers)]
+
+    def ports_free(self, port):
+        return all(port_free(p) for p in self.ports(port))
+
+    def free_port(self):
+        # Port backend yang masih tercatat (termasuk yang sedang berhenti) atau masih dipegang process lain dilewati
+        used = {p for b in self.backends for p in self.ports(b.port)}
+        port = self.args.base_port
+        while used.intersection(self.ports(port)) or not self.ports_free(port):
+            port += 1
+        return port
+
+    def spawn(self, backend):
+        cmd = [sys.executable, os.path.join(HERE, 'server.py'), '--port', str(backend.port), '--node-id', str(backend.node_id), '--workers', str(self.args.workers), '--lb-admin', self.lb_admin, '--turn-timeout', str(self.args.turn_timeout)]
+        if self.args.seed is not None:
+            cmd += ['--seed', self.args.seed]
+        if self.args.bot_fill_delay:
+            cmd += ['--bot-fill-delay', str(self.args.bot_fill_delay)]
+        backend.proc = subprocess.Popen(cmd, env=self.env())
+        backend.state = 'starting'
+        backend.latency_totals = None
+        logging.warning("backend %s started (node %s, pid %s)", backend.address, backend.node_id, backend.proc.pid)
+
+    def add_backend(self):
+        # Node id tidak pernah dipakai ulang agar id game tetap unik di seluruh fleet
+        backend = Backend(self.free_port(), self.next_node_id)
+        self.next_node_id += 1
+        self.backends.append(backend)
+        self.spawn(backend)
+        return backend
+
+    def balancer(self, state, backend):
+        try:
+            status, _ = migration.request_json(self.lb_admin, 'POST', '/backends', {'backend': backend.address, 'state': state}, self.token)
+        except OSError as e:
+            logging.warning("balancer update for %s failed: %s", backend.address, e)
+            return False
+        return status == 200
+
+    def scrape(self, backend):
+        # Setiap worker punya registry sendiri dan /metrics di port publik dijawab satu worker saja, jadi dengan
+        # --workers > 1 setiap worker di-scrape lewat port internalnya lalu samplenya dijumlahkan
+        ports = self.ports(backend.port)
+        samples = {}
+        for port in ports[1:] or ports:
+            try:
+                response = migration.exchange('127.0.0.1:{}'.format(port), migration.build_request('GET', '/metrics'))
+            except OSError:
+                return False
+            for key, value in parse_metrics(response[response.find(b'\r\n\r\n') + 4:].decode('utf-8', errors='ignore')).items():
+                samples[key] = samples.get(key, 0) + value
+        backend.live_games = samples.get(('coup_games', (('state', 'live'),)), 0) + samples.get(('coup_games', (('state', 'waiting'),)), 0)
+        total, count = 0.0, 0.0
+        for (name, labels), value in samples.items():
+            route = dict(labels).get('route')
+            if route in LATENCY_EXCLUDED_ROUTES:
+                continue
+            if name == 'coup_http_request_duration_seconds_sum':
+                total += value
+            elif name == 'coup_http_request_duration_seconds_count':
+                count += value
+        # Latency rata-rata sejak scrape sebelumnya, bukan sejak backend hidup
+        if backend.latency_totals is not None and count > backend.latency_totals[1]:
+            backend.latency = (total - backend.latency_totals[0]) / (count - backend.latency_totals[1])
+        else:
+            backend.latency = None
+        backend.latency_totals = (total, count)
+        return True
+
+    def check_processes(self):
+        now = time.monotonic()
+        for backend in list(self.backends):
+            code = backend.proc.poll()
+            if code is None:
+                if backend.state == 'stopping' and now - backend.stop_requested >= STOP_TIMEOUT:
+                    logging.error("backend %s did not stop, killing pid %s", backend.address, backend.proc.pid)
+                    backend.proc.kill()
+                if backend.state == 'starting' and self.scrape(backend) and self.balancer('active', backend):
+                    backend.state = 'active'
+                    logging.warning("backend %s registered with balancer", backend.address)
+                continue
+            if backend.state == 'stopping':
+                # Port baru boleh dipakai backend lain setelah semua worker benar-benar melepasnya
+                if self.ports_free(backend.port):
+                    self.backends.remove(backend)
+                continue
+            if backend.exited_at is None:
+                backend.exited_at = now
+                logging.error("backend %s exited with code %s", backend.address, code)
+                self.balancer('draining', backend)
+            # Jeda sebelum restart agar backend yang langsung crash tidak di-restart terus-menerus
+            if now - backend.exited_at >= RESTART_DELAY * min(2 ** backend.restarts, 30) and self.ports_free(backend.port):
+                backend.restarts += 1
+                backend.exited_at = None
+                # Node id baru: balancer mungkin masih merutekan id game lama node ini (mis. game yang sudah dimigrasikan)
+                backend.node_id = self.next_node_id
+                self.next_node_id += 1
+                self.spawn(backend)
+        if self.lb_proc is not None and self.lb_proc.poll() is not None:
+            logging.error("load balancer exited with code %s, restarting", self.lb_proc.returncode)
+            self.start_balancer()
+            for backend in self.backends:
+                if backend.state == 'active':
+                    backend.state = 'starting'
+
+    def autoscale(self):
+        active = [b for b in self.backends if b.state == 'active']
+        if not active or time.monotonic() - self.last_scale < self.args.cooldown:
+            return
+        for backend in active:
+            self.scrape(backend)
+        games = sum(b.live_games for b in active)
+        latencies = [b.latency for b in active if b.latency is not None]
+        latency = max(latencies) if latencies else 0.0
+        per_backend = games / len(active)
+        if len(self.backends) < self.args.max_backends and (per_backend > self.args.games_high or latency > self.args.latency_high):
+            logging.warning("scaling up: %.1f games per backend, latency %.1f ms", per_backend, latency * 1000)
+            self.add_backend()
+            self.last_scale = time.monotonic()
+        elif len(active) > self.args.min_backends and games / (len(active) - 1) < self.args.games_low and latency < self.args.latency_high / 2:
+            victim = min(active, key=lambda b: b.live_games)
+            logging.warning("scaling down: %.1f games per backend, draining %s", per_backend, victim.address)
+            self.retire(victim, [b for b in active if b is not victim])
+            self.last_scale = time.monotonic()
+
+    def retire(self, backend, others):
+        # Stop client baru, pindahkan game yang masih berjalan, baru hentikan process
+        self.balancer('draining', backend)
+        try:
+            status, result = migration.request_json(backend.address, 'POST', '/admin/drain', {'targets': [b.address for b in others], 'lb': self.lb_admin}, self.token)
+        except OSError as e:
+            logging.error("draining %s failed: %s", backend.address, e)
+            self.resume(backend)
+            return
+        if status != 200 or (result or {}).get('failed'):
+            # Game yang gagal dipindah tetap di backend ini; backend dipakai lagi dan bisa dicoba lagi nanti
+            logging.error("draining %s incomplete: %s %s", backend.address, status, result)
+            self.resume(backend)
+            return
+        backend.state = 'stopping'
+        backend.stop_requested = time.monotonic()
+        self.balancer('removed', backend)
+        backend.proc.terminate()
+
+    def resume(self, backend):
+        # Batalkan drain di balancer dan di backend (semua worker) agar backend kembali menerima game baru
+        self.balancer('active', backend)
+        try:
+            migration.request_json(backend.address, 'POST', '/admin/resume', {}, self.token)
+        except OSError as e:
+            logging.error("resuming %s failed: %s", backend.address, e)
+
+    def run(self):
+        self.start_balancer()
+        for _ in range(self.args.backends):
+            self.add_backend()
+        # Cooldown juga berlaku sejak start, agar fleet yang masih kosong tidak langsung diperkecil
+        self.last_scale = time.monotonic()
+        while True:
+            time.sleep(self.args.interval)
+            self.check_processes()
+            if self.args.max_backends > self.args.min_backends:
+                self.autoscale()
+
+    def stop(self):
+        procs = [b.proc for b in self.backends if b.proc is not None] + ([self.lb_proc] if self.lb_proc is not None else [])
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+        # Tunggu semua process keluar (master backend menghentikan worker-nya lebih dulu)
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for proc in procs:
+            try:
+                proc.wait(max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logging.error("pid %s did not stop, killing", proc.pid)
+                proc.kill()
+                proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Coup supervisor: load balancer dan fleet backend")
+    parser.add_argument('--backends', type=int, default=3, help="jumlah backend awal")
+    parser.add_argument('--base-port', type=int, default=8000, help="port backend pertama; backend berikutnya memakai port bebas setelahnya")
+    parser.add_argument('--workers', type=int, default=1, help="worker process per backend")
+    parser.add_argument('--turn-timeout', type=float, default=30)
+    parser.add_argument('--bot-fill-delay', type=float, default=0, help="diteruskan ke setiap backend; kursi kosong di meja sebagian diisi bot")
+    parser.add_argument('--lb-port', type=int, default=8003)
+    parser.add_argument('--lb-admin-port', type=int, default=8004)
+    parser.add_argument('--seed', default=None, help="diteruskan ke setiap backend (--seed) untuk dek yang deterministik")
+    parser.add_argument('--capture', default=None, help="diteruskan ke load balancer (--capture)")
+    parser.add_argument('--matchmaker', action='store_true', help="diteruskan ke load balancer (--matchmaker)")
+    parser.add_argument('--lb-admin', default=None, help="host:port admin balancer yang sudah berjalan; jika diisi balancer tidak dijalankan")
+    parser.add_argument('--min-backends', type=int, default=None, help="default sama dengan --backends")
+    parser.add_argument('--max-backends', type=int, default=None, help="default sama dengan --backends (autoscale mati)")
+    parser.add_argument('--games-high', type=float, default=20, help="scale up jika rata-rata game per backend di atas nilai ini")
+    parser.add_argument('--games-low', type=float, default=5, help="scale down jika game per backend tetap di bawah nilai ini setelah satu backend dihentikan")
+    parser.add_argument('--latency-high', type=float, default=0.05, help="scale up jika latency rata-rata request (detik) di atas nilai ini")
+    parser.add_argument('--interval', type=float, default=2, help="detik antar pemeriksaan process dan metrics")
+    parser.add_argument('--cooldown', type=float, default=30, help="detik minimum antar keputusan scaling")
+    args = parser.parse_args()
+    args.min_backends = args.backends if args.min_backends is None else args.min_backends
+    args.max_backends = args.backends if args.max_backends is None else args.max_backends
+
+    logsetup.setup_logging(level=logging.WARNING)
+    # Token admin dibagi ke balancer dan semua backend; dibuat acak jika belum diset
+    token = os.environ.get('COUP_ADMIN_TOKEN') or uuid.uuid4().hex
+    supervisor = Supervisor(args, token)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        supervisor.run()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        supervisor.stop()
+
+if __name__=="__main__":
+    main()
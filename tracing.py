@@ -0,0 +1,53 @@
+import threading
+import time
+import uuid
+import json
+import random
+import logging
+
+trace_logger = logging.getLogger('coup.trace')
+_local = threading.local()
+_sampler = random.Random()
+
+class RequestTrace:
+    def __init__(self, request_id=None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.last_mark = self.started
+        self.phases = []
+        self.upstream_timing = ''
+        self.route = ''
+
+    def mark(self, phase):
+        # Mencatat durasi sejak mark sebelumnya sebagai fase `phase`
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_mark))
+        self.last_mark = now
+
+    def total(self):
+        return self.last_mark - self.started
+
+    def server_timing(self):
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.phases]
+        if self.upstream_timing:
+            entries.insert(0, self.upstream_timing)
+        return ', '.join(entries)
+
+    def to_dict(self):
+        return {'request_id': self.request_id, 'route': self.route, 'total_ms': round(self.total() * 1000, 3), 'phases': {name: round(seconds * 1000, 3) for name, seconds in self.phases}, 'upstream': self.upstream_timing}
+
+def start(request_id=None):
+    trace = RequestTrace(request_id)
+    _local.trace = trace
+    return trace
+
+def current():
+    return getattr(_local, 'trace', None)
+
+def finish(trace, sample_rate=0.0, slow_ms=None):
+    _local.trace = None
+    if trace is None:
+        return
+    slow = slow_ms is not None and trace.total() * 1000 >= slow_ms
+    if slow or (sample_rate > 0 and _sampler.random() < sample_rate):
+        trace_logger.warning('%s', json.dumps(trace.to_dict()), extra={'event': 'trace'})
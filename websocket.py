@@ -0,0 +1,230 @@
+import json
+import struct
+import base64
+import hashlib
+import logging
+import threading
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+# Close code 1012 (Service Restart): client diharapkan menyambung ulang, kali ini ke backend tujuan migrasi
+CLOSE_MOVED = 1012
+MAX_MESSAGE = 64 * 1024
+PING_INTERVAL = 25
+
+def accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + GUID).encode()).digest()).decode()
+
+def is_upgrade(headers):
+    return headers.get('upgrade', '').lower() == 'websocket' and 'upgrade' in headers.get('connection', '').lower() and bool(headers.get('sec-websocket-key'))
+
+def handshake_response(key):
+    return ("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Accept: {}\r\n\r\n".format(accept_key(key))).encode()
+
+def encode_frame(payload, opcode=OP_TEXT):
+    # Frame dari server tidak di-mask
+    if isinstance(payload, str):
+        payload = payload.encode()
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+class WebSocketClosed(Exception):
+    pass
+
+class WebSocketConnection:
+    def __init__(self, sock, leftover=b''):
+        self.sock = sock
+        self.buffer = bytearray(leftover)
+        self.send_lock = threading.Lock()
+        self.closed = False
+
+    def read_exact(self, n):
+        while len(self.buffer) < n:
+            d = self.sock.recv(8192)
+            if not d:
+                raise WebSocketClosed()
+            self.buffer += d
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        return data
+
+    def read_frame(self):
+        b1, b2 = self.read_exact(2)
+        fin, opcode, masked, length = b1 & 0x80, b1 & 0x0F, b2 & 0x80, b2 & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self.read_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self.read_exact(8))[0]
+        if length > MAX_MESSAGE:
+            raise WebSocketClosed()
+        mask = self.read_exact(4) if masked else None
+        payload = self.read_exact(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return bool(fin), opcode, payload
+
+    def recv_message(self):
+        # Mengembalikan teks pesan berikutnya; ping dijawab otomatis, close mengakhiri koneksi
+        parts = []
+        message_opcode = None
+        while True:
+            fin, opcode, payload = self.read_frame()
+            if opcode == OP_PING:
+                self.send(payload, OP_PONG)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                self.close()
+                raise WebSocketClosed()
+            if opcode != OP_CONT:
+                message_opcode = opcode
+                parts = []
+            parts.append(payload)
+            if sum(len(p) for p in parts) > MAX_MESSAGE:
+                raise WebSocketClosed()
+            if fin:
+                data = b''.join(parts)
+                return data.decode('utf-8', errors='ignore') if message_opcode == OP_TEXT else data
+
+    def send(self, payload, opcode=OP_TEXT):
+        self.send_raw(encode_frame(payload, opcode))
+
+    def send_raw(self, frame):
+        with self.send_lock:
+            if self.closed:
+                raise WebSocketClosed()
+            try:
+                self.sock.sendall(frame)
+            except OSError:
+                self.closed = True
+                raise WebSocketClosed()
+
+    def close(self, code=1000):
+        with self.send_lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                self.sock.sendall(encode_frame(struct.pack('!H', code), OP_CLOSE))
+            except OSError:
+                pass
+
+class GameSession:
+    def __init__(self, ws, game, player_id, game_id, limiter=None):
+        self.ws = ws
+        self.game = game
+        self.player_id = player_id
+        self.game_id = game_id
+        self.limiter = limiter
+
+    def run(self):
+        reader = threading.Thread(target=self.read_loop, daemon=True)
+        reader.start()
+        try:
+            self.push_loop()
+        except WebSocketClosed:
+            pass
+        finally:
+            self.ws.close()
+            reader.join(1)
+
+    def push_loop(self):
+        version = None
+        while not self.ws.closed:
+            with self.game.lock:
+                if self.game.version == version and self.game.moved_to is None:
+                    self.game.changed.wait(PING_INTERVAL)
+                if self.game.moved_to is not None:
+                    self.ws.close(CLOSE_MOVED)
+                    return
+                view = None
+                if self.game.version != version:
+                    version = self.game.version
+                    view = self.game.build_state_for_player(self.player_id)
+            if view is None:
+                self.ws.send(b'', OP_PING)
+                continue
+            self.ws.send(json.dumps(view))
+            if view.get('game_state') == 'GAME_OVER':
+                return
+
+    def read_loop(self):
+        try:
+            while True:
+                message = self.ws.recv_message()
+                try:
+                    data = json.loads(message)
+                except (ValueError, TypeError):
+                    continue
+                if not isinstance(data, dict):
+                    continue
+                if self.limiter is not None and not self.limiter.allow((self.game_id, self.player_id))[0]:
+                    self.ws.send(json.dumps({'error': 'Rate limit exceeded'}))
+                    continue
+                # Identitas pemain diambil dari sesi, bukan dari isi pesan
+                data['player_id'] = self.player_id
+                data['game_id'] = self.game_id
+                if self.game.moved_to is not None:
+                    break
+                if data.get('type') == 'quit':
+                    self.game.eliminate_player(self.player_id)
+                else:
+                    self.game.handle_action(data)
+        except (WebSocketClosed, OSError):
+            pass
+        except Exception as e:
+            logging.warning("websocket reader error: %s", e)
+        finally:
+            self.ws.closed = True
+            with self.game.lock:
+                self.game.changed.notify_all()
+
+class SpectatorSession:
+    def __init__(self, ws, hub, game_id, game):
+        self.ws = ws
+        self.hub = hub
+        self.game_id = game_id
+        self.game = game
+
+    def run(self):
+        sub = self.hub.subscribe(self.game_id, self.game)
+        reader = threading.Thread(target=self.read_loop, args=(sub,), daemon=True)
+        reader.start()
+        try:
+            while not self.ws.closed:
+                frame = sub.next_frame(PING_INTERVAL)
+                if frame is None:
+                    if sub.closed:
+                        break
+                    self.ws.send(b'', OP_PING)
+                else:
+                    # Frame sudah di-encode sekali oleh channel, dikirim apa adanya
+                    self.ws.send_raw(frame)
+        except WebSocketClosed:
+            pass
+        finally:
+            sub.close()
+            self.ws.close()
+
+    def read_loop(self, sub):
+        # Penonton tidak mengirim aksi; pesan hanya dibaca untuk mendeteksi close
+        try:
+            while True:
+                self.ws.recv_message()
+        except (WebSocketClosed, OSError):
+            pass
+        finally:
+            self.ws.closed = True
+            sub.close()